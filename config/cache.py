@@ -0,0 +1,51 @@
+import logging
+
+import redis
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Ошибки недоступного Redis, при которых кеш пропускается
+CACHE_ERRORS = (redis.RedisError,)
+
+
+def log_cache_error(error) -> None:
+    logger.warning("Кеш недоступен: %s", error)
+
+
+def cache_get(key, default=None):
+    """Значение из кеша; недоступный кеш считается промахом."""
+
+    try:
+        return cache.get(key, default)
+    except CACHE_ERRORS as error:
+        log_cache_error(error)
+        return default
+
+
+def cache_set(key, value, timeout) -> None:
+    """Записывает значение в кеш, если он доступен."""
+
+    try:
+        cache.set(key, value, timeout)
+    except CACHE_ERRORS as error:
+        log_cache_error(error)
+
+
+async def acache_get(key, default=None):
+    """Асинхронный вариант :func:`cache_get`."""
+
+    try:
+        return await cache.aget(key, default)
+    except CACHE_ERRORS as error:
+        log_cache_error(error)
+        return default
+
+
+async def acache_set(key, value, timeout) -> None:
+    """Асинхронный вариант :func:`cache_set`."""
+
+    try:
+        await cache.aset(key, value, timeout)
+    except CACHE_ERRORS as error:
+        log_cache_error(error)
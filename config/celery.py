@@ -0,0 +1,20 @@
+"""
+Celery config for config project.
+
+Worker and beat are started from docker-compose with ``celery -A config``.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+app = Celery("config")
+
+app.config_from_object("django.conf:settings", namespace="CELERY")
+
+app.autodiscover_tasks()
+
+# Метрики времени выполнения и ожидания задач в воркере и beat
+import config.metrics  # noqa: E402, F401
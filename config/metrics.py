@@ -0,0 +1,213 @@
+import glob
+import os
+import time
+from datetime import datetime
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery import signals
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+from config.middleware import StreamingContent, bound
+from config.timing import current_timing, sampled_timing
+
+# Методы, которые попадают в метку method; остальные считаются как "other"
+HTTP_METHODS = {"GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH", "DELETE"}
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки запроса по имени маршрута.",
+    ["view", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Число SQL-запросов на запрос из выборки SERVER_TIMING_SAMPLE_RATE.",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_duration_seconds",
+    "Суммарное время SQL-запросов на запрос из выборки SERVER_TIMING_SAMPLE_RATE.",
+    ["view"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+RESPONSES = Counter(
+    "http_responses", "Ответы по коду состояния.", ["view", "method", "status"]
+)
+AUTH_FAILURES = Counter(
+    "auth_failures",
+    "Ответы 401: неверный, истёкший или отсутствующий токен, неудачный вход.",
+    ["view"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests", "Обращения к кешу: попадания и промахи.", ["cache", "result"]
+)
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Время выполнения задачи Celery.",
+    ["task", "state"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900),
+)
+TASK_QUEUE_LAG = Histogram(
+    "celery_task_queue_lag_seconds",
+    "Время от отправки задачи в очередь до начала выполнения.",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+
+
+def record_cache(name, hit) -> None:
+    """Учитывает попадание или промах кеша ``name``."""
+
+    CACHE_REQUESTS.labels(name, "hit" if hit else "miss").inc()
+
+
+class DirectoriesCollector:
+    """Суммирует файлы метрик процессов из нескольких каталогов.
+
+    Каталоги разных контейнеров раздельные: номера процессов в них
+    совпадают, и в общем каталоге файлы одного процесса затирали бы
+    файлы другого.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def collect(self):
+        files = [
+            file for path in self.paths for file in glob.glob(os.path.join(path, "*.db"))
+        ]
+        return multiprocess.MultiProcessCollector.merge(files, accumulate=True)
+
+
+def get_registry():
+    """Реестр для выдачи метрик.
+
+    Если задан ``PROMETHEUS_MULTIPROC_DIR``, каждый процесс пишет значения
+    в свои файлы в этом каталоге, а выдача суммирует файлы всех процессов
+    этого каталога и каталогов ``METRICS_PROCESS_DIRS``, например воркера
+    и beat Celery.
+    """
+
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        return REGISTRY
+    registry = CollectorRegistry()
+    registry.register(DirectoriesCollector([path, *settings.METRICS_PROCESS_DIRS]))
+    return registry
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus по заголовку
+    ``Authorization: Bearer <METRICS_TOKEN>``; без токена доступ закрыт."""
+
+    if not settings.METRICS_TOKEN or not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """Учитывает время обработки и код ответа каждого запроса с меткой
+    по имени маршрута, например ``network:network_list``.
+
+    Число и время SQL-запросов учитываются только для запросов из выборки
+    ``SERVER_TIMING_SAMPLE_RATE``: обёртки замера SQL работают лишь в них,
+    а остальные запросы замеряются одним ``time.perf_counter()``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with sampled_timing(request) as timing:
+            response = self.get_response(request)
+        return self.finish(request, response, timing, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with sampled_timing(request) as timing:
+            response = await self.get_response(request)
+        return self.finish(request, response, timing, started)
+
+    @classmethod
+    def finish(cls, request, response, timing, started):
+        """Учитывает запрос сразу или, для потокового ответа, после чтения
+        содержимого вместе с его SQL-запросами."""
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = StreamingContent(
+                response.streaming_content,
+                context=partial(bound, current_timing, timing),
+                on_close=partial(cls.observe, request, response, timing, started),
+            )
+        else:
+            cls.observe(request, response, timing, started)
+        return response
+
+    @staticmethod
+    def observe(request, response, timing, started):
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        method = request.method if request.method in HTTP_METHODS else "other"
+        REQUEST_LATENCY.labels(view, method).observe(time.perf_counter() - started)
+        if timing is not None:
+            REQUEST_QUERIES.labels(view).observe(timing.queries)
+            REQUEST_DB_TIME.labels(view).observe(timing.db)
+        RESPONSES.labels(view, method, str(response.status_code)).inc()
+        if response.status_code == 401:
+            AUTH_FAILURES.labels(view).inc()
+
+
+# Задачи Celery: время выполнения и ожидания в очереди. Время отправки
+# записывается в заголовок сообщения, в том числе задач, отправленных beat
+task_started = {}
+
+
+def get_header(request, name):
+    return getattr(request, name, None) or (request.headers or {}).get(name)
+
+
+@signals.before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+
+@signals.task_prerun.connect
+def task_prerun(task_id=None, task=None, **kwargs):
+    task_started[task_id] = time.perf_counter()
+    published_at = get_header(task.request, "published_at")
+    if published_at is None:
+        return
+    # Отложенная задача ждёт в очереди своего времени намеренно
+    eta = task.request.eta
+    if isinstance(eta, str):
+        eta = datetime.fromisoformat(eta)
+    if eta:
+        published_at = max(published_at, eta.timestamp())
+    TASK_QUEUE_LAG.labels(task.name).observe(max(0.0, time.time() - published_at))
+
+
+@signals.task_postrun.connect
+def task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = task_started.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.labels(task.name, state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
@@ -0,0 +1,139 @@
+from contextlib import contextmanager, nullcontext
+
+import brotli
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+# Уровень сжатия brotli для динамических ответов: максимальный (11)
+# слишком медленный для сжатия на каждый запрос
+BROTLI_QUALITY = 5
+# Размер блока, которыми сжимается потоковый ответ
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def buffer_sequence(sequence, size=STREAM_BUFFER_SIZE):
+    """Объединяет мелкие части потокового ответа в блоки не меньше ``size``,
+    чтобы сжатие не сбрасывалось после каждой строки выгрузки."""
+
+    buffer = []
+    length = 0
+    for item in sequence:
+        buffer.append(item)
+        length += len(item)
+        if length >= size:
+            yield b"".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def compress_sequence_brotli(sequence):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+@contextmanager
+def bound(var, value):
+    """Значение контекстной переменной ``var`` на время блока."""
+
+    token = var.set(value)
+    try:
+        yield
+    finally:
+        var.reset(token)
+
+
+class StreamingContent:
+    """Потоковое содержимое ответа в контексте запроса.
+
+    Синхронное потоковое содержимое читается уже после выхода из middleware,
+    поэтому каждая порция читается внутри ``context()``, а ``on_close``
+    вызывается один раз при закрытии ответа, даже если клиент отключился
+    до первой порции.
+    """
+
+    def __init__(self, content, context=nullcontext, on_close=None):
+        self.content = iter(content)
+        self.context = context
+        self.on_close = on_close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self.context():
+            return next(self.content)
+
+    def close(self):
+        if self.on_close is not None:
+            on_close, self.on_close = self.on_close, None
+            on_close()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Сжимает ответы больше ``COMPRESSION_MIN_SIZE`` байт.
+
+    Ответы, кроме HTML, сжимаются brotli, если клиент его принимает,
+    остальные — gzip. HTML остаётся за gzip из ``GZipMiddleware``
+    с его защитой от BREACH.
+    """
+
+    def process_response(self, request, response):
+        if (
+            not response.streaming
+            and len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+        if response.streaming and not response.is_async:
+            response.streaming_content = buffer_sequence(response.streaming_content)
+        accepts_brotli = re_accepts_brotli.search(
+            request.META.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        if (
+            not accepts_brotli
+            or response.has_header("Content-Encoding")
+            or response.get("Content-Type", "").startswith("text/html")
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if response.streaming:
+            if response.is_async:
+                original_iterator = response.streaming_content
+
+                async def brotli_wrapper():
+                    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+                    async for chunk in original_iterator:
+                        data = compressor.process(chunk)
+                        if data:
+                            yield data
+                    yield compressor.finish()
+
+                response.streaming_content = brotli_wrapper()
+            else:
+                response.streaming_content = compress_sequence_brotli(
+                    response.streaming_content
+                )
+            del response.headers["Content-Length"]
+        else:
+            compressed_content = brotli.compress(
+                response.content, quality=BROTLI_QUALITY
+            )
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers["Content-Length"] = str(len(response.content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
@@ -0,0 +1,57 @@
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer  # type: ignore
+from rest_framework.utils.encoders import JSONEncoder  # type: ignore
+
+from config.timing import measure
+
+encoder = JSONEncoder()
+
+
+def encode_default(obj):
+    """Кодирует типы, неизвестные orjson и MessagePack, так же, как
+    стандартный ``JSONRenderer``: ``Decimal``, дату и время, ленивые строки."""
+
+    return encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON-рендерер на orjson с тем же выводом, что и ``JSONRenderer``.
+
+    Дата и время передаются в ``encode_default``, поэтому их формат
+    не меняется. Запрошенный отступ (``indent``) поддерживается
+    стандартным рендерером.
+    """
+
+    options = (
+        orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_NON_STR_KEYS
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        with measure("render"):
+            if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+                return super().render(data, accepted_media_type, renderer_context)
+            ret = orjson.dumps(data, default=encode_default, option=self.options)
+            # Как и JSONRenderer, экранируем U+2028 и U+2029 для совместимости с JavaScript
+            return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Рендерер ``application/msgpack``."""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        with measure("render"):
+            return msgpack.packb(data, default=encode_default, datetime=False)
@@ -11,9 +11,11 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -43,6 +45,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "django_dump_load_utf8",
     "drf_spectacular",
     "drf_yasg",
@@ -55,6 +58,11 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "network.slow_queries.SlowQueryMiddleware",
+    "config.metrics.MetricsMiddleware",
+    "config.timing.ServerTimingMiddleware",
+    "config.middleware.CompressionMiddleware",
+    "network.throttling.ConcurrencySlotMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -99,6 +107,97 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+TESTING = "test" in sys.argv
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL", "redis://redis:6379/0"),
+    }
+}
+
+if TESTING:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Время жизни закешированных ответов API, в секундах
+CACHE_TTL = int(os.getenv("CACHE_TTL", 300))
+
+# Время хранения пользователя в кеше аутентификации, секунд: столько
+# изменение пользователя в обход сигналов может не учитываться
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", 60))
+
+# Минимальный размер ответа в байтах, начиная с которого он сжимается
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+
+# Redis для ограничения частоты и числа одновременных запросов; без него
+# ограничения действуют в памяти каждого процесса
+THROTTLE_REDIS_URL = os.getenv(
+    "THROTTLE_REDIS_URL", os.getenv("REDIS_URL", "redis://redis:6379/0")
+)
+
+if TESTING:
+    THROTTLE_REDIS_URL = None
+
+# Одновременно выполняемых запросов на все процессы: не больше числа
+# соединений, которые готова принять БД, остальные получают 503
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 80))
+
+# Одновременно выполняемых запросов одного пользователя, остальные получают 429
+MAX_CONCURRENT_REQUESTS_PER_USER = int(
+    os.getenv("MAX_CONCURRENT_REQUESTS_PER_USER", 8)
+)
+
+# Через сколько секунд повторить отклонённый по числу запросов запрос
+CONCURRENCY_RETRY_AFTER = int(os.getenv("CONCURRENCY_RETRY_AFTER", 1))
+
+# Через сколько секунд место незавершённого запроса считается освобождённым
+CONCURRENCY_SLOT_TIMEOUT = int(os.getenv("CONCURRENCY_SLOT_TIMEOUT", 300))
+
+# Доля запросов (от 0 до 1), для которых время SQL, аутентификации,
+# сериализации и отрисовки передаётся в заголовке Server-Timing и журнале,
+# а число и время SQL-запросов учитываются в метриках Prometheus
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv("SERVER_TIMING_SAMPLE_RATE", 0.1))
+
+if TESTING:
+    SERVER_TIMING_SAMPLE_RATE = 0
+
+# SQL-запросы дольше порога (мс) сохраняются с источником для команды
+# slow_queries; 0 — не сохранять. Для доли медленных чтений без блокировок
+# после отправки ответа сохраняется план EXPLAIN (ANALYZE, BUFFERS): запрос
+# выполняется ещё раз в откатываемой точке сохранения
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 500))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", 0.1))
+
+if TESTING:
+    SLOW_QUERY_THRESHOLD_MS = 0
+
+# Токен для /metrics (заголовок Authorization: Bearer <токен>); пустой — доступ закрыт.
+# Метрики нескольких процессов собираются через каталог PROMETHEUS_MULTIPROC_DIR
+# и каталоги других контейнеров METRICS_PROCESS_DIRS (через запятую)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_PROCESS_DIRS = [
+    path for path in os.getenv("METRICS_PROCESS_DIRS", "").split(",") if path
+]
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "config.timing": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -150,11 +249,40 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_THROTTLE_CLASSES": [
+        "network.throttling.TokenBucketThrottle",
+        "network.throttling.ConcurrencyThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "network_read": os.getenv("THROTTLE_RATE_READ", "20/s"),
+        "network_write": os.getenv("THROTTLE_RATE_WRITE", "10/s"),
+        "network_export": os.getenv("THROTTLE_RATE_EXPORT", "6/m"),
+    },
+    "DEFAULT_RENDERER_CLASSES": [
+        "config.renderers.ORJSONRenderer",
+        "config.renderers.MessagePackRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "config.parsers.ORJSONParser",
+        "config.parsers.MessagePackParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+    "TEST_REQUEST_RENDERER_CLASSES": [
+        "rest_framework.renderers.MultiPartRenderer",
+        "config.renderers.ORJSONRenderer",
+        "config.renderers.MessagePackRenderer",
+    ],
 }
 
+if TESTING:
+    # Частота запросов в тестах ограничивается только явно
+    REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] = {}
+
 
 # Настройки срока действия токенов
 SIMPLE_JWT = {
@@ -168,3 +296,30 @@ SPECTACULAR_SETTINGS = {
     "VERSION": "1.0.0",
     "SERVE_INCLUDE_SCHEMA": False,
 }
+
+# Настройки Celery
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/1")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/1")
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_TRACK_STARTED = True
+
+if TESTING:
+    CELERY_TASK_ALWAYS_EAGER = True
+    CELERY_TASK_EAGER_PROPAGATES = True
+
+CELERY_BEAT_SCHEDULE = {
+    "accrue-debt": {
+        "task": "network.tasks.accrue_debt",
+        "schedule": crontab(minute=0, hour="*/3"),
+    },
+    "repay-debt": {
+        "task": "network.tasks.repay_debt",
+        "schedule": crontab(minute=30, hour=6),
+    },
+}
+
+# Диапазоны случайного изменения задолженности и размер порции звеньев,
+# обрабатываемой одной короткой транзакцией
+DEBT_ACCRUAL_RANGE = (5, 500)
+DEBT_REPAYMENT_RANGE = (100, 10000)
+DEBT_UPDATE_CHUNK_SIZE = 1000
@@ -0,0 +1,235 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+import orjson
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from config.middleware import StreamingContent, bound
+
+logger = logging.getLogger(__name__)
+
+# Замер текущего запроса; None, если запрос не замеряется
+current_timing = ContextVar("current_timing", default=None)
+
+PHASES = ("auth", "serialize", "render")
+
+
+class RequestTiming:
+    """Число и время SQL-запросов и время этапов обработки одного запроса.
+
+    Время этапа не включает SQL-запросы, выполненные внутри него.
+    """
+
+    __slots__ = ("started", "queries", "db", "phases", "running")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.running = set()
+
+    def as_dict(self) -> dict:
+        return {
+            "queries": self.queries,
+            "db_ms": round(self.db * 1000, 3),
+            **{
+                f"{phase}_ms": round(seconds * 1000, 3)
+                for phase, seconds in self.phases.items()
+            },
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+        }
+
+
+@contextmanager
+def request_timing():
+    """Замер запроса, уже начатый внешним middleware, или новый."""
+
+    timing = current_timing.get()
+    if timing is not None:
+        yield timing
+        return
+    timing = RequestTiming()
+    token = current_timing.set(timing)
+    try:
+        yield timing
+    finally:
+        current_timing.reset(token)
+
+
+def sample_request(request) -> bool:
+    """Попадает ли запрос в выборку ``SERVER_TIMING_SAMPLE_RATE``.
+
+    Решение принимается один раз на запрос и общее для всех middleware,
+    поэтому метрики и заголовок ``Server-Timing`` замеряют одни и те же
+    запросы.
+    """
+
+    sampled = getattr(request, "timing_sampled", None)
+    if sampled is None:
+        sampled = random.random() < settings.SERVER_TIMING_SAMPLE_RATE
+        request.timing_sampled = sampled
+    return sampled
+
+
+@contextmanager
+def sampled_timing(request):
+    """Замер запроса из выборки или ``None`` для запроса вне её."""
+
+    if not sample_request(request):
+        yield None
+        return
+    with request_timing() as timing:
+        yield timing
+
+
+@contextmanager
+def untimed():
+    """Служебные SQL-запросы блока, например планы медленных запросов,
+    не учитываются в замере текущего запроса."""
+
+    token = current_timing.set(None)
+    try:
+        yield
+    finally:
+        current_timing.reset(token)
+
+
+@contextmanager
+def measure(phase):
+    """Добавляет время блока к этапу ``phase`` текущего запроса.
+
+    Вложенные замеры того же этапа, например вложенных сериализаторов,
+    учитываются один раз. Вне выборки только проверяет контекстную
+    переменную.
+    """
+
+    timing = current_timing.get()
+    if timing is None or phase in timing.running:
+        yield
+        return
+    timing.running.add(phase)
+    db, started = timing.db, time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.phases[phase] += time.perf_counter() - started - (timing.db - db)
+        timing.running.discard(phase)
+
+
+def record_query(execute, sql, params, many, context):
+    timing = current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.queries += 1
+        timing.db += time.perf_counter() - started
+
+
+def install_query_wrapper(connection, **kwargs):
+    """Добавляет :func:`record_query` в ``execute_wrappers`` соединения.
+
+    Обёртка ставится на каждое соединение, а не на время запроса, так как
+    асинхронные представления выполняют SQL в потоках ``sync_to_async``
+    со своими соединениями; замер запроса передаётся туда через контекст.
+    """
+
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(install_query_wrapper)
+
+
+class SerializationTimingMixin:
+    """Замеряет сериализацию ответа представления DRF.
+
+    В замеряемом запросе данные сериализатора объекта или списка строятся
+    сразу в ``get_serializer`` внутри ``measure("serialize")``; сериализатор
+    запоминает их, и представление получает готовый результат. Для
+    незамеряемых запросов и сериализаторов входных данных ничего не меняется.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if args and "data" not in kwargs and current_timing.get() is not None:
+            with measure("serialize"):
+                serializer.data
+        return serializer
+
+
+class ServerTimingMiddleware:
+    """Для доли ``SERVER_TIMING_SAMPLE_RATE`` запросов замеряет число и время
+    SQL-запросов, время аутентификации, сериализации и отрисовки ответа.
+
+    Результат передаётся в заголовке ``Server-Timing`` и записывается
+    строкой JSON в журнал ``config.timing``. У потоковых ответов заголовок
+    не передаётся: замер продолжается при чтении содержимого и попадает
+    только в журнал после закрытия ответа. Запросы вне выборки обходятся
+    одним вызовом ``random.random()``, общим с ``MetricsMiddleware``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not sample_request(request):
+            return self.get_response(request)
+        with request_timing() as timing:
+            response = self.get_response(request)
+        return self.report(request, response, timing)
+
+    async def __acall__(self, request):
+        if not sample_request(request):
+            return await self.get_response(request)
+        with request_timing() as timing:
+            response = await self.get_response(request)
+        return self.report(request, response, timing)
+
+    @classmethod
+    def report(cls, request, response, timing):
+        if response.streaming and not response.is_async:
+            response.streaming_content = StreamingContent(
+                response.streaming_content,
+                context=partial(bound, current_timing, timing),
+                on_close=partial(cls.log, request, response, timing),
+            )
+            return response
+        record = cls.log(request, response, timing)
+        metrics = [f'db;dur={record["db_ms"]};desc="{timing.queries} queries"']
+        metrics += [f"{phase};dur={record[f'{phase}_ms']}" for phase in PHASES]
+        metrics.append(f"total;dur={record['total_ms']}")
+        response.headers["Server-Timing"] = ", ".join(metrics)
+        return response
+
+    @staticmethod
+    def log(request, response, timing) -> dict:
+        record = timing.as_dict()
+        match = request.resolver_match
+        record.update(
+            method=request.method,
+            path=request.path,
+            view=match.view_name if match else None,
+            status=response.status_code,
+        )
+        logger.info(orjson.dumps(record).decode(), extra={"timing": record})
+        return record
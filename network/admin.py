@@ -1,8 +1,51 @@
+import logging
+
 from django.contrib import admin    # type: ignore
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.db import transaction
+from django.db.models import Max, Min
 from django.urls import reverse     # type: ignore
+from django.utils import timezone
 from django.utils.html import format_html   # type: ignore
 
-from network.models import NetworkNode, Product
+from network.models import DebtClearing, NetworkNode, Product, SlowQuery
+from network.paginators import EstimatedCountPaginator
+from network.tasks import clear_debt as clear_debt_task
+
+logger = logging.getLogger(__name__)
+
+
+def get_selection(request, queryset) -> dict:
+    """Выбор звеньев для фоновой задачи в виде простых данных.
+
+    Отмеченные строки передаются списком ключей. При выборе всех звеньев
+    передаются параметры фильтров и поиска списка и диапазон ключей на
+    момент запуска, чтобы сообщение брокера не зависело от числа звеньев.
+    """
+
+    if request.POST.get("select_across") != "1":
+        return {"pks": list(queryset.values_list("pk", flat=True))}
+    return {
+        "filters": {
+            name: request.GET[name]
+            for name in (
+                SEARCH_VAR,
+                *(list_filter.parameter_name for list_filter in NetworkNodeAdmin.list_filter),
+            )
+            if request.GET.get(name)
+        },
+        **queryset.aggregate(min_pk=Min("pk"), max_pk=Max("pk")),
+    }
+
+
+def enqueue_clear_debt(clearing, selection):
+    try:
+        clear_debt_task.delay(clearing.pk, selection)
+    except Exception:
+        logger.exception("Could not enqueue debt clearing %s", clearing.pk)
+        DebtClearing.objects.filter(pk=clearing.pk).update(
+            status=DebtClearing.Status.FAILED, finished_at=timezone.now()
+        )
 
 
 @admin.action(description="Очистить задолженность перед поставщиком")
@@ -11,12 +54,64 @@ def clear_debt(
     request,
     queryset,
 ):
-    queryset.update(debt=0)
+    clearing = DebtClearing.objects.create(user=request.user)
+    selection = get_selection(request, queryset)
+    transaction.on_commit(lambda: enqueue_clear_debt(clearing, selection))
+    url = reverse("admin:network_debtclearing_change", args=[clearing.pk])
     self.message_user(
-        request, "Задолженность перед поставщиком успешно очищена у выбранных объектов."
+        request,
+        format_html(
+            'Очистка задолженности запущена в фоне, прогресс: <a href="{}">{}</a>.',
+            url,
+            clearing,
+        ),
     )
 
 
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр боковой панели с полем ввода вместо списка всех значений."""
+
+    template = "admin/network/input_filter.html"
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            "query_string": changelist.get_query_string(remove=[self.parameter_name]),
+            "hidden_params": [
+                (key, value)
+                for key, value in changelist.params.items()
+                if key != self.parameter_name
+            ],
+        }
+
+
+class CityFilter(InputFilter):
+    title = "Город"
+    parameter_name = "city"
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(city=self.value())
+
+
+class SupplierFilter(InputFilter):
+    title = "Поставщик (ID или название)"
+    parameter_name = "supplier"
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return None
+        if value.isdigit():
+            return queryset.filter(supplier_id=value)
+        return queryset.filter(supplier__title=value)
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ("title", "model", "release_date")
@@ -27,14 +122,77 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(NetworkNode)
 class NetworkNodeAdmin(admin.ModelAdmin):
     list_display = ("title", "city", "supplier_link", "debt")
-    list_filter = ("city", "supplier")
-    search_fields = ("city",)
+    list_filter = (CityFilter, SupplierFilter)
+    list_select_related = ("supplier",)
+    search_fields = ("title", "city")
+    autocomplete_fields = ("supplier", "products")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     actions = [clear_debt]
 
     def supplier_link(self, obj):
         if obj.supplier:
-            url = reverse("admin:network_networknode_change", args=[obj.supplier.id])
+            url = reverse("admin:network_networknode_change", args=[obj.supplier_id])
             return format_html('<a href="{}">{}</a>', url, obj.supplier.email)
         return "-"
 
     supplier_link.short_description = "Поставщик"  # type: ignore
+
+    def get_selected_queryset(self, selection):
+        """Восстанавливает выбор звеньев из :func:`get_selection`."""
+
+        queryset = NetworkNode.objects.all()
+        if "pks" in selection:
+            return queryset.filter(pk__in=selection["pks"])
+        if selection["min_pk"] is None:
+            return queryset.none()
+        queryset = queryset.filter(
+            pk__gte=selection["min_pk"], pk__lte=selection["max_pk"]
+        )
+        filters = selection["filters"]
+        for filter_class in self.list_filter:
+            list_filter = filter_class(None, dict(filters), NetworkNode, self)
+            queryset = list_filter.queryset(None, queryset) or queryset
+        if filters.get(SEARCH_VAR):
+            queryset, _ = self.get_search_results(None, queryset, filters[SEARCH_VAR])
+        return queryset
+
+
+@admin.register(DebtClearing)
+class DebtClearingAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "user", "status", "progress", "created_at", "finished_at")
+    list_filter = ("status",)
+    readonly_fields = (
+        "user", "status", "total", "processed", "progress", "created_at", "finished_at"
+    )
+    fields = readonly_fields
+
+    def progress(self, obj):
+        if not obj.total:
+            return "-"
+        return f"{obj.processed * 100 // obj.total}%"
+
+    progress.short_description = "Прогресс"  # type: ignore
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ("source", "duration", "fingerprint", "created_at")
+    list_filter = ("source",)
+    search_fields = ("sql", "fingerprint")
+    readonly_fields = ("fingerprint", "source", "duration", "created_at", "sql", "plan")
+    fields = readonly_fields
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,7 @@ from django.apps import AppConfig    # type: ignore
 class NetworkConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "network"
+
+    def ready(self):
+        import network.signals  # noqa: F401
+        import network.slow_queries  # noqa: F401
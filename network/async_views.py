@@ -0,0 +1,186 @@
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse
+from rest_framework import generics  # type: ignore
+from rest_framework.response import Response  # type: ignore
+
+from config.timing import SerializationTimingMixin
+from network.cache import CachedResponseMixin, ConditionalResponseMixin
+from network.fastpath import FastListMixin
+from network.paginators import afetch_all
+from network.views import (NetworkNodeListAPIView, NetworkNodeRetrieveView,
+                           ProductViewSet)
+
+
+class AsyncAPIViewMixin:
+    """Асинхронная обработка GET-запросов к представлениям DRF.
+
+    Повторяет ``APIView.dispatch`` в цикле событий: согласование формата
+    и права проверяются синхронно, так как не обращаются к БД, ограничения
+    с запросами к Redis — в потоке ``sync_to_async``, а пользователь
+    определяется асинхронным ``aauthenticate`` аутентификатора. Данные
+    читаются асинхронным ORM через ``alist`` и ``aretrieve``: страница
+    и связи — ``aiterator()``, без ``sync_to_async`` в представлении. Ответ
+    отрисовывается здесь же, чтобы Django не вызывал ``render`` в отдельном
+    потоке.
+    """
+
+    http_method_names = ["get", "head", "options"]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # csrf_exempt в Django 4.2 оборачивает представление синхронной функцией
+        return markcoroutinefunction(view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            handler = getattr(
+                self, request.method.lower(), self.http_method_not_allowed
+            )
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.render_response(self.response)
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+        await self.aauthenticate(request)
+        self.check_permissions(request)
+        await sync_to_async(self.check_throttles)(request)
+
+    async def aauthenticate(self, request):
+        """Аутентифицирует запрос до первого обращения к ``request.user``,
+        чтобы DRF не выполнял синхронную аутентификацию."""
+
+        for authenticator in request.authenticators:
+            try:
+                user_auth_tuple = await authenticator.aauthenticate(request)
+            except Exception:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    @staticmethod
+    def render_response(response):
+        if not isinstance(response, Response):
+            return response
+        response.render()
+        rendered = HttpResponse(
+            response.content, status=response.status_code, headers=response.headers
+        )
+        rendered.cookies = response.cookies
+        return rendered
+
+    async def options(self, request, *args, **kwargs):
+        return super().options(request, *args, **kwargs)
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (queryset.model.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class AsyncModelMixin:
+    """Асинхронные ``alist`` и ``aretrieve`` без кеша и быстрого пути.
+
+    Указывается после примесей кеширования, условных запросов и быстрого
+    пути, чтобы их ``alist`` и ``aretrieve`` вызывали его через ``super()``.
+    """
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(await afetch_all(queryset), many=True)
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+
+class AsyncNetworkNodeListView(
+    AsyncAPIViewMixin, NetworkNodeListAPIView, AsyncModelMixin
+):
+    """Асинхронный контроллер просмотра списка цепочек сети."""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+
+class AsyncNetworkNodeRetrieveView(
+    AsyncAPIViewMixin, NetworkNodeRetrieveView, AsyncModelMixin
+):
+    """Асинхронный контроллер просмотра одной цепочки сети."""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.aretrieve(request, *args, **kwargs)
+
+
+class AsyncProductView(
+    AsyncAPIViewMixin, SerializationTimingMixin, generics.GenericAPIView
+):
+    """Общие настройки асинхронных контроллеров продуктов."""
+
+    serializer_class = ProductViewSet.serializer_class
+    queryset = ProductViewSet.queryset
+    permission_classes = ProductViewSet.permission_classes
+    filter_backends = ProductViewSet.filter_backends
+    search_fields = ProductViewSet.search_fields
+    pagination_class = ProductViewSet.pagination_class
+    cache_scope = ProductViewSet.cache_scope
+    throttle_scope = "network_read"
+
+
+class AsyncProductListView(
+    ConditionalResponseMixin,
+    CachedResponseMixin,
+    FastListMixin,
+    AsyncModelMixin,
+    AsyncProductView,
+):
+    """Асинхронный контроллер просмотра списка продуктов."""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+
+class AsyncProductRetrieveView(
+    ConditionalResponseMixin, CachedResponseMixin, AsyncModelMixin, AsyncProductView
+):
+    """Асинхронный контроллер просмотра одного продукта."""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.aretrieve(request, *args, **kwargs)
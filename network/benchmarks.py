@@ -0,0 +1,295 @@
+import json
+import math
+import statistics
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from rest_framework.test import APIClient  # type: ignore
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from network import urls as network_urls
+from network.models import NetworkNode, Product
+from users import urls as users_urls
+from users.models import User
+
+PASSWORD = "benchmark-password"
+PERCENTILES = (50, 90, 95, 99)
+
+
+@dataclass
+class BenchmarkContext:
+    """Объекты сгенерированной сети, к которым обращаются сценарии."""
+
+    prefix: str
+    user: User
+    other_user: User
+    refresh: str
+    node: NetworkNode
+    deep_node: NetworkNode
+    leaf_ids: list[int]
+    product: Product
+
+    @classmethod
+    def create(cls, prefix):
+        user = User.objects.create(email=f"{prefix.lower()}@example.com", is_active=True)
+        user.set_password(PASSWORD)
+        user.save()
+        other_user = User.objects.create(
+            email=f"{prefix.lower()}-other@example.com", is_active=True
+        )
+        nodes = NetworkNode.objects.filter(title__startswith=f"{prefix} ")
+        return cls(
+            prefix=prefix,
+            user=user,
+            other_user=other_user,
+            refresh=str(RefreshToken.for_user(user)),
+            node=nodes.filter(level=1).order_by("pk").first() or nodes.first(),
+            deep_node=nodes.order_by("-level", "pk").first(),
+            leaf_ids=list(
+                nodes.order_by("-level", "pk").values_list("pk", flat=True)[:100]
+            ),
+            product=Product.objects.filter(title__startswith=f"{prefix} ")
+            .order_by("pk")
+            .first(),
+        )
+
+    def delete(self):
+        User.objects.filter(pk__in=[self.user.pk, self.other_user.pk]).delete()
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Запрос к эндпоинту: имя маршрута, метод, аргументы адреса, параметры
+    и тело, вычисляемые по контексту и номеру запроса."""
+
+    url_name: str
+    method: str = "get"
+    label: str = ""
+    kwargs: Callable | None = None
+    query: Callable | None = None
+    data: Callable | None = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.method.upper()} {self.url_name}{self.label}"
+
+
+def node_data(ctx, index):
+    return {
+        "title": f"{ctx.prefix} created {index}",
+        "email": "created@example.com",
+        "type": "retail",
+        "supplier": ctx.node.pk,
+    }
+
+
+def node_pk(ctx):
+    return {"pk": ctx.node.pk}
+
+
+def product_pk(ctx):
+    return {"pk": ctx.product.pk}
+
+
+def other_user_pk(ctx):
+    return {"pk": ctx.other_user.pk}
+
+
+SCENARIOS = (
+    Scenario("network:network_list"),
+    Scenario(
+        "network:network_list", label=" search", query=lambda ctx: {"search": "retail"}
+    ),
+    Scenario(
+        "network:network_list",
+        label=" filter",
+        query=lambda ctx: {"city": "Kazan", "debt_min": 1000},
+    ),
+    Scenario("network:network_create", "post", data=node_data),
+    Scenario(
+        "network:network_bulk",
+        "post",
+        data=lambda ctx, index: [
+            node_data(ctx, f"{index}-{item}") for item in range(100)
+        ],
+    ),
+    Scenario(
+        "network:network_bulk",
+        "patch",
+        data=lambda ctx, index: [{"id": pk, "city": "Kazan"} for pk in ctx.leaf_ids],
+    ),
+    Scenario("network:network_export", query=lambda ctx: {"supplier": ctx.node.pk}),
+    Scenario("network:network_stats"),
+    Scenario("network:network_retrieve", kwargs=node_pk),
+    Scenario(
+        "network:network_update",
+        "patch",
+        kwargs=node_pk,
+        data=lambda ctx, index: {"city": "Kazan"},
+    ),
+    Scenario(
+        "network:network_delete",
+        "delete",
+        kwargs=lambda ctx: {"pk": ctx.leaf_ids[0]},
+    ),
+    Scenario(
+        "network:network_upstream", kwargs=lambda ctx: {"pk": ctx.deep_node.pk}
+    ),
+    Scenario("network:network_downstream", kwargs=node_pk),
+    Scenario("network:async_network_list"),
+    Scenario("network:async_network_retrieve", kwargs=node_pk),
+    Scenario("network:async_product_list"),
+    Scenario("network:async_product_detail", kwargs=product_pk),
+    Scenario("network:api-root"),
+    Scenario("network:product-list"),
+    Scenario(
+        "network:product-list",
+        "post",
+        data=lambda ctx, index: {"title": f"{ctx.prefix} new {index}", "model": "B"},
+    ),
+    Scenario("network:product-detail", kwargs=product_pk),
+    Scenario(
+        "network:product-detail",
+        "put",
+        kwargs=product_pk,
+        data=lambda ctx, index: {"title": ctx.product.title, "model": "C"},
+    ),
+    Scenario("network:product-detail", "delete", kwargs=product_pk),
+    Scenario(
+        "users:login",
+        "post",
+        data=lambda ctx, index: {"email": ctx.user.email, "password": PASSWORD},
+    ),
+    Scenario(
+        "users:token_refresh", "post", data=lambda ctx, index: {"refresh": ctx.refresh}
+    ),
+    Scenario("users:api-root"),
+    Scenario("users:user-list"),
+    Scenario(
+        "users:user-list",
+        "post",
+        data=lambda ctx, index: {
+            "email": f"{ctx.prefix.lower()}-{index}@example.com",
+            "password": PASSWORD,
+        },
+    ),
+    Scenario("users:user-detail", kwargs=other_user_pk),
+    Scenario(
+        "users:user-detail",
+        "patch",
+        kwargs=other_user_pk,
+        data=lambda ctx, index: {"city": "Kazan"},
+    ),
+    Scenario("users:user-detail", "delete", kwargs=other_user_pk),
+)
+
+
+def url_names(patterns, namespace):
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= url_names(pattern.url_patterns, namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(f"{namespace}:{pattern.name}")
+    return names
+
+
+def uncovered_url_names(scenarios=SCENARIOS) -> list[str]:
+    """Маршруты ``network/urls.py`` и ``users/urls.py`` без сценария."""
+
+    names = url_names(network_urls.urlpatterns, network_urls.app_name) | url_names(
+        users_urls.urlpatterns, users_urls.app_name
+    )
+    return sorted(names - {scenario.url_name for scenario in scenarios})
+
+
+def percentile(values, q):
+    """Процентиль по ближайшему рангу отсортированных значений."""
+
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def unthrottled():
+    """Отключает ограничения частоты и числа запросов на время замера."""
+
+    return override_settings(
+        MAX_CONCURRENT_REQUESTS=10**6,
+        MAX_CONCURRENT_REQUESTS_PER_USER=10**6,
+        REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}},
+    )
+
+
+def run_scenario(client, scenario, ctx, requests, warmup=1, cached=False) -> dict:
+    """Выполняет сценарий ``requests`` раз и возвращает процентили времени
+    ответа и число SQL-запросов.
+
+    Каждый запрос выполняется в откатываемой транзакции, поэтому сценарии
+    записи не меняют данные. Без ``cached`` к адресу добавляется
+    уникальный параметр, чтобы ответ не брался из кеша.
+    """
+
+    kwargs = scenario.kwargs(ctx) if scenario.kwargs else None
+    path = reverse(scenario.url_name, kwargs=kwargs)
+    timings, queries, statuses = [], [], Counter()
+    for index in range(warmup + requests):
+        query = scenario.query(ctx) if scenario.query else {}
+        if not cached:
+            query = {**query, "benchmark": index}
+        data = scenario.data(ctx, index) if scenario.data else None
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.generic(
+                    scenario.method.upper(),
+                    f"{path}?{urlencode(query)}" if query else path,
+                    json.dumps(data) if data is not None else "",
+                    content_type="application/json",
+                )
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        if index >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+            statuses[response.status_code] += 1
+    timings.sort()
+    return {
+        "method": scenario.method.upper(),
+        "path": path,
+        "status": statuses.most_common(1)[0][0],
+        "requests": requests,
+        "latency_ms": {
+            **{f"p{q}": round(percentile(timings, q), 3) for q in PERCENTILES},
+            "mean": round(statistics.fmean(timings), 3),
+            "max": round(timings[-1], 3),
+        },
+        "queries": {"median": statistics.median(queries), "max": max(queries)},
+    }
+
+
+def run_suite(ctx, requests, warmup=1, cached=False, only=None, log=None) -> dict:
+    """Выполняет все сценарии от имени пользователя контекста с его
+    JWT-токеном, чтобы в замер входила аутентификация."""
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(ctx.user)}")
+    results = {}
+    with unthrottled():
+        for scenario in SCENARIOS:
+            if only and not any(part in scenario.name for part in only):
+                continue
+            results[scenario.name] = result = run_scenario(
+                client, scenario, ctx, requests, warmup, cached
+            )
+            if log:
+                log(scenario.name, result)
+    return results
@@ -0,0 +1,244 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response  # type: ignore
+
+from config.cache import (CACHE_ERRORS, acache_get, acache_set, cache_get,
+                          cache_set, log_cache_error)
+from config.metrics import record_cache
+
+NETWORK = "network"
+PRODUCT = "product"
+
+
+def version_key(*parts) -> str:
+    """Ключ счётчика версии области кеша."""
+
+    return ":".join(["cache_version", *map(str, parts)])
+
+
+def get_versions(*keys) -> list[int]:
+    """Текущие версии областей кеша за одно обращение к хранилищу.
+
+    Отсутствующая версия инициализируется текущим временем, а не единицей,
+    чтобы вытесненный счётчик не совпал со старой версией закешированных
+    ответов.
+    """
+
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(*keys) -> list[int]:
+    """Асинхронный вариант :func:`get_versions`."""
+
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*keys) -> None:
+    """Инвалидирует области кеша, увеличивая их версии.
+
+    Вызывается из сигналов после записи в БД, поэтому недоступный кеш только
+    записывается в журнал и не превращает успешное изменение в ошибку;
+    ответы, сохранённые до сбоя, устаревают не позже чем через ``CACHE_TTL``.
+    """
+
+    try:
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), timeout=None)
+    except CACHE_ERRORS as error:
+        log_cache_error(error)
+
+
+def invalidate_network(*pks, everything=False) -> None:
+    """Инвалидирует списки звеньев сети и карточки указанных звеньев.
+
+    ``everything`` сбрасывает все ответы по звеньям сразу, например, когда
+    изменение одного звена меняет данные его покупателей.
+    """
+
+    if everything:
+        bump_versions(version_key(NETWORK))
+        return
+    bump_versions(
+        version_key(NETWORK, "list"), *(version_key(NETWORK, pk) for pk in pks)
+    )
+
+
+def invalidate_products(*pks) -> None:
+    """Инвалидирует список продуктов и карточки указанных продуктов."""
+
+    bump_versions(
+        version_key(PRODUCT, "list"), *(version_key(PRODUCT, pk) for pk in pks)
+    )
+
+
+class CachedResponseMixin:
+    """Кеширует ответы ``list`` и ``retrieve`` с версионированными ключами.
+
+    Ключ включает версии области, путь запроса и отсортированную строку
+    параметров фильтрации, поэтому любое изменение данных просто делает
+    старые ключи недостижимыми, а не удаляет их. Если кеш недоступен,
+    ответ строится без него.
+    """
+
+    cache_scope: str
+
+    def get_cache_dependencies(self, request) -> list[str]:
+        """Ключи версий других областей, от которых зависит ответ."""
+
+        return []
+
+    def get_version_keys(self, request, *version_parts) -> list[str]:
+        return [
+            version_key(self.cache_scope),
+            version_key(self.cache_scope, *version_parts),
+            *self.get_cache_dependencies(request),
+        ]
+
+    def build_cache_key(self, request, versions) -> str:
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        digest = hashlib.md5(
+            f"{request.get_host()}{request.path}?{query}".encode()
+        ).hexdigest()
+        return ":".join(["response", self.cache_scope, *map(str, versions), digest])
+
+    def get_cache_key(self, request, *version_parts) -> str | None:
+        """Ключ ответа; ``None``, если кеш недоступен."""
+
+        try:
+            versions = get_versions(*self.get_version_keys(request, *version_parts))
+        except CACHE_ERRORS as error:
+            log_cache_error(error)
+            return None
+        return self.build_cache_key(request, versions)
+
+    async def aget_cache_key(self, request, *version_parts) -> str | None:
+        try:
+            versions = await aget_versions(
+                *self.get_version_keys(request, *version_parts)
+            )
+        except CACHE_ERRORS as error:
+            log_cache_error(error)
+            return None
+        return self.build_cache_key(request, versions)
+
+    def build_cache_entry(self, request, key, response) -> dict:
+        """Запись кеша для ответа, построенного при промахе."""
+
+        return {"data": response.data}
+
+    def response_from_cache(self, request, key, entry):
+        return Response(entry["data"])
+
+    def cached_response(self, key, handler, request, *args, **kwargs):
+        if key is None:
+            return handler(request, *args, **kwargs)
+        entry = cache_get(key)
+        record_cache("response", entry is not None)
+        if entry is not None:
+            return self.response_from_cache(request, key, entry)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache_set(
+                key, self.build_cache_entry(request, key, response), settings.CACHE_TTL
+            )
+        return response
+
+    async def acached_response(self, key, handler, request, *args, **kwargs):
+        if key is None:
+            return await handler(request, *args, **kwargs)
+        entry = await acache_get(key)
+        record_cache("response", entry is not None)
+        if entry is not None:
+            return self.response_from_cache(request, key, entry)
+        response = await handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            await acache_set(
+                key, self.build_cache_entry(request, key, response), settings.CACHE_TTL
+            )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_cache_key(request, "list")
+        return self.cached_response(key, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        key = self.get_cache_key(
+            request, kwargs[self.lookup_url_kwarg or self.lookup_field]
+        )
+        return self.cached_response(key, super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        key = await self.aget_cache_key(request, "list")
+        return await self.acached_response(
+            key, super().alist, request, *args, **kwargs
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        key = await self.aget_cache_key(
+            request, kwargs[self.lookup_url_kwarg or self.lookup_field]
+        )
+        return await self.acached_response(
+            key, super().aretrieve, request, *args, **kwargs
+        )
+
+
+class ConditionalResponseMixin:
+    """Поддерживает условные GET-запросы для ответов :class:`CachedResponseMixin`.
+
+    ETag строится из версионированного ключа кеша и формата ответа, поэтому
+    меняется при любой инвалидации, в том числе при удалении, и не требует
+    запросов к БД. Last-Modified — время построения ответа текущей версии,
+    оно хранится в записи кеша вместе с данными. Ответ ``304 Not Modified``
+    отдаётся из кеша без сериализации. Если кеш недоступен, ответ
+    отдаётся без валидаторов.
+    """
+
+    @staticmethod
+    def get_etag(request, key) -> str:
+        # JSON и MessagePack одного ответа различаются
+        etag = hashlib.md5(f"{key}:{request.accepted_media_type}".encode()).hexdigest()
+        return quote_etag(etag)
+
+    @staticmethod
+    def set_conditional_headers(response, etag, last_modified):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ["Accept"])
+        return response
+
+    def build_cache_entry(self, request, key, response) -> dict:
+        entry = super().build_cache_entry(request, key, response)
+        # If-Modified-Since передаётся с точностью до секунды
+        entry["last_modified"] = int(time.time())
+        self.set_conditional_headers(
+            response, self.get_etag(request, key), entry["last_modified"]
+        )
+        return entry
+
+    def response_from_cache(self, request, key, entry):
+        etag = self.get_etag(request, key)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=entry["last_modified"]
+        )
+        if response is None:
+            response = super().response_from_cache(request, key, entry)
+        return self.set_conditional_headers(response, etag, entry["last_modified"])
@@ -0,0 +1,56 @@
+import csv
+import json
+
+from network.fastpath import ValuesRepresentation
+from network.serializers import NetworkNodeSerializer
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Псевдофайл для ``csv.writer``: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Построчно представляет звенья, читая их серверным курсором.
+
+    Строки строятся из ``values()`` без экземпляров моделей, в памяти
+    одновременно находится не более ``chunk_size`` звеньев и их продуктов,
+    независимо от размера выгрузки.
+    """
+
+    representation = ValuesRepresentation(NetworkNodeSerializer())
+    yield from representation.iter_represent(queryset, chunk_size)
+
+
+def iter_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Строки CSV с заголовком; продукты перечисляются через ``;``."""
+
+    writer = csv.writer(Echo())
+    header = list(NetworkNodeSerializer().fields)
+    yield writer.writerow(header)
+    for row in iter_rows(queryset, chunk_size):
+        row["products"] = ";".join(map(str, row["products"]))
+        yield writer.writerow([row[field] for field in header])
+
+
+def iter_ndjson(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Строки NDJSON, по одному JSON-объекту звена на строку."""
+
+    for row in iter_rows(queryset, chunk_size):
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def iter_export(queryset, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """Потоковая выгрузка звеньев в формате ``csv`` или ``ndjson``."""
+
+    exporters = {"csv": iter_csv, "ndjson": iter_ndjson}
+    return exporters[export_format](queryset, chunk_size)
@@ -0,0 +1,230 @@
+from itertools import islice
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db import connections
+from django.db.models import OuterRef
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers  # type: ignore
+from rest_framework.response import Response  # type: ignore
+from rest_framework.settings import api_settings  # type: ignore
+
+from config.timing import measure
+from network.paginators import afetch_all
+
+# Поля, представление которых совпадает со значением из БД
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class ValuesRepresentation:
+    """Быстрое представление только для чтения по полям сериализатора.
+
+    Строки читаются через ``values()`` без создания экземпляров моделей,
+    идентификаторы связей многие-ко-многим собираются в БД. Значения
+    преобразуются методами ``to_representation`` тех же полей
+    сериализатора, поэтому результат совпадает с ``serializer.data``.
+    Вложенные сериализаторы не поддерживаются.
+    """
+
+    def __init__(self, serializer):
+        model = serializer.Meta.model
+        self.columns = []
+        self.many = {}
+        for name, field in serializer.fields.items():
+            if isinstance(field, serializers.ManyRelatedField):
+                self.many[name] = model._meta.get_field(field.source)
+            else:
+                self.columns.append((name, field))
+
+    @staticmethod
+    def is_supported(serializer) -> bool:
+        return not any(
+            isinstance(field, serializers.BaseSerializer)
+            for field in serializer.fields.values()
+        )
+
+    @staticmethod
+    def converter(field):
+        """Функция представления значения поля или ``None``, если значение
+        из БД уже совпадает с представлением.
+
+        Часовой пояс даты и времени определяется один раз на порцию строк,
+        а не для каждого значения, как в ``DateTimeField.to_representation``.
+        """
+
+        if isinstance(field, PASSTHROUGH_FIELDS):
+            return None
+        output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+        if isinstance(field, serializers.DateTimeField) and output_format == ISO_8601:
+            field_timezone = (
+                field.timezone
+                if hasattr(field, "timezone")
+                else field.default_timezone()
+            )
+            if field_timezone is not None:
+
+                def convert(value):
+                    if not timezone.is_aware(value):
+                        return field.to_representation(value)
+                    value = value.astimezone(field_timezone).isoformat()
+                    if value.endswith("+00:00"):
+                        value = value[:-6] + "Z"
+                    return value
+
+                return convert
+        return field.to_representation
+
+    def links(self, name):
+        """Промежуточная модель связи, её поля и порядок связанных объектов."""
+
+        field = self.many[name]
+        through = field.remote_field.through
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        ordering = [
+            f"-{target}__{order[1:]}" if order.startswith("-") else f"{target}__{order}"
+            for order in field.related_model._meta.ordering
+        ]
+        return through, source, target, ordering
+
+    def values(self, queryset, *extra):
+        """Набор словарей с нужными столбцами; ``extra`` — дополнительные
+        столбцы, например, ключи сортировки курсорной пагинации."""
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        annotations = {}
+        if connections[queryset.db].vendor == "postgresql":
+            for name in self.many:
+                through, source, target, ordering = self.links(name)
+                annotations[f"{name}_ids"] = ArraySubquery(
+                    through.objects.filter(**{source: OuterRef("pk")})
+                    .order_by(*ordering)
+                    .values(f"{target}_id")
+                )
+        names = dict.fromkeys(["pk", *(name for name, _ in self.columns), *extra])
+        return queryset.values(*names, **annotations)
+
+    def needs_links(self, using) -> bool:
+        """Нужно ли читать связи многие-ко-многим отдельным запросом:
+        вне PostgreSQL они не собираются в массив в основном запросе."""
+
+        return bool(self.many) and connections[using].vendor != "postgresql"
+
+    def link_query(self, name, rows, using):
+        """Связи строк в виде словарей: ``values_list().aiterator()``
+        в Django 4.2 выполняет запрос синхронно."""
+
+        through, source, target, ordering = self.links(name)
+        return (
+            through.objects.using(using)
+            .filter(**{f"{source}_id__in": [row["pk"] for row in rows]})
+            .order_by(*ordering)
+            .values(f"{source}_id", f"{target}_id")
+        )
+
+    @staticmethod
+    def attach_links(rows, name, links):
+        ids = {row["pk"]: [] for row in rows}
+        for link in links:
+            pk, related_pk = link.values()
+            ids[pk].append(related_pk)
+        for row in rows:
+            row[f"{name}_ids"] = ids[row["pk"]]
+
+    def represent(self, rows, using="default") -> list[dict]:
+        """Представления строк ``values()`` в порядке полей сериализатора."""
+
+        rows = list(rows)
+        if self.needs_links(using):
+            for name in self.many:
+                self.attach_links(rows, name, self.link_query(name, rows, using))
+        return self.to_representation(rows)
+
+    async def arepresent(self, rows, using="default") -> list[dict]:
+        """Асинхронный вариант :meth:`represent` для прочитанных строк."""
+
+        if self.needs_links(using):
+            for name in self.many:
+                links = [
+                    link async for link in self.link_query(name, rows, using).aiterator()
+                ]
+                self.attach_links(rows, name, links)
+        return self.to_representation(rows)
+
+    def to_representation(self, rows) -> list[dict]:
+        columns = [(name, self.converter(field)) for name, field in self.columns]
+        with measure("serialize"):
+            return [
+                {
+                    **{
+                        name: (
+                            row[name]
+                            if convert is None or row[name] is None
+                            else convert(row[name])
+                        )
+                        for name, convert in columns
+                    },
+                    **{name: list(row[f"{name}_ids"]) for name in self.many},
+                }
+                for row in rows
+            ]
+
+    def iter_represent(self, queryset, chunk_size):
+        """Построчно представляет набор, читая его серверным курсором."""
+
+        rows = self.values(queryset).iterator(chunk_size=chunk_size)
+        while chunk := list(islice(rows, chunk_size)):
+            yield from self.represent(chunk, queryset.db)
+
+
+class FastListMixin:
+    """Отдаёт ``list`` через :class:`ValuesRepresentation`, когда ответ
+    не содержит вложенных объектов."""
+
+    def use_fast_path(self) -> bool:
+        return True
+
+    def get_fast_rows(self, request, serializer):
+        representation = ValuesRepresentation(serializer)
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = ()
+        if self.paginator is not None and hasattr(self.paginator, "get_ordering"):
+            ordering = self.paginator.get_ordering(request, queryset, self)
+        rows = representation.values(
+            queryset, *(field.lstrip("-") for field in ordering)
+        )
+        return representation, rows
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        if not self.use_fast_path() or not ValuesRepresentation.is_supported(
+            serializer
+        ):
+            return super().list(request, *args, **kwargs)
+        representation, rows = self.get_fast_rows(request, serializer)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(
+                representation.represent(page, rows.db)
+            )
+        return Response(representation.represent(rows, rows.db))
+
+    async def alist(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        if not self.use_fast_path() or not ValuesRepresentation.is_supported(
+            serializer
+        ):
+            return await super().alist(request, *args, **kwargs)
+        representation, rows = self.get_fast_rows(request, serializer)
+        page = await self.apaginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(
+                await representation.arepresent(page, rows.db)
+            )
+        return Response(
+            await representation.arepresent(await afetch_all(rows), rows.db)
+        )
@@ -0,0 +1,84 @@
+from rest_framework.exceptions import ValidationError  # type: ignore
+
+from network.cache import NETWORK, PRODUCT, version_key
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+# Раскрываемое поле и ключ версии кеша, от которой зависит ответ
+EXPANDABLE = {
+    "supplier": version_key(NETWORK, "list"),
+    "products": version_key(PRODUCT, "list"),
+}
+
+
+def parse_names(request, param) -> list[str] | None:
+    """Имена из параметра запроса через запятую без повторов."""
+
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return list(
+        dict.fromkeys(name.strip() for name in value.split(",") if name.strip())
+    )
+
+
+class NetworkNodeFieldsetMixin:
+    """Выборочные поля ``?fields=`` и раскрытие связей ``?expand=`` для
+    представлений чтения звеньев сети.
+
+    Набор запросов ограничивается нужными столбцами через ``.only()``,
+    поставщик присоединяется, а продукты подгружаются, только если они
+    попадают в ответ. Ответы с раскрытыми связями кешируются и помечаются
+    ETag с учётом изменений поставщиков и продуктов.
+    """
+
+    def get_fieldset(self):
+        if not hasattr(self, "_fieldset"):
+            fields = parse_names(self.request, FIELDS_PARAM)
+            expand = parse_names(self.request, EXPAND_PARAM) or []
+            available = self.serializer_class().fields
+            errors = {}
+            if fields is not None and not set(fields) <= set(available):
+                errors[FIELDS_PARAM] = "Неизвестные поля: {}.".format(
+                    ", ".join(sorted(set(fields) - set(available)))
+                )
+            if not set(expand) <= set(EXPANDABLE):
+                errors[EXPAND_PARAM] = "Раскрываются только поля: {}.".format(
+                    ", ".join(EXPANDABLE)
+                )
+            if errors:
+                raise ValidationError(errors)
+            if fields is not None:
+                expand = [name for name in expand if name in fields]
+            self._fieldset = fields, expand
+        return self._fieldset
+
+    def get_queryset(self):
+        return self.trim_queryset(super().get_queryset())
+
+    def trim_queryset(self, queryset):
+        """Ограничивает набор запросов полями и связями ответа."""
+
+        fields, expand = self.get_fieldset()
+        if "supplier" not in expand:
+            queryset = queryset.select_related(None)
+        if fields is None:
+            return queryset
+        if "products" not in fields:
+            queryset = queryset.prefetch_related(None)
+        ordering = getattr(self.paginator, "ordering", ())
+        columns = {"pk", *ordering, *fields} - {"id", "products"}
+        return queryset.only(*columns)
+
+    def use_fast_path(self):
+        _, expand = self.get_fieldset()
+        return not expand
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_fieldset()
+        return super().get_serializer(*args, fields=fields, expand=expand, **kwargs)
+
+    def get_cache_dependencies(self, request):
+        _, expand = self.get_fieldset()
+        return [EXPANDABLE[name] for name in expand]
@@ -1,11 +1,92 @@
 import django_filters  # type: ignore
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramWordSimilarity)
+from django.db import connections
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, Greatest
+from rest_framework.filters import BaseFilterBackend  # type: ignore
 
-from .models import NetworkNode
+from .models import NetworkNode, search_vector
 
 
 class NetworkNodeFilter(django_filters.FilterSet):
     country = django_filters.CharFilter(lookup_expr="icontains", label="Страна")
+    city = django_filters.CharFilter(label="Город")
+    supplier = django_filters.NumberFilter(field_name="supplier_id", label="Поставщик")
+    debt_min = django_filters.NumberFilter(
+        field_name="debt", lookup_expr="gte", label="Задолженность от"
+    )
+    debt_max = django_filters.NumberFilter(
+        field_name="debt", lookup_expr="lte", label="Задолженность до"
+    )
+    time = django_filters.IsoDateTimeFromToRangeFilter(label="Время создания")
+    product = django_filters.NumberFilter(field_name="products", label="Продукт")
 
     class Meta:
         model = NetworkNode
-        fields = ["country"]
+        fields = ["country", "type", "city", "supplier", "product"]
+
+
+def search(queryset, fields, term):
+    """Отбирает строки, подходящие под поисковый запрос, и оценивает их
+    релевантность в аннотации ``search_rank``.
+
+    На PostgreSQL используются полнотекстовый поиск и триграммное сходство
+    слов, которые обслуживаются GIN-индексами. На других СУБД выполняется
+    поиск подстроки, а релевантность равна числу совпавших полей.
+    """
+
+    if connections[queryset.db].vendor == "postgresql":
+        query = SearchQuery(term, config="simple", search_type="websearch")
+        similar = Q()
+        for field in fields:
+            similar |= Q(**{f"{field}__trigram_word_similar": term})
+        similarities = [TrigramWordSimilarity(term, field) for field in fields]
+        rank = SearchRank(search_vector(fields), query) + (
+            Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        )
+        queryset = queryset.annotate(search_document=search_vector(fields)).filter(
+            Q(search_document=query) | similar
+        )
+    else:
+        matches = Q()
+        for field in fields:
+            matches |= Q(**{f"{field}__icontains": term})
+        rank = sum(
+            Case(
+                When(**{f"{field}__icontains": term}, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            for field in fields
+        )
+        queryset = queryset.filter(matches)
+    # Вещественное число двойной точности точно переносится в позицию курсора
+    return queryset.annotate(search_rank=Cast(rank, FloatField()))
+
+
+class RankedSearchFilter(BaseFilterBackend):
+    """Поиск ``?search=`` по полям ``search_fields`` представления с
+    сортировкой по релевантности."""
+
+    search_param = "search"
+
+    def get_search_term(self, request):
+        return request.query_params.get(self.search_param, "").strip()
+
+    def filter_queryset(self, request, queryset, view):
+        term = self.get_search_term(request)
+        if not term:
+            return queryset
+        return search(queryset, view.search_fields, term)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.search_param,
+                "required": False,
+                "in": "query",
+                "description": "Поисковый запрос",
+                "schema": {"type": "string"},
+            }
+        ]
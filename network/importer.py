@@ -0,0 +1,520 @@
+import csv
+import logging
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from network.cache import invalidate_network, invalidate_products
+from network.models import NetworkNode, Product, SupplierType
+from network.services import rebuild_subtrees
+from network.stats import apply_deltas, queryset_deltas
+
+logger = logging.getLogger(__name__)
+
+NODE_COLUMNS = (
+    "title",
+    "email",
+    "country",
+    "city",
+    "street",
+    "house",
+    "type",
+    "supplier",
+    "debt",
+)
+PRODUCT_COLUMNS = ("title", "model", "release_date")
+LINK_COLUMNS = ("node", "product", "model")
+
+SUPPLIER_NOT_FOUND = "Поставщик не найден."
+DUPLICATE_TITLE = "Название повторяется в файле."
+CYCLE_FOUND = "Цепочка поставок замыкается в цикл для звеньев: {}."
+
+# Допустимые значения номера дома (PositiveSmallIntegerField) и задолженности
+# (DecimalField(max_digits=10, decimal_places=2)) в файле
+HOUSE_FORMAT = "[0-9]{1,5}"
+MAX_HOUSE = 32767
+DEBT_FORMAT = r"-?[0-9]{1,8}(\.[0-9]{1,2})?"
+
+# Проверки формата значений, которые выполняются до NODE_RULES, пока значения
+# ещё строки: (сообщение, SQL-условие, параметры, проверка строки в Python)
+FORMAT_RULES = [
+    (
+        f"Номер дома должен быть целым числом от 0 до {MAX_HOUSE}.",
+        # Пятизначные номера сравниваются как строки, без приведения типа
+        "house IS NOT NULL AND (house !~ %s "
+        "OR length(house) = 5 AND house COLLATE \"C\" > %s)",
+        [f"^{HOUSE_FORMAT}$", str(MAX_HOUSE)],
+        lambda row: row["house"] is not None
+        and (
+            not re.fullmatch(HOUSE_FORMAT, row["house"]) or int(row["house"]) > MAX_HOUSE
+        ),
+    ),
+    (
+        "Задолженность должна быть числом не больше 99999999.99 "
+        "с двумя знаками после запятой.",
+        "debt !~ %s",
+        [f"^{DEBT_FORMAT}$"],
+        lambda row: not re.fullmatch(DEBT_FORMAT, row["debt"]),
+    ),
+]
+
+# Правила NetworkNodeValidator в виде пар (сообщение, SQL-условие, параметры,
+# проверка строки в Python) для обоих способов загрузки.
+NODE_RULES = [
+    (
+        "Название и почта обязательны.",
+        "title IS NULL OR email IS NULL",
+        [],
+        lambda row: not row["title"] or not row["email"],
+    ),
+    (
+        "Неизвестный тип звена сети.",
+        "type NOT IN %s",
+        [tuple(SupplierType.values)],
+        lambda row: row["type"] not in SupplierType.values,
+    ),
+    (
+        "Завод не может закупать товары для реализации.",
+        "type = %s AND supplier IS NOT NULL",
+        [SupplierType.FACTORY],
+        lambda row: row["type"] == SupplierType.FACTORY and row["supplier"],
+    ),
+    (
+        "Завод не может быть должником по закупкам.",
+        "type = %s AND debt <> 0",
+        [SupplierType.FACTORY],
+        lambda row: row["type"] == SupplierType.FACTORY and row["debt"],
+    ),
+    (
+        "Задолженность перед поставщиком не может быть установлена "
+        "без наличия поставщика.",
+        "debt <> 0 AND supplier IS NULL",
+        [],
+        lambda row: row["debt"] and not row["supplier"],
+    ),
+]
+
+
+@dataclass
+class ImportReport:
+    """Итоги загрузки: число строк, время этапов и отклонённые строки."""
+
+    stages: list[tuple[str, int, float]] = field(default_factory=list)
+    rejected: list[tuple[int, str, str]] = field(default_factory=list)
+
+    def add_stage(self, name: str, rows: int, started: float) -> str:
+        elapsed = time.monotonic() - started
+        self.stages.append((name, rows, elapsed))
+        rate = rows / elapsed if elapsed else rows
+        return f"{name}: {rows} строк за {elapsed:.2f} с ({rate:.0f} строк/с)"
+
+
+def read_header(file, allowed):
+    """Читает заголовок CSV и проверяет, что все колонки известны."""
+
+    header = next(csv.reader([file.readline()]))
+    unknown = set(header) - set(allowed)
+    if unknown or ("title" not in header and "node" not in header):
+        raise ValueError(
+            f"Недопустимые колонки {sorted(unknown)}; допустимы: {', '.join(allowed)}."
+        )
+    return header
+
+
+class PostgresImporter:
+    """Загрузка через ``COPY`` во временные таблицы и слияние одним SQL.
+
+    Правила ``NetworkNodeValidator`` и разрешение поставщика по названию
+    выполняются в БД над всей временной таблицей, а не построчно.
+    """
+
+    def __init__(self, report, log):
+        self.report = report
+        self.log = log
+        self.imported = NetworkNode.objects.none()
+        self.deltas = None
+
+    def copy(self, cursor, table, columns, file):
+        header = read_header(file, columns)
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(header)}) FROM STDIN WITH (FORMAT csv)", file
+        )
+        cursor.execute(f"SELECT count(*) FROM {table}")
+        return cursor.fetchone()[0]
+
+    def import_products(self, cursor, file):
+        started = time.monotonic()
+        cursor.execute(
+            "CREATE TEMP TABLE staging_product "
+            "(title text, model text, release_date date) ON COMMIT DROP"
+        )
+        rows = self.copy(cursor, "staging_product", PRODUCT_COLUMNS, file)
+        cursor.execute(
+            """
+            INSERT INTO network_product (title, model, release_date, updated_at)
+            SELECT DISTINCT ON (s.title, NULLIF(s.model, '')) s.title, NULLIF(s.model, ''),
+                   s.release_date, now()
+            FROM staging_product AS s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM network_product AS p
+                WHERE p.title = s.title
+                  AND p.model IS NOT DISTINCT FROM NULLIF(s.model, '')
+            )
+            """
+        )
+        self.log(self.report.add_stage("Продукты", rows, started))
+
+    def import_nodes(self, cursor, file):
+        started = time.monotonic()
+        cursor.execute(
+            """
+            CREATE TEMP TABLE staging_node (
+                line bigserial, title text, email text, country text, city text,
+                street text, house text, type text, supplier text,
+                debt text, error text
+            ) ON COMMIT DROP
+            """
+        )
+        rows = self.copy(cursor, "staging_node", NODE_COLUMNS, file)
+        cursor.execute(
+            """
+            UPDATE staging_node SET
+                title = NULLIF(title, ''),
+                email = NULLIF(email, ''),
+                type = COALESCE(NULLIF(type, ''), %s),
+                supplier = NULLIF(supplier, ''),
+                house = NULLIF(btrim(house), ''),
+                debt = COALESCE(NULLIF(btrim(debt), ''), '0')
+            """,
+            [SupplierType.FACTORY],
+        )
+        self.validate(cursor)
+        self.imported = NetworkNode.objects.filter(
+            title__in=RawSQL("SELECT title FROM staging_node WHERE error IS NULL", [])
+        )
+        self.deltas = queryset_deltas(self.imported, sign=-1)
+        cursor.execute(
+            """
+            INSERT INTO network_networknode (
+                title, email, country, city, street, house, type, debt,
+                "time", updated_at, path, level
+            )
+            SELECT title, email, country, city, street, house, type, debt,
+                   now(), now(), '', 0
+            FROM staging_node WHERE error IS NULL
+            ON CONFLICT (title) DO UPDATE SET
+                email = EXCLUDED.email,
+                country = EXCLUDED.country,
+                city = EXCLUDED.city,
+                street = EXCLUDED.street,
+                house = EXCLUDED.house,
+                type = EXCLUDED.type,
+                debt = EXCLUDED.debt,
+                updated_at = EXCLUDED.updated_at
+            """
+        )
+        cursor.execute(
+            """
+            UPDATE network_networknode AS node
+            SET supplier_id = supplier.id
+            FROM staging_node AS s
+            LEFT JOIN network_networknode AS supplier ON supplier.title = s.supplier
+            WHERE node.title = s.title AND s.error IS NULL
+              AND node.supplier_id IS DISTINCT FROM supplier.id
+            """
+        )
+        cursor.execute(
+            "SELECT line, title, error FROM staging_node "
+            "WHERE error IS NOT NULL ORDER BY line"
+        )
+        self.report.rejected.extend(cursor.fetchall())
+        self.log(self.report.add_stage("Звенья сети", rows, started))
+
+    def validate(self, cursor):
+        """Помечает строки, нарушающие правила ``NetworkNodeValidator``."""
+
+        cursor.execute(
+            """
+            UPDATE staging_node SET error = %s
+            WHERE title IN (
+                SELECT title FROM staging_node GROUP BY title HAVING count(*) > 1
+            )
+            """,
+            [DUPLICATE_TITLE],
+        )
+        for message, condition, params, _ in FORMAT_RULES:
+            cursor.execute(
+                f"UPDATE staging_node SET error = %s "
+                f"WHERE error IS NULL AND ({condition})",
+                [message, *params],
+            )
+        # Значения отклонённых строк не приводятся к типам полей
+        cursor.execute(
+            """
+            ALTER TABLE staging_node
+                ALTER COLUMN house TYPE smallint
+                    USING CASE WHEN error IS NULL THEN house::smallint END,
+                ALTER COLUMN debt TYPE numeric(10, 2)
+                    USING CASE WHEN error IS NULL THEN debt::numeric END
+            """
+        )
+        for message, condition, params, _ in NODE_RULES:
+            cursor.execute(
+                f"UPDATE staging_node SET error = %s "
+                f"WHERE error IS NULL AND ({condition})",
+                [message, *params],
+            )
+        # Отклонённый поставщик делает недоступными и его покупателей
+        while True:
+            cursor.execute(
+                """
+                UPDATE staging_node AS s SET error = %s
+                WHERE s.error IS NULL AND s.supplier IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM staging_node AS other
+                      WHERE other.title = s.supplier AND other.error IS NULL
+                  )
+                  AND NOT EXISTS (
+                      SELECT 1 FROM network_networknode AS node
+                      WHERE node.title = s.supplier
+                  )
+                """,
+                [SUPPLIER_NOT_FOUND],
+            )
+            if not cursor.rowcount:
+                break
+
+    def import_links(self, cursor, file):
+        started = time.monotonic()
+        cursor.execute(
+            "CREATE TEMP TABLE staging_link "
+            "(node text, product text, model text) ON COMMIT DROP"
+        )
+        rows = self.copy(cursor, "staging_link", LINK_COLUMNS, file)
+        cursor.execute(
+            """
+            INSERT INTO network_networknode_products (networknode_id, product_id)
+            SELECT DISTINCT node.id, product.id
+            FROM staging_link AS s
+            JOIN network_networknode AS node ON node.title = s.node
+            JOIN network_product AS product
+              ON product.title = s.product
+             AND product.model IS NOT DISTINCT FROM NULLIF(s.model, '')
+            ON CONFLICT DO NOTHING
+            """
+        )
+        self.log(self.report.add_stage("Связи звеньев и продуктов", rows, started))
+
+    def run(self, nodes=None, products=None, links=None):
+        with connection.cursor() as cursor:
+            if products:
+                self.import_products(cursor, products)
+            if nodes:
+                self.import_nodes(cursor, nodes)
+            if links:
+                self.import_links(cursor, links)
+
+
+class FallbackImporter:
+    """Загрузка через ``bulk_create`` для СУБД без ``COPY`` (SQLite в тестах)."""
+
+    def __init__(self, report, log, batch_size):
+        self.report = report
+        self.log = log
+        self.batch_size = batch_size
+        self.imported = NetworkNode.objects.none()
+        self.deltas = None
+
+    def read(self, file, columns):
+        header = read_header(file, columns)
+        return [
+            (line, dict(zip(header, values)))
+            for line, values in enumerate(csv.reader(file), start=1)
+        ]
+
+    def import_products(self, file):
+        started = time.monotonic()
+        rows = self.read(file, PRODUCT_COLUMNS)
+        existing = set(Product.objects.values_list("title", "model"))
+        new = {}
+        for _, row in rows:
+            key = (row["title"], row.get("model") or None)
+            if key not in existing:
+                new[key] = Product(
+                    title=key[0],
+                    model=key[1],
+                    release_date=row.get("release_date") or None,
+                )
+        Product.objects.bulk_create(new.values(), batch_size=self.batch_size)
+        self.log(self.report.add_stage("Продукты", len(rows), started))
+
+    def validate(self, rows):
+        """Применяет правила ``NetworkNodeValidator`` и проверку поставщиков."""
+
+        titles = Counter(row.get("title") or None for _, row in rows)
+        valid = {}
+        for line, row in rows:
+            row.update(
+                title=row.get("title") or None,
+                email=row.get("email") or None,
+                type=row.get("type") or SupplierType.FACTORY,
+                supplier=row.get("supplier") or None,
+                house=(row.get("house") or "").strip() or None,
+                debt=(row.get("debt") or "").strip() or "0",
+            )
+            errors = [message for message, *_, check in FORMAT_RULES if check(row)]
+            if not errors:
+                row.update(
+                    house=row["house"] and int(row["house"]), debt=Decimal(row["debt"])
+                )
+                errors = [message for message, *_, check in NODE_RULES if check(row)]
+            if titles[row["title"]] > 1:
+                errors.insert(0, DUPLICATE_TITLE)
+            if errors:
+                self.report.rejected.append((line, row["title"], errors[0]))
+            else:
+                valid[row["title"]] = (line, row)
+        known = set(
+            NetworkNode.objects.filter(
+                title__in={row["supplier"] for _, row in valid.values()}
+            ).values_list("title", flat=True)
+        )
+        changed = True
+        while changed:
+            changed = False
+            for title, (line, row) in list(valid.items()):
+                supplier = row["supplier"]
+                if supplier and supplier not in valid and supplier not in known:
+                    self.report.rejected.append((line, title, SUPPLIER_NOT_FOUND))
+                    del valid[title]
+                    changed = True
+        return [row for _, row in valid.values()]
+
+    def import_nodes(self, file):
+        started = time.monotonic()
+        rows = self.read(file, NODE_COLUMNS)
+        valid = self.validate(rows)
+        self.imported = NetworkNode.objects.filter(title__in=[row["title"] for row in valid])
+        self.deltas = queryset_deltas(self.imported, sign=-1)
+        now = timezone.now()
+        fields = [column for column in NODE_COLUMNS if column != "supplier"]
+        NetworkNode.objects.bulk_create(
+            [
+                NetworkNode(
+                    **{
+                        column: row.get(column) or None
+                        for column in fields
+                        if column not in ("type", "house", "debt")
+                    },
+                    type=row["type"],
+                    house=row["house"],
+                    debt=row["debt"],
+                    updated_at=now,
+                )
+                for row in valid
+            ],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=["title"],
+            update_fields=[column for column in fields if column != "title"]
+            + ["updated_at"],
+        )
+        ids = dict(
+            NetworkNode.objects.filter(
+                title__in={row["title"] for row in valid}
+                | {row["supplier"] for row in valid if row["supplier"]}
+            ).values_list("title", "pk")
+        )
+        nodes = [
+            NetworkNode(pk=ids[row["title"]], supplier_id=ids.get(row["supplier"]))
+            for row in valid
+        ]
+        NetworkNode.objects.bulk_update(nodes, ["supplier"], batch_size=self.batch_size)
+        self.report.rejected.sort()
+        self.log(self.report.add_stage("Звенья сети", len(rows), started))
+
+    def import_links(self, file):
+        started = time.monotonic()
+        rows = self.read(file, LINK_COLUMNS)
+        nodes = dict(
+            NetworkNode.objects.filter(
+                title__in={row["node"] for _, row in rows}
+            ).values_list("title", "pk")
+        )
+        products = {
+            (title, model): pk
+            for pk, title, model in Product.objects.filter(
+                title__in={row["product"] for _, row in rows}
+            ).values_list("pk", "title", "model")
+        }
+        through = NetworkNode.products.through
+        links = {
+            (nodes[row["node"]], products[key])
+            for _, row in rows
+            if row["node"] in nodes
+            and (key := (row["product"], row.get("model") or None)) in products
+        }
+        through.objects.bulk_create(
+            [
+                through(networknode_id=node, product_id=product)
+                for node, product in links
+            ],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        self.log(self.report.add_stage("Связи звеньев и продуктов", len(rows), started))
+
+    def run(self, nodes=None, products=None, links=None):
+        if products:
+            self.import_products(products)
+        if nodes:
+            self.import_nodes(nodes)
+        if links:
+            self.import_links(links)
+
+
+def import_network(
+    nodes=None, products=None, links=None, batch_size=5000, log=logger.info
+):
+    """Загружает звенья сети, продукты и их связи из CSV-файлов.
+
+    Вся загрузка выполняется в одной транзакции. После слияния пересчитываются
+    только пути загруженных звеньев, сменивших место в иерархии, и их
+    покупателей, а сводная задолженность меняется на вклад загруженных
+    звеньев. Новый цикл поставок откатывает загрузку; звенья, которые уже
+    были вне иерархии, ей не мешают. Итоги этапов передаются в ``log``,
+    по умолчанию в журнал ``network.importer``.
+    """
+
+    report = ImportReport()
+    if connection.vendor == "postgresql":
+        importer = PostgresImporter(report, log)
+    else:
+        importer = FallbackImporter(report, log, batch_size)
+    with transaction.atomic():
+        detached = set(NetworkNode.objects.filter(path="").values_list("pk", flat=True))
+        importer.run(nodes=nodes, products=products, links=links)
+        if nodes:
+            started = time.monotonic()
+            rows = rebuild_subtrees(importer.imported)
+            cycle = list(
+                NetworkNode.objects.filter(path="")
+                .exclude(pk__in=detached)
+                .values_list("title", flat=True)[:20]
+            )
+            if cycle:
+                raise ValueError(CYCLE_FOUND.format(", ".join(cycle)))
+            log(report.add_stage("Иерархия поставщиков", rows, started))
+            started = time.monotonic()
+            deltas = queryset_deltas(importer.imported, deltas=importer.deltas)
+            apply_deltas(deltas)
+            log(report.add_stage("Сводная задолженность", len(deltas), started))
+    invalidate_network(everything=True)
+    invalidate_products()
+    return report
@@ -0,0 +1,136 @@
+import json
+import platform
+import time
+
+import django
+import rest_framework  # type: ignore
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from network.benchmarks import (BenchmarkContext, run_suite,
+                                uncovered_url_names)
+from network.seeding import SeedOptions, clear_seeded, seed_network
+
+PREFIX = "Benchmark"
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет процентили времени ответа и число SQL-запросов для каждого "
+        "эндпоинта network/urls.py и users/urls.py на сгенерированных сетях "
+        "заданных размеров. Результат в JSON удобно сравнивать между версиями "
+        "через --baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1000, 100_000, 1_000_000],
+            help="Размеры сети, звеньев.",
+        )
+        parser.add_argument("--requests", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--output", help="Файл для результатов в JSON.")
+        parser.add_argument(
+            "--baseline", help="JSON предыдущего замера для сравнения p50 и p95."
+        )
+        parser.add_argument(
+            "--only", nargs="+", help="Только сценарии, содержащие подстроку."
+        )
+        parser.add_argument(
+            "--cached", action="store_true", help="Не обходить кеш ответов."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--keep", action="store_true", help="Не удалять последнюю сеть."
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["warmup"] < 0:
+            raise CommandError("--requests must be positive, --warmup non-negative.")
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as file:
+                baseline = json.load(file)
+
+        report = {
+            "environment": self.environment(options),
+            "uncovered": uncovered_url_names(),
+            "results": {},
+        }
+        for name in report["uncovered"]:
+            self.stderr.write(f"No benchmark scenario for {name}")
+
+        for index, size in enumerate(options["sizes"]):
+            self.stdout.write(f"\n{size} nodes")
+            report["results"][str(size)] = self.run_size(size, options, baseline)
+            if not options["keep"] or index < len(options["sizes"]) - 1:
+                clear_seeded(PREFIX)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+                file.write("\n")
+            self.stdout.write(f"\nSaved to {options['output']}")
+
+    @staticmethod
+    def environment(options):
+        return {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "rest_framework": rest_framework.VERSION,
+            "database": connection.vendor,
+            "requests": options["requests"],
+            "warmup": options["warmup"],
+            "cached": options["cached"],
+            "seed": options["seed"],
+        }
+
+    def run_size(self, size, options, baseline):
+        clear_seeded(PREFIX)
+        started = time.perf_counter()
+        seed_network(
+            SeedOptions(nodes=size, prefix=PREFIX, seed=options["seed"]),
+            log=lambda message: None,
+        )
+        seed_seconds = time.perf_counter() - started
+        self.stdout.write(f"seeded in {seed_seconds:.1f} s")
+        previous = {}
+        if baseline:
+            previous = baseline["results"].get(str(size), {}).get("scenarios", {})
+
+        self.stdout.write(
+            f"{'scenario':<44} {'status':>6} {'p50':>9} {'p95':>9} {'p99':>9} "
+            f"{'queries':>7}" + (f" {'p50 x':>6} {'p95 x':>6}" if baseline else "")
+        )
+
+        def log(name, result):
+            latency = result["latency_ms"]
+            line = (
+                f"{name:<44} {result['status']:>6} {latency['p50']:>9.2f} "
+                f"{latency['p95']:>9.2f} {latency['p99']:>9.2f} "
+                f"{result['queries']['median']:>7}"
+            )
+            if name in previous:
+                old = previous[name]["latency_ms"]
+                line += (
+                    f" {latency['p50'] / old['p50']:>6.2f}"
+                    f" {latency['p95'] / old['p95']:>6.2f}"
+                )
+            self.stdout.write(line)
+
+        ctx = BenchmarkContext.create(PREFIX)
+        try:
+            scenarios = run_suite(
+                ctx,
+                options["requests"],
+                options["warmup"],
+                cached=options["cached"],
+                only=options["only"],
+                log=log,
+            )
+        finally:
+            ctx.delete()
+        return {"seed_seconds": round(seed_seconds, 3), "scenarios": scenarios}
@@ -0,0 +1,196 @@
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from network.models import NetworkNode, Product
+from users.models import User
+
+# Пары синхронного и асинхронного эндпоинтов: (название, WSGI, ASGI)
+ENDPOINTS = (
+    ("network list", "network:network_list", "network:async_network_list"),
+    ("network retrieve", "network:network_retrieve", "network:async_network_retrieve"),
+    ("product list", "network:product-list", "network:async_product_list"),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность синхронных (WSGI) и асинхронных "
+        "(ASGI) эндпоинтов чтения при одновременных запросах и медленной БД. "
+        "Задержка БД имитируется паузой перед каждым SQL-запросом. Тестовые "
+        "данные удаляются после замера."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument(
+            "--threads", type=int, default=8, help="Потоков WSGI-сервера."
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=64, help="Одновременных запросов."
+        )
+        parser.add_argument(
+            "--latency", type=float, default=20, help="Задержка SQL-запроса, мс."
+        )
+
+    def handle(self, *args, **options):
+        user, node = self.seed(options["rows"])
+        token = f"Bearer {AccessToken.for_user(user)}"
+        latency = options["latency"] / 1000
+        limits = {
+            "MAX_CONCURRENT_REQUESTS": options["concurrency"],
+            "MAX_CONCURRENT_REQUESTS_PER_USER": options["concurrency"],
+            "REST_FRAMEWORK": {
+                **settings.REST_FRAMEWORK,
+                "DEFAULT_THROTTLE_RATES": {},
+            },
+        }
+        self.stdout.write(
+            f"{'endpoint':<18} {'wsgi, rps':>10} {'asgi, rps':>10} {'x':>6}"
+        )
+        try:
+            with override_settings(**limits), SlowDatabase(latency):
+                wsgi, asgi = get_wsgi_application(), get_asgi_application()
+                for name, sync_name, async_name in ENDPOINTS:
+                    kwargs = {"pk": node.pk} if "retrieve" in name else {}
+                    sync_rps = self.measure_wsgi(
+                        wsgi, reverse(sync_name, kwargs=kwargs), token, options
+                    )
+                    async_rps = self.measure_asgi(
+                        asgi, reverse(async_name, kwargs=kwargs), token, options
+                    )
+                    self.stdout.write(
+                        f"{name:<18} {sync_rps:>10.1f} {async_rps:>10.1f} "
+                        f"{async_rps / sync_rps:>6.1f}"
+                    )
+        finally:
+            self.cleanup(user)
+
+    def seed(self, rows):
+        self.marker = f"benchmark-{uuid.uuid4().hex[:8]}"
+        user = User.objects.create(email=f"{self.marker}@example.com", is_active=True)
+        product = Product.objects.create(title=self.marker)
+        nodes = NetworkNode.objects.bulk_create(
+            NetworkNode(title=f"{self.marker} {i:07d}", email="node@node.ru")
+            for i in range(rows)
+        )
+        links = NetworkNode.products.through
+        links.objects.bulk_create(
+            links(networknode_id=node.pk, product_id=product.pk) for node in nodes
+        )
+        return user, nodes[0]
+
+    def cleanup(self, user):
+        NetworkNode.objects.filter(title__startswith=self.marker).delete()
+        Product.objects.filter(title=self.marker).delete()
+        user.delete()
+
+    @staticmethod
+    def query_string(index):
+        # Уникальный параметр обходит кеш ответов
+        return f"page_size=50&benchmark={index}"
+
+    def measure_wsgi(self, application, path, token, options):
+        def request(index):
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path,
+                "QUERY_STRING": self.query_string(index),
+                "SERVER_NAME": "localhost",
+                "SERVER_PORT": "80",
+                "HTTP_HOST": "localhost",
+                "HTTP_AUTHORIZATION": token,
+                "wsgi.input": BytesIO(),
+                "wsgi.errors": BytesIO(),
+                "wsgi.url_scheme": "http",
+            }
+            statuses = []
+            body = application(
+                environ, lambda status, headers: statuses.append(status)
+            )
+            try:
+                b"".join(body)
+            finally:
+                body.close()
+            assert statuses[0].startswith("200"), statuses[0]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+            list(executor.map(request, range(options["requests"])))
+        return options["requests"] / (time.perf_counter() - started)
+
+    def measure_asgi(self, application, path, token, options):
+        async def request(index, semaphore):
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": self.query_string(index).encode(),
+                "headers": [
+                    (b"host", b"localhost"),
+                    (b"authorization", token.encode()),
+                ],
+                "server": ("localhost", 80),
+                "client": ("127.0.0.1", 0),
+            }
+            messages = []
+
+            async def receive():
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                messages.append(message)
+
+            async with semaphore:
+                await application(scope, receive, send)
+            assert messages[0]["status"] == 200, messages[0]["status"]
+
+        async def run():
+            semaphore = asyncio.Semaphore(options["concurrency"])
+            await asyncio.gather(
+                *(request(index, semaphore) for index in range(options["requests"]))
+            )
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        return options["requests"] / (time.perf_counter() - started)
+
+
+class SlowDatabase:
+    """Добавляет задержку перед каждым SQL-запросом во всех соединениях,
+    открытых за время замера."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def delay(self, execute, sql, params, many, context):
+        time.sleep(self.latency)
+        return execute(sql, params, many, context)
+
+    def add_wrapper(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self.delay)
+
+    def __enter__(self):
+        connection.close()
+        connection_created.connect(self.add_wrapper)
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.add_wrapper)
+        connection.close()
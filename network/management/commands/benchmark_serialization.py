@@ -0,0 +1,89 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from network.fastpath import ValuesRepresentation
+from network.models import NetworkNode, Product
+from network.serializers import NetworkNodeSerializer
+
+
+class Rollback(Exception):
+    """Откатывает транзакцию с тестовыми данными замера."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время сериализации списка звеньев через ModelSerializer "
+        "и через быстрое представление из values(). Тестовые данные создаются "
+        "в транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+        parser.add_argument("--products", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>8} {'serializer, s':>14} {'fast, s':>9} {'x':>6}")
+        for rows in options["rows"]:
+            try:
+                with transaction.atomic():
+                    self.seed(rows, options["products"])
+                    slow = self.measure(self.serialize, options["repeat"])
+                    fast = self.measure(self.represent, options["repeat"])
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(
+                f"{rows:>8} {slow:>14.3f} {fast:>9.3f} {slow / fast:>6.1f}"
+            )
+
+    def seed(self, rows, products):
+        products = Product.objects.bulk_create(
+            Product(title=f"Benchmark product {i}") for i in range(products)
+        )
+        nodes = NetworkNode.objects.bulk_create(
+            (
+                NetworkNode(
+                    title=f"Benchmark node {i:07d}",
+                    email="node@node.ru",
+                    country="Russia",
+                    city="Moscow",
+                    type="retail",
+                    debt=i % 1000,
+                )
+                for i in range(rows)
+            ),
+            batch_size=5000,
+        )
+        links = NetworkNode.products.through
+        links.objects.bulk_create(
+            (
+                links(networknode_id=node.pk, product_id=product.pk)
+                for node in nodes
+                for product in products
+            ),
+            batch_size=5000,
+        )
+
+    @staticmethod
+    def measure(function, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    @staticmethod
+    def serialize():
+        return NetworkNodeSerializer(
+            NetworkNode.objects.with_relations(), many=True
+        ).data
+
+    @staticmethod
+    def represent():
+        representation = ValuesRepresentation(NetworkNodeSerializer())
+        queryset = NetworkNode.objects.all()
+        return representation.represent(representation.values(queryset), queryset.db)
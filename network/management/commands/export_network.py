@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand, CommandError
+
+from network.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, iter_export
+from network.filter import NetworkNodeFilter
+from network.models import NetworkNode
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка звеньев сети в CSV или NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument("--output", help="Файл выгрузки, по умолчанию stdout.")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+        parser.add_argument(
+            "--filter",
+            action="append",
+            default=[],
+            metavar="NAME=VALUE",
+            help="Фильтр списка звеньев сети, например --filter country=Russia.",
+        )
+
+    def handle(self, *args, **options):
+        params = dict(item.partition("=")[::2] for item in options["filter"])
+        filterset = NetworkNodeFilter(params, queryset=NetworkNode.objects.all())
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+        rows = iter_export(filterset.qs, options["format"], options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as output:
+                output.writelines(rows)
+        else:
+            for row in rows:
+                self.stdout.write(row, ending="")
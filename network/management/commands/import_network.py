@@ -0,0 +1,51 @@
+from django.core.management import BaseCommand, CommandError
+
+from network.importer import import_network
+
+
+class Command(BaseCommand):
+    help = (
+        "Массовая загрузка звеньев сети, продуктов и их связей из CSV. "
+        "На PostgreSQL использует COPY во временные таблицы."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--nodes",
+            help="CSV звеньев: title,email,country,city,street,house,type,"
+            "supplier,debt; поставщик задаётся названием.",
+        )
+        parser.add_argument(
+            "--products", help="CSV продуктов: title,model,release_date."
+        )
+        parser.add_argument(
+            "--links",
+            help="CSV связей: node,product,model (названия звена и продукта).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        paths = {name: options[name] for name in ("nodes", "products", "links")}
+        if not any(paths.values()):
+            raise CommandError(
+                "Укажите хотя бы один из файлов --nodes, --products, --links."
+            )
+        files = {
+            name: open(path, encoding="utf-8", newline="")
+            for name, path in paths.items()
+            if path
+        }
+        try:
+            report = import_network(
+                batch_size=options["batch_size"], log=self.stdout.write, **files
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        finally:
+            for file in files.values():
+                file.close()
+        for line, title, error in report.rejected[:50]:
+            self.stderr.write(f"Строка {line} ({title}): {error}")
+        if report.rejected:
+            self.stderr.write(f"Отклонено строк: {len(report.rejected)}.")
+        self.stdout.write(self.style.SUCCESS("Загрузка завершена."))
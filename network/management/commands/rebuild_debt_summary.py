@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from network.stats import rebuild_debt_summary
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает сводную задолженность по всем звеньям сети."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_debt_summary()
+        self.stdout.write(self.style.SUCCESS("Сводная задолженность пересчитана."))
@@ -0,0 +1,85 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from network.seeding import (DEBT_DISTRIBUTIONS, SeedOptions, clear_seeded,
+                             seed_network)
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует синтетическую сеть поставок: заводы, цепочки покупателей "
+        "заданной глубины и ветвления, продукты и задолженность. Одинаковые "
+        "параметры и --seed дают одинаковую сеть."
+    )
+
+    def add_arguments(self, parser):
+        defaults = SeedOptions()
+        parser.add_argument("--factories", type=int, default=defaults.factories)
+        parser.add_argument(
+            "--depth",
+            type=int,
+            default=defaults.depth,
+            help="Число уровней покупателей под заводами.",
+        )
+        parser.add_argument(
+            "--fanout",
+            type=int,
+            help="Среднее число покупателей звена; по умолчанию подбирается "
+            "под --nodes.",
+        )
+        parser.add_argument(
+            "--nodes", type=int, help="Общее число звеньев, включая заводы."
+        )
+        parser.add_argument("--products", type=int, default=defaults.products)
+        parser.add_argument(
+            "--products-per-node", type=int, default=defaults.products_per_node
+        )
+        parser.add_argument(
+            "--debt", choices=DEBT_DISTRIBUTIONS, default=defaults.debt
+        )
+        parser.add_argument("--debt-max", type=int, default=defaults.debt_max)
+        parser.add_argument(
+            "--prefix",
+            default=defaults.prefix,
+            help="Префикс названий звеньев и продуктов.",
+        )
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Удалить ранее сгенерированные звенья и продукты с тем же префиксом.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options["factories"] < 1 or options["depth"] < 0:
+            raise CommandError("Нужен хотя бы один завод и неотрицательная глубина.")
+        if not 0 < options["debt_max"] < 10**8:
+            raise CommandError("--debt-max должен быть от 1 до 99 999 999.")
+        seed_options = SeedOptions(
+            factories=options["factories"],
+            depth=options["depth"],
+            fanout=options["fanout"],
+            nodes=options["nodes"],
+            products=options["products"],
+            products_per_node=options["products_per_node"],
+            debt=options["debt"],
+            debt_max=options["debt_max"],
+            prefix=options["prefix"],
+            seed=options["seed"],
+        )
+        if options["clear"]:
+            deleted = clear_seeded(seed_options.prefix)
+            self.stdout.write(f"Удалено звеньев: {deleted}.")
+        started = time.monotonic()
+        report = seed_network(
+            seed_options, batch_size=options["batch_size"], log=self.stdout.write
+        )
+        if report.rejected:
+            raise CommandError(f"Отклонено строк: {len(report.rejected)}.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Сеть сгенерирована за {time.monotonic() - started:.1f} с."
+            )
+        )
@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Avg, Count, Max, Sum
+from django.utils import timezone
+
+from network.models import SlowQuery
+from network.slow_queries import normalize
+
+# Сколько символов запроса выводить без --full
+SQL_PREVIEW_LENGTH = 300
+
+
+class Command(BaseCommand):
+    help = (
+        "Сводка медленных SQL-запросов по отпечаткам: запросы, отличающиеся "
+        "только значениями, объединяются. Сортировка по суммарному времени."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=float, default=7, help="За сколько последних дней."
+        )
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--source", help="Только источники, содержащие строку.")
+        parser.add_argument(
+            "--plans", action="store_true", help="Выводить последний план запроса."
+        )
+        parser.add_argument("--full", action="store_true", help="Выводить SQL целиком.")
+        parser.add_argument(
+            "--prune",
+            type=float,
+            metavar="DAYS",
+            help="Удалить записи старше DAYS дней и выйти.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options["prune"] is not None:
+            if options["prune"] < 0:
+                raise CommandError("--prune must be non-negative.")
+            deleted, _ = SlowQuery.objects.filter(
+                created_at__lt=now - timedelta(days=options["prune"])
+            ).delete()
+            self.stdout.write(f"Удалено записей: {deleted}.")
+            return
+
+        queries = SlowQuery.objects.filter(
+            created_at__gte=now - timedelta(days=options["days"])
+        )
+        if options["source"]:
+            queries = queries.filter(source__icontains=options["source"])
+        worst = (
+            queries.values("fingerprint")
+            .annotate(
+                count=Count("id"),
+                total=Sum("duration"),
+                average=Avg("duration"),
+                longest=Max("duration"),
+                last_seen=Max("created_at"),
+            )
+            .order_by("-total")[: options["limit"]]
+        )
+        if not worst:
+            self.stdout.write("Медленных запросов нет.")
+            return
+
+        for rank, group in enumerate(worst, 1):
+            same = queries.filter(fingerprint=group["fingerprint"])
+            sources = (
+                same.values("source").annotate(count=Count("id")).order_by("-count")
+            )
+            sample = same.only("sql").first()
+            sql = normalize(sample.sql)
+            if not options["full"] and len(sql) > SQL_PREVIEW_LENGTH:
+                sql = sql[:SQL_PREVIEW_LENGTH] + "…"
+            self.stdout.write(
+                f"#{rank} {group['fingerprint'][:12]}  "
+                f"total {group['total'] / 1000:.1f} s  count {group['count']}  "
+                f"avg {group['average']:.0f} ms  max {group['longest']:.0f} ms  "
+                f"last {timezone.localtime(group['last_seen']):%Y-%m-%d %H:%M}"
+            )
+            self.stdout.write(
+                "    sources: "
+                + ", ".join(f"{row['source']} ({row['count']})" for row in sources[:5])
+            )
+            self.stdout.write(f"    {sql}")
+            if options["plans"]:
+                plan = same.exclude(plan="").values_list("plan", flat=True).first()
+                if plan:
+                    self.stdout.write("    " + plan.replace("\n", "\n    "))
+            self.stdout.write("")
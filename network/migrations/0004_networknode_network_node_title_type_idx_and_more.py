@@ -0,0 +1,25 @@
+# Generated by Django 4.2.9 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0003_alter_networknode_options"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(
+                fields=["title", "type"], name="network_node_title_type_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["title", "release_date"], name="product_title_release_idx"
+            ),
+        ),
+    ]
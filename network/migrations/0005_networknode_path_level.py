@@ -0,0 +1,57 @@
+# Generated by Django 4.2.9 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    """Строит материализованные пути для уже существующих звеньев."""
+
+    NetworkNode = apps.get_model("network", "NetworkNode")
+    suppliers = dict(NetworkNode.objects.values_list("pk", "supplier_id"))
+    paths = {}
+
+    def path_of(pk, seen=()):
+        if pk not in paths:
+            supplier_id = suppliers[pk]
+            if supplier_id is None or supplier_id in seen:
+                paths[pk] = f"/{pk}/"
+            else:
+                paths[pk] = f"{path_of(supplier_id, seen + (pk,))}{pk}/"
+        return paths[pk]
+
+    for pk in suppliers:
+        path = path_of(pk)
+        NetworkNode.objects.filter(pk=pk).update(path=path, level=path.count("/") - 2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0004_networknode_network_node_title_type_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="networknode",
+            name="level",
+            field=models.PositiveSmallIntegerField(
+                default=0, editable=False, verbose_name="Уровень в иерархии"
+            ),
+        ),
+        migrations.AddField(
+            model_name="networknode",
+            name="path",
+            field=models.TextField(
+                default="", editable=False, verbose_name="Путь в иерархии поставщиков"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(
+                fields=["path"],
+                name="network_node_path_idx",
+                opclasses=["text_pattern_ops"],
+            ),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.9 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0005_networknode_path_level"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="networknode",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Время изменения"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Время изменения"),
+        ),
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(
+                fields=["updated_at"], name="network_node_updated_at_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.9 on 2026-10-18 09:28
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_debt_summary(apps, schema_editor):
+    """Строит сводную задолженность по уже существующим звеньям."""
+
+    NetworkNode = apps.get_model("network", "NetworkNode")
+    DebtSummary = apps.get_model("network", "DebtSummary")
+    dimensions = {
+        "country": "country",
+        "city": "city",
+        "type": "type",
+        "supplier": "supplier_id",
+    }
+    DebtSummary.objects.bulk_create(
+        DebtSummary(
+            dimension=dimension,
+            key="" if row[field] is None else str(row[field]),
+            total_debt=row["total_debt"] or 0,
+            nodes=row["nodes"],
+        )
+        for dimension, field in dimensions.items()
+        for row in NetworkNode.objects.order_by()
+        .values(field)
+        .annotate(total_debt=Sum("debt"), nodes=Count("pk"))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0006_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DebtSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[
+                            ("country", "страна"),
+                            ("city", "город"),
+                            ("type", "тип продавца"),
+                            ("supplier", "поставщик"),
+                        ],
+                        max_length=8,
+                        verbose_name="Группировка",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        blank=True, max_length=150, verbose_name="Значение"
+                    ),
+                ),
+                (
+                    "total_debt",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=18,
+                        verbose_name="Сумма задолженности",
+                    ),
+                ),
+                (
+                    "nodes",
+                    models.IntegerField(default=0, verbose_name="Число звеньев"),
+                ),
+            ],
+            options={
+                "verbose_name": "Сводная задолженность",
+                "verbose_name_plural": "Сводная задолженность",
+                "ordering": ("dimension", "-total_debt"),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="debtsummary",
+            constraint=models.UniqueConstraint(
+                fields=("dimension", "key"), name="debt_summary_dimension_key_uniq"
+            ),
+        ),
+        migrations.RunPython(fill_debt_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 4.2.9 on 2026-10-18 09:38
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class PostgresAddIndex(migrations.AddIndex):
+    """Создаёт GIN-индекс только на PostgreSQL; на других СУБД поиск
+    выполняется без индексов."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0008_debtclearing"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        PostgresAddIndex(
+            model_name="networknode",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    "title", "email", "country", "city", "street", config="simple"
+                ),
+                name="network_node_search_idx",
+            ),
+        ),
+        PostgresAddIndex(
+            model_name="networknode",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["title"],
+                name="network_node_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        PostgresAddIndex(
+            model_name="networknode",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["email"],
+                name="network_node_email_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        PostgresAddIndex(
+            model_name="networknode",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["country"],
+                name="network_node_country_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        PostgresAddIndex(
+            model_name="networknode",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["city"],
+                name="network_node_city_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        PostgresAddIndex(
+            model_name="networknode",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["street"],
+                name="network_node_street_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        PostgresAddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    "title", "model", config="simple"
+                ),
+                name="product_search_idx",
+            ),
+        ),
+        PostgresAddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["title"],
+                name="product_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        PostgresAddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["model"],
+                name="product_model_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.9 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0009_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(
+                fields=["type", "country", "city"], name="network_node_type_place_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(fields=["city"], name="network_node_city_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(fields=["debt"], name="network_node_debt_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="networknode",
+            index=models.Index(fields=["time"], name="network_node_time_idx"),
+        ),
+        # Промежуточная таблица создана автоматически, поэтому индекс по
+        # продукту и звену добавляется вручную: фильтр по продукту читает
+        # только индекс, не обращаясь к таблице связей.
+        migrations.RunSQL(
+            "CREATE INDEX network_node_products_product_node_idx "
+            "ON network_networknode_products (product_id, networknode_id)",
+            "DROP INDEX network_node_products_product_node_idx",
+        ),
+    ]
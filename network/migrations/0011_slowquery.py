@@ -0,0 +1,50 @@
+# Generated by Django 4.2.9 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0010_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "fingerprint",
+                    models.CharField(
+                        db_index=True, max_length=40, verbose_name="Отпечаток запроса"
+                    ),
+                ),
+                ("sql", models.TextField(verbose_name="SQL")),
+                ("duration", models.FloatField(verbose_name="Длительность, мс")),
+                ("source", models.CharField(max_length=200, verbose_name="Источник")),
+                ("plan", models.TextField(blank=True, verbose_name="План выполнения")),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        db_index=True,
+                        verbose_name="Время выполнения",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Медленный запрос",
+                "verbose_name_plural": "Медленные запросы",
+                "ordering": ("-created_at",),
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:05
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class PostgresAddIndex(migrations.AddIndex):
+    """Создаёт GIN-индекс только на PostgreSQL; на других СУБД фильтр
+    выполняется без индекса."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("network", "0011_slowquery"),
+    ]
+
+    operations = [
+        PostgresAddIndex(
+            model_name="networknode",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("country"),
+                    name="gin_trgm_ops",
+                ),
+                name="network_node_ucountry_trgm_idx",
+            ),
+        ),
+    ]
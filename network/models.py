@@ -1,9 +1,40 @@
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
 from django.db import models  # type: ignore
+from django.db.models.functions import Upper
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 NULLABLE = {"blank": True, "null": True}
 
+NODE_SEARCH_FIELDS = ("title", "email", "country", "city", "street")
+PRODUCT_SEARCH_FIELDS = ("title", "model")
+
+
+def search_vector(fields):
+    """Полнотекстовый вектор по полям модели.
+
+    Одно и то же выражение используется в GIN-индексе и в запросе поиска,
+    иначе PostgreSQL не применит функциональный индекс.
+    """
+
+    return SearchVector(*fields, config="simple")
+
+
+def search_indexes(prefix, fields):
+    """GIN-индексы полнотекстового и триграммного поиска по полям модели."""
+
+    return [
+        GinIndex(search_vector(fields), name=f"{prefix}_search_idx"),
+        *(
+            GinIndex(
+                fields=[field], name=f"{prefix}_{field}_trgm_idx", opclasses=["gin_trgm_ops"]
+            )
+            for field in fields
+        ),
+    ]
+
 
 class SupplierType(models.TextChoices):
     """Тип поставщика."""
@@ -21,6 +52,7 @@ class Product(models.Model):
     release_date = models.DateField(
         verbose_name="Дата выхода продукта на рынок", **NULLABLE
     )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Время изменения")
 
     class Meta:
         verbose_name = "Продукт"
@@ -29,11 +61,36 @@ class Product(models.Model):
             "title",
             "release_date",
         )
+        indexes = [
+            models.Index(
+                fields=["title", "release_date"], name="product_title_release_idx"
+            ),
+            *search_indexes("product", PRODUCT_SEARCH_FIELDS),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} {self.model}"
 
 
+class NetworkNodeQuerySet(models.QuerySet):
+    """Набор запросов звеньев сети."""
+
+    def with_relations(self):
+        """Подгружает поставщика и продукты за фиксированное число запросов."""
+
+        return self.select_related("supplier").prefetch_related("products")
+
+    def ancestors_of(self, node):
+        """Все вышестоящие поставщики звена, от завода вниз по цепочке."""
+
+        return self.filter(pk__in=node.get_ancestor_ids()).order_by("level")
+
+    def descendants_of(self, node):
+        """Все нижестоящие звенья, получающие товар от звена по цепочке."""
+
+        return self.filter(path__startswith=node.path).exclude(pk=node.pk)
+
+
 class NetworkNode(models.Model):
     """Модель звена сети."""
 
@@ -50,6 +107,7 @@ class NetworkNode(models.Model):
         verbose_name="Тип продавца",
     )
     time = models.DateTimeField(default=timezone.now, verbose_name="Время создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Время изменения")
     supplier = models.ForeignKey(
         "NetworkNode", **NULLABLE, on_delete=models.SET_NULL, verbose_name="Поставщик"
     )
@@ -60,11 +118,140 @@ class NetworkNode(models.Model):
         verbose_name="Задолженность перед поставщиком",
     )
     products = models.ManyToManyField(Product, blank=True, verbose_name="Продукты")
+    path = models.TextField(
+        default="", editable=False, verbose_name="Путь в иерархии поставщиков"
+    )
+    level = models.PositiveSmallIntegerField(
+        default=0, editable=False, verbose_name="Уровень в иерархии"
+    )
+
+    objects = NetworkNodeQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Сетевое звено"
         verbose_name_plural = "Сетевые звенья"
         ordering = ("title", "type")
+        indexes = [
+            models.Index(fields=["title", "type"], name="network_node_title_type_idx"),
+            models.Index(
+                fields=["path"],
+                name="network_node_path_idx",
+                opclasses=["text_pattern_ops"],
+            ),
+            models.Index(fields=["updated_at"], name="network_node_updated_at_idx"),
+            models.Index(
+                fields=["type", "country", "city"], name="network_node_type_place_idx"
+            ),
+            models.Index(fields=["city"], name="network_node_city_idx"),
+            models.Index(fields=["debt"], name="network_node_debt_idx"),
+            models.Index(fields=["time"], name="network_node_time_idx"),
+            *search_indexes("network_node", NODE_SEARCH_FIELDS),
+            # Фильтр страны без учёта регистра сравнивает UPPER(country) LIKE,
+            # поэтому ему нужен триграммный индекс по тому же выражению.
+            GinIndex(
+                OpClass(Upper("country"), name="gin_trgm_ops"),
+                name="network_node_ucountry_trgm_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} {self.debt}"
+
+    def get_ancestor_ids(self) -> list[int]:
+        """Идентификаторы вышестоящих поставщиков из материализованного пути."""
+
+        return [int(pk) for pk in self.path.strip("/").split("/")[:-1] if pk]
+
+
+class DebtSummary(models.Model):
+    """Сводная задолженность по группе звеньев сети.
+
+    Поддерживается инкрементально при каждом изменении звеньев, поэтому
+    чтение статистики зависит от числа групп, а не от числа звеньев.
+    """
+
+    class Dimension(models.TextChoices):
+        COUNTRY = "country", _("страна")
+        CITY = "city", _("город")
+        TYPE = "type", _("тип продавца")
+        SUPPLIER = "supplier", _("поставщик")
+
+    dimension = models.CharField(
+        max_length=8, choices=Dimension.choices, verbose_name="Группировка"
+    )
+    key = models.CharField(max_length=150, blank=True, verbose_name="Значение")
+    total_debt = models.DecimalField(
+        max_digits=18, decimal_places=2, default=0, verbose_name="Сумма задолженности"
+    )
+    nodes = models.IntegerField(default=0, verbose_name="Число звеньев")
+
+    class Meta:
+        verbose_name = "Сводная задолженность"
+        verbose_name_plural = "Сводная задолженность"
+        ordering = ("dimension", "-total_debt")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dimension", "key"], name="debt_summary_dimension_key_uniq"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.dimension}={self.key}: {self.total_debt}"
+
+
+class DebtClearing(models.Model):
+    """Фоновое списание задолженности у выбранных в админке звеньев сети."""
+
+    class Status(models.TextChoices):
+        PENDING = "pending", _("в очереди")
+        RUNNING = "running", _("выполняется")
+        DONE = "done", _("завершено")
+        FAILED = "failed", _("ошибка")
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        verbose_name="Пользователь",
+        **NULLABLE,
+    )
+    status = models.CharField(
+        max_length=7,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name="Статус",
+    )
+    total = models.PositiveIntegerField(default=0, verbose_name="Выбрано звеньев")
+    processed = models.PositiveIntegerField(default=0, verbose_name="Обработано звеньев")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Время запуска")
+    finished_at = models.DateTimeField(verbose_name="Время завершения", **NULLABLE)
+
+    class Meta:
+        verbose_name = "Списание задолженности"
+        verbose_name_plural = "Списания задолженности"
+        ordering = ("-created_at",)
+
+    def __str__(self) -> str:
+        return f"Списание #{self.pk}: {self.processed}/{self.total}"
+
+
+class SlowQuery(models.Model):
+    """SQL-запрос, выполнявшийся дольше ``SLOW_QUERY_THRESHOLD_MS``."""
+
+    fingerprint = models.CharField(
+        max_length=40, db_index=True, verbose_name="Отпечаток запроса"
+    )
+    sql = models.TextField(verbose_name="SQL")
+    duration = models.FloatField(verbose_name="Длительность, мс")
+    source = models.CharField(max_length=200, verbose_name="Источник")
+    plan = models.TextField(blank=True, verbose_name="План выполнения")
+    created_at = models.DateTimeField(
+        auto_now_add=True, db_index=True, verbose_name="Время выполнения"
+    )
+
+    class Meta:
+        verbose_name = "Медленный запрос"
+        verbose_name_plural = "Медленные запросы"
+        ordering = ("-created_at",)
+
+    def __str__(self) -> str:
+        return f"{self.source}: {self.duration:.0f} мс"
@@ -0,0 +1,209 @@
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import prefetch_related_objects
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination  # type: ignore
+from rest_framework.pagination import _reverse_ordering
+
+
+async def aprefetch(instances, lookup) -> None:
+    """Асинхронно подгружает связь «ко многим» первого уровня для объектов.
+
+    Повторяет ``prefetch_related_objects`` для одной связи: запрос связанных
+    объектов берётся у менеджера связи и читается ``aiterator()``, а
+    результат раскладывается в кеш предзагрузки каждого объекта.
+    """
+
+    manager = getattr(instances[0], lookup)
+    queryset, rel_obj_attr, instance_attr, _, cache_name, _ = (
+        manager.get_prefetch_queryset(instances)
+    )
+    related = defaultdict(list)
+    async for obj in queryset.aiterator():
+        related[rel_obj_attr(obj)].append(obj)
+    for instance in instances:
+        prefetched = getattr(instance, lookup).all()
+        prefetched._result_cache = related[instance_attr(instance)]
+        prefetched._prefetch_done = True
+        if not hasattr(instance, "_prefetched_objects_cache"):
+            instance._prefetched_objects_cache = {}
+        instance._prefetched_objects_cache[cache_name] = prefetched
+
+
+async def afetch_all(queryset) -> list:
+    """Асинхронно читает набор запросов целиком через ``aiterator()``.
+
+    ``aiterator()`` в Django 4.2 не выполняет ``prefetch_related``, поэтому
+    строки читаются без предзагрузки, а связи первого уровня подгружаются
+    :func:`aprefetch`. Вложенные связи и объекты ``Prefetch``, которые
+    представления API не используют, подгружаются синхронно в потоке.
+    """
+
+    lookups = queryset._prefetch_related_lookups
+    rows = [row async for row in queryset.prefetch_related(None).aiterator()]
+    if not rows:
+        return rows
+    for lookup in lookups:
+        if isinstance(lookup, str) and LOOKUP_SEP not in lookup:
+            await aprefetch(rows, lookup)
+        else:
+            await sync_to_async(prefetch_related_objects)(rows, lookup)
+    return rows
+
+
+class SearchRankOrderingMixin:
+    """Сортирует результаты поиска по убыванию релевантности ``search_rank``,
+    сохраняя сортировку пагинатора для равной релевантности."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if "search_rank" in queryset.query.annotations:
+            return ("-search_rank", *ordering)
+        return ordering
+
+
+class AsyncCursorPaginationMixin:
+    """Курсорная пагинация для асинхронных представлений.
+
+    ``paginate_queryset`` DRF разделён на построение запроса страницы
+    и сборку страницы из прочитанных строк. Асинхронный вариант читает строки
+    :func:`afetch_all`, синхронный — ``list``, поэтому разбор курсора
+    и ссылки навигации у них общие.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.build_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.build_page(await afetch_all(queryset))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """Запрос строк страницы с одной лишней строкой для следующей позиции."""
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            order = self.ordering[0]
+            is_reversed = order.startswith("-")
+            order_attr = order.lstrip("-")
+            if self.cursor.reverse != is_reversed:
+                queryset = queryset.filter(**{f"{order_attr}__lt": current_position})
+            else:
+                queryset = queryset.filter(**{f"{order_attr}__gt": current_position})
+
+        return queryset[offset:offset + self.page_size + 1]
+
+    def build_page(self, results) -> list:
+        """Страница и позиции соседних страниц из прочитанных строк."""
+
+        offset, reverse, current_position = self.cursor or (0, False, None)
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+class NetworkNodeCursorPagination(
+    AsyncCursorPaginationMixin, SearchRankOrderingMixin, CursorPagination
+):
+    """Курсорная пагинация списка звеньев сети.
+
+    Страница выбирается по ключу сортировки модели (``title``, ``type``),
+    поэтому стоимость запроса не зависит от номера страницы и не требует
+    подсчёта ``COUNT(*)``. Первичный ключ в конце сортировки задаёт
+    однозначный порядок звеньев с одинаковым названием.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = ("title", "type", "pk")
+
+
+class ProductCursorPagination(
+    AsyncCursorPaginationMixin, SearchRankOrderingMixin, CursorPagination
+):
+    """Курсорная пагинация списка продуктов по (``title``, ``release_date``)
+    с первичным ключом для однозначного порядка одинаковых названий."""
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = ("title", "release_date", "pk")
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки с оценочным числом строк для больших таблиц.
+
+    Для нефильтрованного списка на PostgreSQL число строк берётся из
+    статистики планировщика (``pg_class.reltuples``) вместо ``COUNT(*)``,
+    если таблица больше ``estimate_threshold``. Отфильтрованные списки
+    и небольшие таблицы считаются точно.
+    """
+
+    estimate_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return row[0]
+        return super().count
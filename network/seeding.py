@@ -0,0 +1,220 @@
+import csv
+import logging
+import math
+import random
+import tempfile
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+
+from network.cache import invalidate_network
+from network.importer import (LINK_COLUMNS, NODE_COLUMNS, PRODUCT_COLUMNS,
+                              import_network)
+from network.models import NetworkNode, Product, SupplierType
+from network.services import rebuild_paths
+from network.stats import rebuild_debt_summary
+
+logger = logging.getLogger(__name__)
+
+# Страны и города с весами: звенья сети сосредоточены в нескольких городах
+LOCATIONS = (
+    ("Russia", "Moscow", 30),
+    ("Russia", "Saint Petersburg", 15),
+    ("Russia", "Kazan", 6),
+    ("Russia", "Novosibirsk", 5),
+    ("Russia", "Yekaterinburg", 5),
+    ("China", "Shenzhen", 12),
+    ("China", "Shanghai", 8),
+    ("Korea", "Seoul", 6),
+    ("Japan", "Osaka", 4),
+    ("Kazakhstan", "Almaty", 4),
+    ("Belarus", "Minsk", 3),
+    ("Germany", "Berlin", 2),
+)
+STREETS = ("Lenina", "Tverskaya", "Nevsky", "Sadovaya", "Mira", "Gagarina")
+DEBT_DISTRIBUTIONS = ("zero", "uniform", "exponential", "pareto")
+
+
+@dataclass
+class SeedOptions:
+    """Параметры синтетической сети.
+
+    ``depth`` — число уровней покупателей под заводами, ``fanout`` — среднее
+    число прямых покупателей звена. Если задано ``nodes``, генерация
+    останавливается на этом числе звеньев, а ``fanout`` по умолчанию
+    подбирается так, чтобы дерево вместило их все.
+    """
+
+    factories: int = 10
+    depth: int = 3
+    fanout: int | None = None
+    nodes: int | None = None
+    products: int = 100
+    products_per_node: int = 3
+    debt: str = "exponential"
+    debt_max: int = 100_000
+    prefix: str = "Seed"
+    seed: int = 0
+
+    def get_fanout(self) -> int:
+        if self.fanout is not None:
+            return self.fanout
+        if not self.nodes or self.depth == 0:
+            return 5
+        # Запас на случайный разброс числа покупателей
+        per_factory = 1.25 * self.nodes / self.factories
+        fanout = 1
+        while sum(fanout**level for level in range(self.depth + 1)) < per_factory:
+            fanout += 1
+        return fanout
+
+
+def random_debt(rng, distribution, debt_max) -> str:
+    if distribution == "zero":
+        value = 0.0
+    elif distribution == "uniform":
+        value = rng.uniform(0, debt_max)
+    elif distribution == "exponential":
+        value = rng.expovariate(10 / debt_max)
+    else:
+        value = (rng.paretovariate(1.5) - 1) * debt_max / 20
+    return f"{min(value, debt_max):.2f}"
+
+
+def node_type(level: int, rng) -> str:
+    if level == 0:
+        return SupplierType.FACTORY
+    if level == 1:
+        return SupplierType.RETAIL
+    return rng.choices(
+        (SupplierType.RETAIL, SupplierType.SELLER), weights=(1, 3)
+    )[0]
+
+
+def csv_file(columns):
+    file = tempfile.TemporaryFile("w+", encoding="utf-8", newline="")
+    writer = csv.writer(file)
+    writer.writerow(columns)
+    return file, writer
+
+
+def generate(options: SeedOptions):
+    """CSV-файлы продуктов, звеньев и связей в формате ``import_network``.
+
+    Звенья создаются по уровням: сначала заводы, затем покупатели каждого
+    звена предыдущего уровня. Строки сразу пишутся во временные файлы,
+    в памяти остаются только названия звеньев одного уровня. Одинаковые
+    параметры и ``seed`` дают одинаковую сеть.
+    """
+
+    rng = random.Random(options.seed)
+    fanout = options.get_fanout()
+    locations = [(country, city) for country, city, _ in LOCATIONS]
+    weights = [weight for *_, weight in LOCATIONS]
+    limit = options.nodes or math.inf
+
+    products = [
+        (
+            f"{options.prefix} product {index:05d}",
+            f"M-{index % 97:02d}",
+            f"{2010 + index % 15}-01-01",
+        )
+        for index in range(options.products)
+    ]
+    products_file, writer = csv_file(PRODUCT_COLUMNS)
+    writer.writerows(products)
+    nodes_file, nodes_writer = csv_file(NODE_COLUMNS)
+    links_file, links_writer = csv_file(LINK_COLUMNS)
+
+    total = 0
+    # Поставщики звеньев текущего уровня; у каждого завода «поставщик» None
+    suppliers = [None] * options.factories
+    for level in range(options.depth + 1):
+        buyers = []
+        for supplier in suppliers:
+            count = 1
+            if supplier is not None:
+                count = rng.randint(fanout - fanout // 2, fanout + fanout // 2)
+            for _ in range(min(count, limit - total)):
+                kind = node_type(level, rng)
+                title = f"{options.prefix} {kind} {total:07d}"
+                country, city = rng.choices(locations, weights)[0]
+                debt = "0.00"
+                if supplier is not None:
+                    debt = random_debt(rng, options.debt, options.debt_max)
+                nodes_writer.writerow(
+                    (
+                        title,
+                        f"node{total}@example.com",
+                        country,
+                        city,
+                        rng.choice(STREETS),
+                        rng.randint(1, 200),
+                        kind,
+                        supplier or "",
+                        debt,
+                    )
+                )
+                links_writer.writerows(
+                    (title, product_title, model)
+                    for product_title, model, _ in rng.sample(
+                        products, min(options.products_per_node, len(products))
+                    )
+                )
+                buyers.append(title)
+                total += 1
+        suppliers = buyers
+        if not suppliers or total >= limit:
+            break
+
+    for file in (products_file, nodes_file, links_file):
+        file.seek(0)
+    return products_file, nodes_file, links_file
+
+
+def clear_seeded(prefix: str) -> int:
+    """Удаляет звенья и продукты, созданные с префиксом ``prefix``.
+
+    Звенья удаляются одним запросом ``DELETE`` без сигналов модели, после
+    чего сводная задолженность пересчитывается целиком, как после загрузки.
+    """
+
+    nodes = NetworkNode.objects.filter(title__startswith=f"{prefix} ")
+    with transaction.atomic():
+        NetworkNode.products.through.objects.filter(networknode__in=nodes).delete()
+        detached = (
+            NetworkNode.objects.filter(supplier__in=nodes)
+            .exclude(title__startswith=f"{prefix} ")
+            .update(supplier=None)
+        )
+        selected, params = nodes.order_by().values("pk").query.sql_with_params()
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {quote(NetworkNode._meta.db_table)} "
+                f"WHERE {quote(NetworkNode._meta.pk.column)} IN ({selected})",
+                params,
+            )
+            deleted = cursor.rowcount
+        Product.objects.filter(title__startswith=f"{prefix} product ").delete()
+        if detached:
+            rebuild_paths()
+        rebuild_debt_summary()
+    invalidate_network(everything=True)
+    return deleted
+
+
+def seed_network(options: SeedOptions, batch_size=5000, log=logger.info):
+    """Генерирует сеть и загружает её через :func:`import_network`, поэтому
+    на PostgreSQL данные записываются ``COPY``, а иерархия и сводная
+    задолженность пересчитываются один раз."""
+
+    files = generate(options)
+    try:
+        products, nodes, links = files
+        return import_network(
+            nodes=nodes, products=products, links=links, batch_size=batch_size, log=log
+        )
+    finally:
+        for file in files:
+            file.close()
@@ -1,7 +1,12 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers    # type: ignore
 
-from network.models import NetworkNode, Product
-from network.validators import NetworkNodeValidator
+from network.cache import invalidate_network
+from network.models import DebtSummary, NetworkNode, Product
+from network.services import build_path, creates_supply_cycle, sync_node_path
+from network.stats import apply_deltas, node_deltas, snapshot
+from network.validators import NetworkNodeValidator, SupplyChainCycleValidator
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -10,8 +15,35 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class DebtSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DebtSummary
+        fields = ("dimension", "key", "total_debt", "nodes")
+
+
+class SupplierSerializer(serializers.ModelSerializer):
+    """Сведения о поставщике, раскрываемые в звене сети по ``?expand=``."""
+
+    class Meta:
+        model = NetworkNode
+        fields = ("id", "title", "email", "country", "city", "street", "house", "type")
+
+
 class NetworkNodeSerializer(serializers.ModelSerializer):
 
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        """``fields`` ограничивает набор полей ответа, ``expand`` заменяет
+        идентификаторы поставщика и продуктов вложенными объектами."""
+
+        super().__init__(*args, **kwargs)
+        if "supplier" in expand:
+            self.fields["supplier"] = SupplierSerializer(read_only=True)
+        if "products" in expand:
+            self.fields["products"] = ProductSerializer(many=True, read_only=True)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     def update(self, instance, validated_data):
         if "debt" in validated_data:
             raise serializers.ValidationError(
@@ -24,4 +56,197 @@ class NetworkNodeSerializer(serializers.ModelSerializer):
     class Meta:
         model = NetworkNode
         fields = "__all__"
+        validators = [NetworkNodeValidator(), SupplyChainCycleValidator()]
+
+
+class NetworkNodeBulkListSerializer(serializers.ListSerializer):
+    """Пакетная валидация и запись звеньев сети.
+
+    Поля каждого элемента проверяются дочерним сериализатором без обращений
+    к БД, а уникальность названий, существование поставщиков, продуктов и
+    обновляемых звеньев проверяются одним запросом ``IN`` на весь пакет.
+    Ошибки возвращаются списком, выровненным по индексам элементов.
+    """
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        errors: list[dict] = [{} for _ in items]
+
+        def add_error(index, field, message):
+            errors[index].setdefault(field, []).append(message)
+
+        if self.partial:
+            ids = [item.get("id") for item in items]
+            self.instance = NetworkNode.objects.in_bulk(
+                [pk for pk in ids if pk is not None]
+            )
+            for index, item in enumerate(items):
+                if item.get("id") is None:
+                    add_error(index, "id", "Обязательное поле.")
+                elif item["id"] not in self.instance:
+                    add_error(index, "id", "Звено сети не найдено.")
+                if "debt" in item:
+                    add_error(
+                        index,
+                        "debt",
+                        "Задолженность перед поставщиком не может быть "
+                        "изменена через API.",
+                    )
+
+        titles: dict[str, int] = {}
+        for index, item in enumerate(items):
+            if "title" not in item:
+                continue
+            if item["title"] in titles:
+                add_error(index, "title", "Название повторяется в пакете.")
+            titles[item["title"]] = index
+        taken = NetworkNode.objects.filter(title__in=titles).values_list("title", "pk")
+        for title, pk in taken:
+            if not self.partial or items[titles[title]].get("id") != pk:
+                add_error(
+                    titles[title],
+                    "title",
+                    "Звено сети с таким названием уже существует.",
+                )
+
+        supplier_ids = {item["supplier"] for item in items if item.get("supplier")}
+        self.supplier_paths = dict(
+            NetworkNode.objects.filter(pk__in=supplier_ids).values_list("pk", "path")
+        )
+        product_ids = {pk for item in items for pk in item.get("products", [])}
+        known_products = set(
+            Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True)
+        )
+        pending = {
+            item["id"]: item["supplier"]
+            for item in items
+            if self.partial and "supplier" in item and item.get("id") is not None
+        }
+        for index, item in enumerate(items):
+            supplier = item.get("supplier")
+            if supplier and supplier not in self.supplier_paths:
+                add_error(index, "supplier", "Поставщик не найден.")
+            elif supplier and item.get("id") in pending:
+                if creates_supply_cycle(item["id"], supplier, pending):
+                    add_error(
+                        index,
+                        "supplier",
+                        "Поставщик не может находиться ниже звена в цепочке поставок.",
+                    )
+            missing = set(item.get("products", [])) - known_products
+            if missing:
+                add_error(
+                    index, "products", f"Продукты не найдены: {sorted(missing)}."
+                )
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def create(self, validated_data):
+        links = []
+        with transaction.atomic():
+            nodes = NetworkNode.objects.bulk_create(
+                NetworkNode(
+                    **{
+                        field: value
+                        for field, value in attrs.items()
+                        if field not in ("id", "supplier", "products")
+                    },
+                    supplier_id=attrs.get("supplier"),
+                )
+                for attrs in validated_data
+            )
+            for node, attrs in zip(nodes, validated_data):
+                node.path = build_path(
+                    self.supplier_paths.get(node.supplier_id, ""), node.pk
+                )
+                node.level = node.path.count("/") - 2
+                links.extend(
+                    NetworkNode.products.through(
+                        networknode_id=node.pk, product_id=product_id
+                    )
+                    for product_id in attrs.get("products", [])
+                )
+            NetworkNode.objects.bulk_update(nodes, ["path", "level"])
+            NetworkNode.products.through.objects.bulk_create(links)
+            deltas = None
+            for node in nodes:
+                deltas = node_deltas(new=snapshot(node), deltas=deltas)
+            apply_deltas(deltas or {})
+        invalidate_network()
+        return nodes
+
+    def update(self, instance, validated_data):
+        now = timezone.now()
+        fields = {"updated_at"}
+        moved, relinked, links = [], [], []
+        deltas = None
+        with transaction.atomic():
+            for attrs in validated_data:
+                node = instance[attrs["id"]]
+                old = snapshot(node)
+                for field, value in attrs.items():
+                    if field == "supplier":
+                        if node.supplier_id != value:
+                            moved.append(node)
+                        node.supplier_id = value
+                        fields.add("supplier")
+                    elif field == "products":
+                        relinked.append(node.pk)
+                        links.extend(
+                            NetworkNode.products.through(
+                                networknode_id=node.pk, product_id=product_id
+                            )
+                            for product_id in value
+                        )
+                    elif field != "id":
+                        setattr(node, field, value)
+                        fields.add(field)
+                node.updated_at = now
+                deltas = node_deltas(old, snapshot(node), deltas)
+            nodes = [instance[attrs["id"]] for attrs in validated_data]
+            NetworkNode.objects.bulk_update(nodes, fields)
+            apply_deltas(deltas or {})
+            for node in moved:
+                sync_node_path(node)
+            NetworkNode.products.through.objects.filter(
+                networknode_id__in=relinked
+            ).delete()
+            NetworkNode.products.through.objects.bulk_create(links)
+        invalidate_network(*instance, everything=bool(moved))
+        return nodes
+
+
+class NetworkNodeBulkSerializer(serializers.ModelSerializer):
+    """Элемент пакетного создания или обновления звеньев сети.
+
+    Поставщик и продукты передаются идентификаторами и проверяются пакетом
+    в ``NetworkNodeBulkListSerializer``.
+    """
+
+    id = serializers.IntegerField(required=False)
+    supplier = serializers.IntegerField(required=False, allow_null=True)
+    products = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+
+    class Meta:
+        model = NetworkNode
+        fields = (
+            "id",
+            "title",
+            "email",
+            "country",
+            "city",
+            "street",
+            "house",
+            "type",
+            "time",
+            "supplier",
+            "debt",
+            "products",
+        )
+        extra_kwargs = {"title": {"validators": []}}
         validators = [NetworkNodeValidator()]
+        list_serializer_class = NetworkNodeBulkListSerializer
@@ -0,0 +1,337 @@
+from decimal import Decimal
+
+from django.db import connection, models, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import (Cast, Concat, Greatest, Least, Random,
+                                        Round, Substr)
+from django.utils import timezone
+
+from network.cache import invalidate_network
+from network.models import DebtClearing, NetworkNode
+from network.stats import apply_deltas, queryset_deltas
+
+# Максимальная задолженность, которую вмещает поле NetworkNode.debt
+MAX_DEBT = Decimal("99999999.99")
+# Сколько перенесённых звеньев сбрасывается одним UPDATE
+REBUILD_BATCH_SIZE = 500
+
+
+SUPPLY_CHAIN_SQL = """
+WITH RECURSIVE chain (id, supplier_id, depth, visited) AS (
+    SELECT id, supplier_id, 0, ARRAY[id]
+    FROM {table}
+    WHERE id = %s
+    UNION ALL
+    SELECT node.id, node.supplier_id, chain.depth + 1, chain.visited || node.id
+    FROM {table} AS node
+    JOIN chain ON node.id = chain.supplier_id
+    WHERE NOT node.id = ANY(chain.visited)
+)
+SELECT id, depth FROM chain ORDER BY depth
+"""
+
+
+def get_supply_chain(pk: int) -> list[tuple[int, int]]:
+    """Цепочка поставщиков звена вверх до завода в виде пар (id, глубина).
+
+    Само звено идёт первым с глубиной 0. На PostgreSQL цепочка строится
+    одним рекурсивным CTE, который останавливается на уже встреченных
+    звеньях, поэтому существующий цикл не зацикливает запрос. На прочих
+    СУБД (SQLite в тестах) цепочка проходится в Python.
+    """
+
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                SUPPLY_CHAIN_SQL.format(
+                    table=connection.ops.quote_name(NetworkNode._meta.db_table)
+                ),
+                [pk],
+            )
+            return cursor.fetchall()
+
+    chain: list[tuple[int, int]] = []
+    visited: set[int] = set()
+    next_pk = pk
+    while next_pk is not None and next_pk not in visited:
+        row = NetworkNode.objects.filter(pk=next_pk).values_list("supplier_id").first()
+        if row is None:
+            break
+        visited.add(next_pk)
+        chain.append((next_pk, len(chain)))
+        next_pk = row[0]
+    return chain
+
+
+def creates_supply_cycle(
+    pk: int, supplier_pk: int, pending: dict[int, int | None] | None = None
+) -> bool:
+    """Проверяет, замкнёт ли назначение поставщика цепочку в цикл.
+
+    ``pending`` содержит ещё не сохранённые смены поставщиков из того же
+    пакета: цепочка из БД переключается на них там, где они её пересекают.
+    """
+
+    pending = pending or {}
+    current: int | None = supplier_pk
+    seen: set[int] = set()
+    while current is not None and current not in seen:
+        if current == pk:
+            return True
+        seen.add(current)
+        if current in pending:
+            current = pending[current]
+            continue
+        for node_pk, _ in get_supply_chain(current):
+            if node_pk == pk:
+                return True
+            if node_pk in pending:
+                current = pending[node_pk]
+                break
+            seen.add(node_pk)
+        else:
+            return False
+    return False
+
+
+def build_path(parent_path: str, pk: int) -> str:
+    """Материализованный путь звена вида ``/<завод>/.../<звено>/``."""
+
+    return f"{parent_path or '/'}{pk}/"
+
+
+def sync_node_path(node: NetworkNode) -> bool:
+    """Пересчитывает путь звена и, при смене поставщика, всего его поддерева.
+
+    Текущие пути читаются из БД, а не из экземпляра, чтобы устаревшее
+    состояние объекта в памяти не испортило иерархию. Возвращает ``True``,
+    если вместе со звеном были перенесены его покупатели.
+    """
+
+    paths = dict(
+        NetworkNode.objects.filter(pk__in=[node.pk, node.supplier_id]).values_list(
+            "pk", "path"
+        )
+    )
+    old_path = paths.get(node.pk, "")
+    new_path = build_path(paths.get(node.supplier_id, ""), node.pk)
+    if old_path == new_path:
+        return False
+    new_level = new_path.count("/") - 2
+    moved = bool(old_path)
+    if not moved:
+        NetworkNode.objects.filter(pk=node.pk).update(
+            path=new_path, level=new_level, updated_at=timezone.now()
+        )
+    else:
+        old_level = old_path.count("/") - 2
+        NetworkNode.objects.filter(path__startswith=old_path).update(
+            path=Concat(
+                Value(new_path),
+                Substr("path", len(old_path) + 1),
+                output_field=models.TextField(),
+            ),
+            level=F("level") + (new_level - old_level),
+            updated_at=timezone.now(),
+        )
+    node.path, node.level = new_path, new_level
+    return moved
+
+
+def detach_subtree(node: NetworkNode) -> None:
+    """Делает прямых покупателей удаляемого звена вершинами своих поддеревьев."""
+
+    current = (
+        NetworkNode.objects.filter(pk=node.pk).values_list("path", "level").first()
+    )
+    if current is None or not current[0]:
+        return
+    path, level = current
+    NetworkNode.objects.filter(path__startswith=path).exclude(pk=node.pk).update(
+        path=Substr("path", len(path)),
+        level=F("level") - (level + 1),
+        updated_at=timezone.now(),
+    )
+
+
+def rebuild_paths() -> int:
+    """Полностью пересчитывает иерархию по уровням, одним UPDATE на уровень.
+
+    Используется после массовых загрузок, минующих сигналы модели.
+    Звенья, замкнутые в цикл поставок, остаются с пустым путём.
+    Возвращает число звеньев с построенным путём.
+    """
+
+    pk_text = Cast("pk", output_field=models.TextField())
+    NetworkNode.objects.exclude(path="").update(path="", level=0)
+    updated = NetworkNode.objects.filter(supplier__isnull=True).update(
+        path=Concat(Value("/"), pk_text, Value("/"), output_field=models.TextField()),
+        updated_at=timezone.now(),
+    )
+    total, level = 0, 0
+    while updated:
+        total += updated
+        level += 1
+        parent_path = Subquery(
+            NetworkNode.objects.filter(pk=OuterRef("supplier_id")).values("path")[:1]
+        )
+        updated = (
+            NetworkNode.objects.filter(path="", supplier__level=level - 1)
+            .exclude(supplier__path="")
+            .update(
+                path=Concat(
+                    parent_path, pk_text, Value("/"), output_field=models.TextField()
+                ),
+                level=level,
+                updated_at=timezone.now(),
+            )
+        )
+    invalidate_network(everything=True)
+    return total
+
+
+def rebuild_subtrees(queryset) -> int:
+    """Пересчитывает пути звеньев набора и их покупателей после массовой
+    загрузки, минующей сигналы модели.
+
+    Звенья, путь которых уже продолжает путь поставщика, не меняются.
+    Пути остальных и всех их покупателей строятся заново по уровням,
+    одним UPDATE на уровень. Звенья, замкнутые в цикл поставок, остаются
+    с пустым путём. Возвращает число звеньев с построенным путём.
+    """
+
+    pk_text = Cast("pk", output_field=models.TextField())
+    expected_path = Case(
+        When(supplier__isnull=True, then=Concat(Value("/"), pk_text, Value("/"))),
+        default=Concat("supplier__path", pk_text, Value("/")),
+        output_field=models.TextField(),
+    )
+    stale = list(
+        queryset.order_by()
+        .annotate(expected_path=expected_path)
+        .exclude(path=F("expected_path"))
+        .values_list("pk", "path")
+    )
+    for start in range(0, len(stale), REBUILD_BATCH_SIZE):
+        batch = stale[start:start + REBUILD_BATCH_SIZE]
+        # Вместе с перенесёнными звеньями сбрасываются пути их покупателей
+        scope = Q(pk__in=[pk for pk, _ in batch])
+        for _, path in batch:
+            if path:
+                scope |= Q(path__startswith=path)
+        NetworkNode.objects.filter(scope).update(path="", level=0)
+
+    now = timezone.now()
+    total = NetworkNode.objects.filter(path="", supplier__isnull=True).update(
+        path=Concat(Value("/"), pk_text, Value("/"), output_field=models.TextField()),
+        level=0,
+        updated_at=now,
+    )
+    supplier = NetworkNode.objects.filter(pk=OuterRef("supplier_id"))
+    while True:
+        updated = NetworkNode.objects.filter(path="", supplier__path__gt="").update(
+            path=Concat(
+                Subquery(supplier.values("path")[:1]),
+                pk_text,
+                Value("/"),
+                output_field=models.TextField(),
+            ),
+            level=Subquery(supplier.values("level")[:1]) + 1,
+            updated_at=now,
+        )
+        if not updated:
+            return total
+        total += updated
+
+
+def random_amount(low, high):
+    """Случайная сумма из диапазона, вычисляемая в БД отдельно для каждой строки."""
+
+    return Cast(
+        Round(Random() * (high - low) + low, 2),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def update_debt_in_chunks(
+    debt, queryset=None, chunk_size=1000, skip_locked=True, on_chunk=None
+) -> int:
+    """Изменяет задолженность набора звеньев порциями по первичному ключу.
+
+    Каждая порция блокируется ``SELECT ... FOR UPDATE OF`` только по строкам
+    самих звеньев (соединения фильтров с поставщиком его не блокируют) и
+    изменяется одним ``UPDATE ... SET debt = <выражение>`` в собственной
+    короткой транзакции вместе с дельтой сводной задолженности, поэтому
+    блокировки держатся только на время одной порции. С ``skip_locked``
+    строки, заблокированные другими транзакциями, пропускаются до следующего
+    запуска, и задача не ждёт писателей API. ``on_chunk`` вызывается с числом строк каждой порции.
+    Возвращает число изменённых звеньев.
+    """
+
+    if queryset is None:
+        queryset = NetworkNode.objects.all()
+    last_pk, total = 0, 0
+    while True:
+        with transaction.atomic():
+            pks = list(
+                queryset.select_for_update(skip_locked=skip_locked, of=("self",))
+                .filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:chunk_size]
+            )
+            if not pks:
+                break
+            chunk = NetworkNode.objects.filter(pk__in=pks)
+            deltas = queryset_deltas(chunk, sign=-1, with_counts=False)
+            total += chunk.update(debt=debt, updated_at=timezone.now())
+            apply_deltas(queryset_deltas(chunk, with_counts=False, deltas=deltas))
+        last_pk = pks[-1]
+        if on_chunk is not None:
+            on_chunk(len(pks))
+    invalidate_network(everything=True)
+    return total
+
+
+def accrue_debt(low, high, chunk_size=1000) -> int:
+    """Увеличивает задолженность всех звеньев с поставщиком на случайную сумму."""
+
+    return update_debt_in_chunks(
+        Least(F("debt") + random_amount(low, high), Value(MAX_DEBT)),
+        NetworkNode.objects.filter(supplier__isnull=False),
+        chunk_size,
+    )
+
+
+def repay_debt(low, high, chunk_size=1000) -> int:
+    """Уменьшает задолженность должников на случайную сумму, но не ниже нуля."""
+
+    return update_debt_in_chunks(
+        Greatest(F("debt") - random_amount(low, high), Value(Decimal(0))),
+        NetworkNode.objects.filter(debt__gt=0),
+        chunk_size,
+    )
+
+
+def clear_debt(clearing, queryset, chunk_size=1000) -> int:
+    """Обнуляет задолженность набора звеньев, отмечая прогресс списания.
+
+    Строки не пропускаются: порция ждёт только блокировки своих строк, а
+    собственные блокировки снимает сразу после ``UPDATE``. Число обработанных
+    звеньев сохраняется в ``clearing`` после каждой порции.
+    """
+
+    progress = DebtClearing.objects.filter(pk=clearing.pk)
+    progress.update(status=DebtClearing.Status.RUNNING, total=queryset.count())
+    try:
+        cleared = update_debt_in_chunks(
+            Value(Decimal(0)),
+            queryset,
+            chunk_size,
+            skip_locked=False,
+            on_chunk=lambda size: progress.update(processed=F("processed") + size),
+        )
+    except Exception:
+        progress.update(status=DebtClearing.Status.FAILED, finished_at=timezone.now())
+        raise
+    progress.update(status=DebtClearing.Status.DONE, finished_at=timezone.now())
+    return cleared
@@ -0,0 +1,110 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from network.cache import invalidate_network, invalidate_products
+from network.models import NetworkNode, Product
+from network.services import detach_subtree, sync_node_path
+from network.stats import (SUMMARY_FIELDS, apply_deltas, detach_supplier_group,
+                           node_deltas, snapshot)
+
+
+def touch_nodes(pks):
+    """Отмечает звенья изменёнными, когда меняются их связанные данные."""
+
+    pks = list(pks)
+    NetworkNode.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+    invalidate_network(*pks)
+
+
+def affects_summary(update_fields):
+    """Затрагивает ли сохранение поля, по которым строится сводка."""
+
+    return update_fields is None or not set(update_fields).isdisjoint(
+        {"debt", "country", "city", "type", "supplier"}
+    )
+
+
+@receiver(pre_save, sender=NetworkNode)
+def remember_node_summary(sender, instance, update_fields=None, **kwargs):
+    """Запоминает значения звена в БД до сохранения для дельты сводки."""
+
+    instance._summary_snapshot = None
+    if not instance._state.adding and affects_summary(update_fields):
+        instance._summary_snapshot = (
+            NetworkNode.objects.filter(pk=instance.pk).values(*SUMMARY_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=NetworkNode)
+def sync_saved_node(sender, instance, created, update_fields=None, **kwargs):
+    """Поддерживает материализованный путь при создании и смене поставщика,
+    сводную задолженность и инвалидирует кеш ответов по звену."""
+
+    if affects_summary(update_fields):
+        old = getattr(instance, "_summary_snapshot", None)
+        if created or old is not None:
+            apply_deltas(node_deltas(old, snapshot(instance)))
+    moved = False
+    if update_fields is None or "supplier" in update_fields:
+        moved = sync_node_path(instance)
+    if created:
+        invalidate_network()
+    else:
+        invalidate_network(instance.pk, everything=moved)
+
+
+@receiver(pre_delete, sender=NetworkNode)
+def prepare_node_delete(sender, instance, **kwargs):
+    """Перестраивает пути покупателей и убирает звено из сводной
+    задолженности до удаления.
+
+    Сигналы ``pre_delete`` всех удаляемых звеньев отправляются до того, как
+    у покупателей обнуляется поставщик, поэтому звено вычитается из групп
+    по своим значениям в БД, даже если его поставщик удаляется тем же
+    запросом.
+    """
+
+    old = NetworkNode.objects.filter(pk=instance.pk).values(*SUMMARY_FIELDS).first()
+    if old is not None:
+        apply_deltas(node_deltas(old=old))
+    detach_subtree(instance)
+
+
+@receiver(post_delete, sender=NetworkNode)
+def sync_deleted_node(sender, instance, **kwargs):
+    """Переносит оставшихся покупателей звена в группу без поставщика;
+    удаление звена меняет поставщика и путь у его покупателей, поэтому кеш
+    сбрасывается целиком."""
+
+    detach_supplier_group(instance.pk)
+    invalidate_network(everything=True)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_saved_product(sender, instance, **kwargs):
+    invalidate_products(instance.pk)
+
+
+@receiver(pre_delete, sender=Product)
+def invalidate_deleted_product(sender, instance, **kwargs):
+    """Удаление продукта убирает его из звеньев сети, где он продавался."""
+
+    invalidate_products(instance.pk)
+    touch_nodes(instance.networknode_set.values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=NetworkNode.products.through)
+def invalidate_node_products(sender, instance, action, reverse, pk_set, **kwargs):
+    """Изменение состава продуктов меняет ответы только затронутых звеньев."""
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        touch_nodes([instance.pk])
+    elif pk_set is not None:
+        touch_nodes(pk_set)
+    else:
+        NetworkNode.objects.update(updated_at=timezone.now())
+        invalidate_network(everything=True)
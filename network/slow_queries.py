@@ -0,0 +1,276 @@
+import atexit
+import hashlib
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery import signals
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections, transaction
+from django.db.backends.signals import connection_created
+
+from config.middleware import StreamingContent, bound
+from config.timing import untimed
+from network.models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+# Сколько медленных запросов хранится в памяти до записи в БД
+MAX_PENDING = 1000
+
+NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+STRING = re.compile(r"'(?:[^']|'')*'")
+# Списки параметров, например IN (?, ?, ?), и повторяющиеся строки VALUES
+PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+REPEATED_GROUP = re.compile(r"\(\s*([^()]*?)\s*\)(?:\s*,\s*\(\s*\1\s*\))+")
+SPACES = re.compile(r"\s+")
+# Чтения, для которых сохраняется план; блокирующие чтения пропускаются
+READ_QUERY = re.compile(r"\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+LOCKING_READ = re.compile(
+    r"\bFOR\s+(?:UPDATE|NO\s+KEY\s+UPDATE|SHARE|KEY\s+SHARE)\b", re.IGNORECASE
+)
+WRITING_CTE = re.compile(
+    r"\bAS\s+(?:NOT\s+)?(?:MATERIALIZED\s+)?\(\s*(?:INSERT|UPDATE|DELETE|MERGE)\b",
+    re.IGNORECASE,
+)
+
+# Запрос и задача Celery, выполняющие SQL в текущем контексте
+current_request = ContextVar("slow_query_request", default=None)
+current_task = ContextVar("slow_query_task", default=None)
+# Флаг записи медленного запроса: запросы самого регистратора не замеряются
+recording = ContextVar("slow_query_recording", default=False)
+
+pending = []
+pending_lock = threading.Lock()
+task_tokens = {}
+
+
+def normalize(sql: str) -> str:
+    """Запрос без значений: числа и строки заменены на ``?``, списки
+    параметров и строки ``VALUES`` свёрнуты до одного элемента."""
+
+    sql = NUMBER.sub("?", STRING.sub("?", sql)).replace("%s", "?")
+    sql = PLACEHOLDER_LIST.sub("?", sql)
+    sql = REPEATED_GROUP.sub(r"(\1)", sql)
+    return SPACES.sub(" ", sql).strip()
+
+
+def fingerprint(sql: str) -> str:
+    """Отпечаток запроса: одинаков у запросов, отличающихся только
+    значениями и длиной списков параметров."""
+
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()
+
+
+def process_source() -> str:
+    argv = sys.argv
+    name = os.path.basename(argv[0]) if argv else ""
+    if name == "manage.py" and len(argv) > 1:
+        return f"command {argv[1]}"
+    return f"process {name}"
+
+
+def get_source() -> str:
+    """Представление, задача Celery или команда, выполнившая запрос."""
+
+    request = current_request.get()
+    if request is not None:
+        match = request.resolver_match
+        return f"view {match.view_name}" if match else f"path {request.path}"
+    task = current_task.get()
+    if task is not None:
+        return f"task {task}"
+    return process_source()
+
+
+def explain(connection, sql, params) -> str:
+    """План запроса; на PostgreSQL — ``EXPLAIN (ANALYZE, BUFFERS)``
+    с фактическим числом строк, временем узлов и обращениями к буферам.
+
+    ``ANALYZE`` выполняет запрос ещё раз, поэтому план строится только для
+    чтений без блокировок и после отправки ответа. Точка сохранения всегда
+    откатывается, так что ни ошибка, ни побочные эффекты запроса не
+    затрагивают транзакцию вызывающего кода.
+    """
+
+    options = {}
+    if connection.vendor == "postgresql":
+        options = {"analyze": True, "buffers": True}
+    prefix = connection.ops.explain_query_prefix(**options)
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f"{prefix} {sql}", params)
+                plan = "\n".join(str(row[-1]) for row in cursor.fetchall())
+            transaction.set_rollback(True, using=connection.alias)
+        return plan
+    except DatabaseError as exc:
+        return f"EXPLAIN failed: {exc}"
+
+
+def needs_plan(sql, many) -> bool:
+    return (
+        not many
+        and READ_QUERY.match(sql) is not None
+        and LOCKING_READ.search(sql) is None
+        and WRITING_CTE.search(sql) is None
+        and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE
+    )
+
+
+def record(connection, sql, params, many, duration):
+    """Запоминает медленный запрос; план для выборки чтений строится
+    позже, в :func:`flush`, а не во время обработки запроса."""
+
+    alias = connection.alias if needs_plan(sql, many) else None
+    with pending_lock:
+        if len(pending) < MAX_PENDING:
+            entry = SlowQuery(
+                fingerprint=fingerprint(sql),
+                sql=sql,
+                duration=round(duration, 3),
+                source=get_source()[:200],
+            )
+            pending.append((entry, alias, params))
+
+
+def record_slow_query(execute, sql, params, many, context):
+    if recording.get():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = (time.perf_counter() - started) * 1000
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    if threshold and duration >= threshold:
+        token = recording.set(True)
+        try:
+            record(context["connection"], sql, params, many, duration)
+        finally:
+            recording.reset(token)
+    return result
+
+
+def install_query_wrapper(connection, **kwargs):
+    """Добавляет :func:`record_slow_query` в ``execute_wrappers`` соединения."""
+
+    if record_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_slow_query)
+
+
+connection_created.connect(install_query_wrapper)
+
+
+def flush():
+    """Строит планы и записывает накопленные медленные запросы в БД.
+
+    Вызывается после отправки ответа, после задачи Celery и при завершении
+    процесса (для команд), а не сразу после запроса, чтобы запись не попала
+    в транзакцию, которую вызывающий код может откатить. Эти SQL-запросы
+    не учитываются в замере текущего запроса.
+    """
+
+    with pending_lock:
+        if not pending:
+            return
+        entries = pending[:]
+        pending.clear()
+    token = recording.set(True)
+    try:
+        with untimed():
+            for entry, alias, params in entries:
+                if alias is not None:
+                    entry.plan = explain(connections[alias], entry.sql, params)
+            SlowQuery.objects.bulk_create([entry for entry, _, _ in entries])
+    except DatabaseError as exc:
+        logger.warning("Could not save %d slow queries: %s", len(entries), exc)
+    finally:
+        recording.reset(token)
+
+
+atexit.register(flush)
+
+
+@request_finished.connect
+def flush_after_response(**kwargs):
+    """Записывает медленные запросы после отправки ответа клиенту.
+
+    ``request_finished`` отправляется из ``response.close()``, который
+    WSGI-сервер и ASGI-обработчик Django вызывают после передачи тела
+    ответа, а для потокового ответа — после чтения содержимого. Соединения,
+    открытые для записи уже после ``close_old_connections``, закрываются
+    по тем же правилам; соединения внутри транзакции (в тестах) не трогаются.
+    """
+
+    if not pending:
+        return
+    flush()
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+
+@signals.task_prerun.connect
+def task_prerun(task_id=None, task=None, **kwargs):
+    task_tokens[task_id] = current_task.set(task.name)
+
+
+@signals.task_postrun.connect
+def task_postrun(task_id=None, **kwargs):
+    token = task_tokens.pop(task_id, None)
+    if token is not None:
+        current_task.reset(token)
+    flush()
+
+
+class SlowQueryMiddleware:
+    """Связывает медленные запросы с представлением; в БД они записываются
+    после отправки ответа в :func:`flush_after_response`. Работает и в
+    синхронном, и в асинхронном стеке."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.bind_streaming(request, response)
+
+    async def __acall__(self, request):
+        token = current_request.set(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.bind_streaming(request, response)
+
+    @staticmethod
+    def bind_streaming(request, response):
+        """Связывает SQL-запросы, выполняемые при чтении потокового ответа,
+        с представлением."""
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = StreamingContent(
+                response.streaming_content,
+                context=partial(bound, current_request, request),
+            )
+        return response
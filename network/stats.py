@@ -0,0 +1,113 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+
+from network.models import DebtSummary, NetworkNode
+
+# Группировка сводной задолженности и поле звена, по которому она строится
+DIMENSIONS = {
+    DebtSummary.Dimension.COUNTRY: "country",
+    DebtSummary.Dimension.CITY: "city",
+    DebtSummary.Dimension.TYPE: "type",
+    DebtSummary.Dimension.SUPPLIER: "supplier_id",
+}
+SUMMARY_FIELDS = ("debt", *DIMENSIONS.values())
+
+
+def group_key(value) -> str:
+    return "" if value is None else str(value)
+
+
+def snapshot(node) -> dict:
+    """Значения звена, от которых зависит сводная задолженность."""
+
+    return {field: getattr(node, field) for field in SUMMARY_FIELDS}
+
+
+def node_deltas(old=None, new=None, deltas=None):
+    """Изменения сводки при переходе звена из состояния ``old`` в ``new``.
+
+    ``None`` означает отсутствие звена, т.е. его создание или удаление.
+    """
+
+    deltas = defaultdict(lambda: [Decimal(0), 0]) if deltas is None else deltas
+    for values, sign in ((old, -1), (new, 1)):
+        if values is None:
+            continue
+        for dimension, field in DIMENSIONS.items():
+            delta = deltas[dimension, group_key(values[field])]
+            delta[0] += sign * Decimal(values["debt"] or 0)
+            delta[1] += sign
+    return deltas
+
+
+def queryset_deltas(queryset, sign=1, with_counts=True, deltas=None):
+    """Вклад набора звеньев в сводку, посчитанный агрегатами в БД.
+
+    Используется вокруг массовых ``UPDATE``: вклад вычитается до изменения
+    и добавляется после, по одному агрегатному запросу на группировку.
+    """
+
+    deltas = defaultdict(lambda: [Decimal(0), 0]) if deltas is None else deltas
+    for dimension, field in DIMENSIONS.items():
+        rows = (
+            queryset.order_by()
+            .values(field)
+            .annotate(total_debt=Sum("debt"), nodes=Count("pk"))
+        )
+        for row in rows:
+            delta = deltas[dimension, group_key(row[field])]
+            delta[0] += sign * (row["total_debt"] or 0)
+            if with_counts:
+                delta[1] += sign * row["nodes"]
+    return deltas
+
+
+def apply_deltas(deltas) -> None:
+    """Применяет изменения к сводке атомарными ``UPDATE ... SET x = x + d``.
+
+    Группы обновляются в порядке ключей, чтобы параллельные транзакции
+    блокировали строки сводки в одном порядке и не взаимоблокировались.
+    Недостающие группы создаются одним ``INSERT`` на весь набор изменений.
+    """
+
+    missing = {}
+    for (dimension, key), (debt, nodes) in sorted(deltas.items()):
+        if not debt and not nodes:
+            continue
+        changes = {"total_debt": F("total_debt") + debt, "nodes": F("nodes") + nodes}
+        if not DebtSummary.objects.filter(dimension=dimension, key=key).update(
+            **changes
+        ):
+            missing[dimension, key] = changes
+    if missing:
+        DebtSummary.objects.bulk_create(
+            [DebtSummary(dimension=dimension, key=key) for dimension, key in missing],
+            ignore_conflicts=True,
+        )
+        for (dimension, key), changes in missing.items():
+            DebtSummary.objects.filter(dimension=dimension, key=key).update(**changes)
+
+
+def detach_supplier_group(supplier_pk) -> None:
+    """Переносит покупателей удалённого поставщика в группу без поставщика."""
+
+    group = DebtSummary.objects.filter(
+        dimension=DebtSummary.Dimension.SUPPLIER, key=str(supplier_pk)
+    ).first()
+    if group is None:
+        return
+    apply_deltas({(group.dimension, ""): (group.total_debt, group.nodes)})
+    group.delete()
+
+
+def rebuild_debt_summary() -> None:
+    """Полностью пересчитывает сводку агрегатами по всем звеньям."""
+
+    DebtSummary.objects.all().delete()
+    deltas = queryset_deltas(NetworkNode.objects.all())
+    DebtSummary.objects.bulk_create(
+        DebtSummary(dimension=dimension, key=key, total_debt=debt, nodes=nodes)
+        for (dimension, key), (debt, nodes) in deltas.items()
+    )
@@ -0,0 +1,41 @@
+from celery import shared_task
+from django.conf import settings
+
+from network import services
+from network.models import DebtClearing, NetworkNode
+
+
+@shared_task
+def accrue_debt():
+    """Периодически увеличивает задолженность звеньев перед поставщиками."""
+
+    low, high = settings.DEBT_ACCRUAL_RANGE
+    return services.accrue_debt(low, high, settings.DEBT_UPDATE_CHUNK_SIZE)
+
+
+@shared_task
+def repay_debt():
+    """Периодически уменьшает задолженность звеньев перед поставщиками."""
+
+    low, high = settings.DEBT_REPAYMENT_RANGE
+    return services.repay_debt(low, high, settings.DEBT_UPDATE_CHUNK_SIZE)
+
+
+@shared_task
+def clear_debt(clearing_pk, selection):
+    """Обнуляет задолженность выбранных в админке звеньев порциями.
+
+    ``selection`` — выбор звеньев из ``network.admin.get_selection``.
+    """
+
+    # Админка импортирует задачи, поэтому импорт отложен до вызова
+    from django.contrib import admin
+
+    from network.admin import NetworkNodeAdmin
+
+    queryset = NetworkNodeAdmin(NetworkNode, admin.site).get_selected_queryset(selection)
+    return services.clear_debt(
+        DebtClearing.objects.get(pk=clearing_pk),
+        queryset,
+        settings.DEBT_UPDATE_CHUNK_SIZE,
+    )
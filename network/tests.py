@@ -1,31 +1,82 @@
-from django.urls import reverse
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+from zoneinfo import ZoneInfo
+
+import brotli
+import msgpack
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils.translation import gettext_lazy
+from prometheus_client import REGISTRY
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
-from network.models import NetworkNode, Product
+from config.metrics import get_registry
+from config.renderers import ORJSONRenderer
+from config.timing import request_timing
+from network.admin import NetworkNodeAdmin, clear_debt
+from network.benchmarks import uncovered_url_names
+from network.filter import NetworkNodeFilter
+from network.importer import import_network
+from network.models import (DebtClearing, DebtSummary, NetworkNode, Product,
+                            SlowQuery)
+from network.paginators import NetworkNodeCursorPagination
+from network.seeding import SeedOptions, clear_seeded, generate
+from network.serializers import NetworkNodeSerializer, ProductSerializer
+from network.services import SUPPLY_CHAIN_SQL, get_supply_chain, rebuild_paths
+from network.slow_queries import (SlowQueryMiddleware, fingerprint, needs_plan,
+                                  normalize)
+from network.stats import apply_deltas, queryset_deltas
+from network.tasks import accrue_debt
+from network.tasks import clear_debt as clear_debt_task
+from network.tasks import repay_debt
+from network.throttling import SLOT_ACQUIRED, LocalLimits, local_limits
 from users.models import User
 
 
-class NetworkNodeTestCase(APITestCase):
-    """ Тесты модели NetworkNode."""
+class AuthenticatedAPITestCase(APITestCase):
+    """ Тесты API с клиентом, авторизованным по JWT."""
+
+    userdata = {"email": "test@test.ru", "password": "12345"}
 
     def setUp(self):
-        """Заполняем БД перед началом тестов."""
+        """ Очищаем кеш, создаём пользователя и получаем токен."""
 
-        self.userdata = {
-            "email": "test@test.ru",
-            "password": "12345",
-        }
-        # создаём пользователя
-        user = User.objects.create(email=self.userdata.get("email"), is_active=True)
-        user.set_password(self.userdata.get("password"))
+        cache.clear()
+
+        user = User.objects.create(email=self.userdata["email"], is_active=True)
+        user.set_password(self.userdata["password"])
         user.save()
-        # получаем токен
         response = self.client.post(reverse("users:login"), self.userdata)
-        # добавляем токен к авторизации
-        self.client.credentials(
-            HTTP_AUTHORIZATION="Bearer " + response.json().get("access")
-        )
+        self.token = "Bearer " + response.json().get("access")
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+
+
+class NetworkNodeTestCase(AuthenticatedAPITestCase):
+    """ Тесты модели NetworkNode."""
+
+    def setUp(self):
+        """Заполняем БД перед началом тестов."""
+
+        super().setUp()
         # шаблон для создания нового поставщика
         self.factory_data = {
             "title": "Big",
@@ -152,27 +203,962 @@ class NetworkNodeTestCase(APITestCase):
         # Проверка, что статус-код ответа соответствует 200 (ОК)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_node_list_cursor_pagination(self):
+        """ Тест курсорной пагинации списка звеньев сети."""
+
+        # Создание трёх звеньев сети
+        for title in ("A", "B", "C"):
+            NetworkNode.objects.create(**{**self.reseller_data, "title": title})
+        response = self.client.get(reverse("network:network_list"), {"page_size": 2})
+        data = response.json()
+        # Первая страница содержит два звена и ссылку на следующую
+        self.assertEqual([node["title"] for node in data["results"]], ["A", "B"])
+        self.assertIsNone(data["previous"])
+        self.assertIsNotNone(data["next"])
+        # Вторая страница содержит оставшееся звено
+        data = self.client.get(data["next"]).json()
+        self.assertEqual([node["title"] for node in data["results"]], ["C"])
+        self.assertIsNone(data["next"])
+
+    def test_product_list_cursor_pagination_same_titles(self):
+        """ Тест курсорной пагинации продуктов с одинаковыми названиями."""
+
+        products = [Product.objects.create(title="Phone") for _ in range(5)]
+        url, params, ids = "/product/", {"page_size": 2}, []
+        while url:
+            data = self.client.get(url, params).json()
+            ids += [product["id"] for product in data["results"]]
+            url, params = data["next"], None
+        # Продукты с одинаковым названием идут по первичному ключу без пропусков
+        self.assertEqual(ids, [product.pk for product in products])
+
+    def test_node_list_search(self):
+        """ Тест поиска звеньев сети с сортировкой по релевантности."""
+
+        NetworkNode.objects.create(
+            **{**self.reseller_data, "title": "Kazan Shop", "city": "Kazan",
+               "street": "Moscow avenue"}
+        )
+        NetworkNode.objects.create(
+            **{**self.reseller_data, "title": "Moscow Electronics", "city": "Moscow"}
+        )
+        NetworkNode.objects.create(
+            **{**self.reseller_data, "title": "Tula Shop", "city": "Tula"}
+        )
+        url = reverse("network:network_list")
+        # Совпадения в названии и городе релевантнее совпадения в улице
+        data = self.client.get(url, {"search": "moscow", "page_size": 1}).json()
+        self.assertEqual(
+            [node["title"] for node in data["results"]], ["Moscow Electronics"]
+        )
+        data = self.client.get(data["next"]).json()
+        self.assertEqual([node["title"] for node in data["results"]], ["Kazan Shop"])
+        self.assertIsNone(data["next"])
+        # Поиск сочетается с фильтрами
+        response = self.client.get(url, {"search": "shop", "country": "France"})
+        self.assertEqual(response.json()["results"], [])
+
+    def test_node_list_filters(self):
+        """ Тест фильтров списка звеньев сети."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        product = Product.objects.create(title="Phone")
+        retail = NetworkNode.objects.create(
+            **{**self.reseller_data, "title": "Retail", "type": "retail"},
+            supplier=factory,
+            debt=100,
+        )
+        retail.products.add(product)
+        NetworkNode.objects.create(
+            **{**self.reseller_data, "title": "Seller", "type": "seller",
+               "city": "Kazan"},
+            supplier=retail,
+            debt=10,
+            time="2020-01-01T00:00:00Z",
+        )
+        url = reverse("network:network_list")
+        cases = [
+            ({"type": "retail"}, ["Retail"]),
+            ({"city": "Kazan"}, ["Seller"]),
+            ({"supplier": factory.pk}, ["Retail"]),
+            ({"debt_min": 50}, ["Retail"]),
+            ({"debt_min": 5, "debt_max": 50}, ["Seller"]),
+            ({"time_before": "2021-01-01T00:00:00Z"}, ["Seller"]),
+            ({"time_after": "2021-01-01T00:00:00Z", "type": "factory"}, ["Big"]),
+            ({"product": product.pk}, ["Retail"]),
+        ]
+        for params, titles in cases:
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(
+                    [node["title"] for node in response.json()["results"]], titles
+                )
+        response = self.client.get(url, {"type": "shop"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_node_sparse_fields_and_expand(self):
+        """ Тест выборочных полей и раскрытия поставщика и продуктов."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        product = Product.objects.create(title="Phone", model="X100")
+        retail = NetworkNode.objects.create(
+            **{**self.reseller_data, "type": "retail"}, supplier=factory, debt=100
+        )
+        retail.products.add(product)
+        url = reverse("network:network_retrieve", kwargs={"pk": retail.pk})
+        response = self.client.get(url, {"fields": "id,title,debt"})
+        self.assertEqual(
+            response.json(), {"id": retail.pk, "title": "Mega", "debt": "100.00"}
+        )
+        response = self.client.get(
+            url, {"fields": "title,supplier,products", "expand": "supplier,products"}
+        )
+        data = response.json()
+        self.assertEqual(set(data), {"title", "supplier", "products"})
+        self.assertEqual(data["supplier"]["title"], "Big")
+        self.assertEqual(data["products"], [ProductSerializer(product).data])
+        # Раскрытие поля, не попавшего в выборку, игнорируется
+        response = self.client.get(url, {"fields": "title", "expand": "supplier"})
+        self.assertEqual(response.json(), {"title": "Mega"})
+        # Изменение поставщика обновляет закешированный ответ покупателя
+        response = self.client.get(url, {"expand": "supplier"})
+        factory.title = "Bigger"
+        factory.save()
+        response = self.client.get(
+            url, {"expand": "supplier"}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["supplier"]["title"], "Bigger")
+        # Изменение продукта обновляет список с раскрытыми продуктами
+        list_url = reverse("network:network_list")
+        self.client.get(list_url, {"expand": "products"})
+        product.model = "X200"
+        product.save()
+        response = self.client.get(list_url, {"expand": "products"})
+        products = [node["products"] for node in response.json()["results"]]
+        self.assertIn([ProductSerializer(product).data], products)
+
+    def test_node_sparse_fields_errors(self):
+        """ Тест ошибок выборочных полей и раскрытия связей."""
+
+        url = reverse("network:network_list")
+        response = self.client.get(url, {"fields": "title,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", response.json())
+        response = self.client.get(url, {"expand": "path"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("expand", response.json())
+
+    def test_fast_path_matches_serializer(self):
+        """ Тест побайтового совпадения быстрого представления списков
+        с ответом сериализаторов."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        products = [
+            Product.objects.create(title=title, model=model, release_date=date)
+            for title, model, date in (
+                ("Phone", "X100", "2020-02-01"),
+                ("Laptop", None, None),
+                ("Phone", "X200", "2021-02-01"),
+            )
+        ]
+        retail = NetworkNode.objects.create(
+            **{**self.reseller_data, "type": "retail", "house": None},
+            supplier=factory,
+            debt="1234.5",
+        )
+        retail.products.set(products)
+        factory.products.add(products[1])
+        renderer = JSONRenderer()
+        for fields in (None, "id,title,debt,time,products", "supplier,updated_at"):
+            with self.subTest(fields=fields):
+                params = {"fields": fields} if fields else {}
+                response = self.client.get(reverse("network:network_list"), params)
+                expected = NetworkNodeSerializer(
+                    NetworkNode.objects.with_relations(),
+                    many=True,
+                    fields=fields and fields.split(","),
+                ).data
+                self.assertEqual(
+                    renderer.render(response.data["results"]), renderer.render(expected)
+                )
+        response = self.client.get("/product/")
+        expected = ProductSerializer(Product.objects.all(), many=True).data
+        self.assertEqual(
+            renderer.render(response.data["results"]), renderer.render(expected)
+        )
+
+    def test_node_list_cached(self):
+        """ Тест кеширования списка звеньев сети с учётом фильтров."""
+
+        NetworkNode.objects.create(**self.factory_data)
+        url = reverse("network:network_list")
+        self.client.get(url, {"country": "Russia"})
+        # Повторный запрос не обращается к БД: ответ и пользователь берутся
+        # из кеша
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"country": "Russia"})
+        self.assertEqual(len(response.json()["results"]), 1)
+        # Другая строка фильтров кешируется отдельно
+        response = self.client.get(url, {"country": "France"})
+        self.assertEqual(response.json()["results"], [])
+
+    def test_node_cache_invalidation(self):
+        """ Тест инвалидации кеша при изменении звена и его продуктов."""
+
+        self.factory = NetworkNode.objects.create(**self.factory_data)
+        url = reverse("network:network_retrieve", kwargs={"pk": self.factory.pk})
+        self.client.get(url)
+        self.client.get(reverse("network:network_list"))
+        self.client.patch(
+            reverse("network:network_update", kwargs={"pk": self.factory.pk}),
+            {"city": "Kazan"},
+        )
+        self.assertEqual(self.client.get(url).json()["city"], "Kazan")
+        response = self.client.get(reverse("network:network_list"))
+        self.assertEqual(response.json()["results"][0]["city"], "Kazan")
+        # Изменение состава продуктов инвалидирует карточку звена
+        product = Product.objects.create(title="Phone")
+        self.factory.products.add(product)
+        self.assertEqual(self.client.get(url).json()["products"], [product.pk])
+        product.delete()
+        self.assertEqual(self.client.get(url).json()["products"], [])
+
+    def test_node_write_cache_unavailable(self):
+        """ Тест изменения звеньев и продуктов при недоступном Redis."""
+
+        unavailable = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": "redis://127.0.0.1:1/0",
+            }
+        }
+        # Инвалидация кеша из сигналов не превращает записанное изменение
+        # в ошибку 500
+        with self.settings(CACHES=unavailable), self.assertLogs("config.cache", "WARNING"):
+            response = self.client.post(
+                reverse("network:network_create"), data=self.factory_data
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            node = NetworkNode.objects.get()
+            node.products.add(Product.objects.create(title="Phone"))
+            node.delete()
+
+    def test_node_conditional_get(self):
+        """ Тест ответа 304 Not Modified для неизменённого звена сети."""
+
+        self.factory = NetworkNode.objects.create(**self.factory_data)
+        url = reverse("network:network_retrieve", kwargs={"pk": self.factory.pk})
+        response = self.client.get(url)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Клиент, передающий только If-Modified-Since, тоже получает 304
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        list_response = self.client.get(reverse("network:network_list"))
+        # После изменения звена ETag меняется
+        self.factory.products.add(Product.objects.create(title="Phone"))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(
+            reverse("network:network_list"),
+            HTTP_IF_NONE_MATCH=list_response["ETag"],
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_conditional_get(self):
+        """ Тест условного GET списка: валидаторы берутся из кеша, меняются
+        при удалении звена и различаются по формату ответа."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        shop = NetworkNode.objects.create(**self.reseller_data, supplier=factory)
+        url = reverse("network:network_list")
+        response = self.client.get(url)
+        self.assertIn("Accept", response["Vary"])
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        self.assertNotEqual(response["ETag"], etag)
+        # Удаление не меняет updated_at оставшихся звеньев, но список
+        # строится заново с новым Last-Modified
+        shop.delete()
+        with mock.patch("time.time", return_value=time.time() + 2):
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()["results"]), 1)
+
+    def test_bulk_create(self):
+        """ Тест пакетного создания звеньев сети."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        product = Product.objects.create(title="Phone")
+        # Группы сводной задолженности для пакетов уже существуют
+        NetworkNode.objects.create(**self.reseller_data, supplier=factory)
+        # Пользователь уже в кеше аутентификации
+        self.client.get(reverse("network:network_stats"))
+        queries = []
+        for start, count in ((0, 2), (2, 20)):
+            data = [
+                {
+                    **self.reseller_data,
+                    "title": f"Shop {i}",
+                    "supplier": factory.pk,
+                    "products": [product.pk],
+                }
+                for i in range(start, start + count)
+            ]
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(
+                    reverse("network:network_bulk"), data, format="json"
+                )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(response.json()), count)
+            queries.append(len(context))
+        # Число запросов не зависит от размера пакета
+        self.assertEqual(queries[0], queries[1])
+        shop = NetworkNode.objects.get(title="Shop 7")
+        self.assertEqual(shop.path, f"/{factory.pk}/{shop.pk}/")
+        self.assertEqual(list(shop.products.all()), [product])
+
+    def test_bulk_create_errors_by_index(self):
+        """ Тест ошибок пакетного создания по индексам элементов."""
+
+        NetworkNode.objects.create(**self.factory_data)
+        data = [
+            {**self.reseller_data, "title": "Shop"},
+            {**self.reseller_data, "title": "Big"},
+            {**self.reseller_data, "title": "Shop", "supplier": 999},
+        ]
+        response = self.client.post(
+            reverse("network:network_bulk"), data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertIn("title", errors[1])
+        self.assertEqual(set(errors[2]), {"title", "supplier"})
+        self.assertFalse(NetworkNode.objects.filter(title="Shop").exists())
+
+    def test_bulk_update(self):
+        """ Тест пакетного обновления звеньев сети с проверкой циклов."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        first = NetworkNode.objects.create(**self.reseller_data, supplier=factory)
+        second = NetworkNode.objects.create(
+            **{**self.reseller_data, "title": "Mini"}, supplier=first
+        )
+        url = reverse("network:network_bulk")
+        response = self.client.patch(
+            url,
+            [{"id": first.pk, "supplier": second.pk}, {"id": second.pk}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("supplier", response.json()[0])
+        response = self.client.patch(
+            url,
+            [
+                {"id": first.pk, "city": "Kazan"},
+                {"id": second.pk, "supplier": factory.pk},
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.city, "Kazan")
+        self.assertEqual(second.path, f"/{factory.pk}/{second.pk}/")
+
+    def test_export(self):
+        """ Тест потоковой выгрузки сети в CSV и NDJSON с фильтрами."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        products = Product.objects.bulk_create(
+            [Product(title="Phone"), Product(title="Laptop")]
+        )
+        factory.products.add(*products)
+        NetworkNode.objects.create(**{**self.reseller_data, "country": "France"})
+        url = reverse("network:network_export")
+        response = self.client.get(url, {"country": "Russia"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("id,title,"))
+        response = self.client.get(url, {"export_format": "ndjson"})
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual([row["title"] for row in rows], ["Big", "Mega"])
+        self.assertEqual(len(rows[0]["products"]), 2)
+        # Команда выгрузки поддерживает те же фильтры
+        output = StringIO()
+        call_command(
+            "export_network", "--format=ndjson", "--filter=country=France", stdout=output
+        )
+        self.assertEqual(json.loads(output.getvalue())["title"], "Mega")
+
+    def test_import_network(self):
+        """ Тест массовой загрузки звеньев, продуктов и связей из CSV."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        other = NetworkNode.objects.create(**{**self.factory_data, "title": "Other"})
+        loop = NetworkNode.objects.create(
+            **{**self.reseller_data, "title": "Loop"}, supplier=other
+        )
+        # Цикл, замкнутый в обход проверок, оставляет звенья вне иерархии,
+        # но не мешает последующим загрузкам
+        NetworkNode.objects.filter(pk=other.pk).update(supplier=loop)
+        NetworkNode.objects.filter(pk__in=[other.pk, loop.pk]).update(path="")
+        updated_at = NetworkNode.objects.get(pk=factory.pk).updated_at
+        files = {
+            "products": "title,model,release_date\nPhone,X1,2023-01-01\n",
+            "nodes": (
+                "title,email,type,supplier,debt,house\n"
+                "Shop,shop@shop.ru,retail,Big,100.50,0\n"
+                "Kiosk,kiosk@kiosk.ru,seller,Shop,,\n"
+                "Bad,bad@bad.ru,factory,Big,,\n"
+                "Orphan,orphan@orphan.ru,seller,Nowhere,,\n"
+                "Rich,rich@rich.ru,seller,Big,1e9,\n"
+                "Tower,tower@tower.ru,seller,Big,,99999\n"
+            ),
+            "links": "node,product,model\nShop,Phone,X1\nKiosk,Phone,X1\n",
+        }
+        paths = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name, content in files.items():
+                paths[name] = os.path.join(directory, f"{name}.csv")
+                with open(paths[name], "w", encoding="utf-8") as file:
+                    file.write(content)
+            output, errors = StringIO(), StringIO()
+            call_command(
+                "import_network",
+                *(f"--{name}={path}" for name, path in paths.items()),
+                stdout=output,
+                stderr=errors,
+            )
+        self.assertIn("строк/с", output.getvalue())
+        self.assertIn("Строка 3 (Bad)", errors.getvalue())
+        self.assertIn("Строка 4 (Orphan)", errors.getvalue())
+        self.assertIn("Строка 5 (Rich): Задолженность", errors.getvalue())
+        self.assertIn("Строка 6 (Tower): Номер дома", errors.getvalue())
+        kiosk = NetworkNode.objects.get(title="Kiosk")
+        self.assertEqual(kiosk.supplier.title, "Shop")
+        self.assertEqual(kiosk.level, 2)
+        self.assertEqual(kiosk.supplier.debt, 100.5)
+        self.assertEqual(kiosk.supplier.house, 0)
+        self.assertEqual([p.model for p in kiosk.products.all()], ["X1"])
+        self.assertFalse(NetworkNode.objects.filter(title="Bad").exists())
+        # Звенья вне загрузки не переписываются
+        self.assertEqual(NetworkNode.objects.get(pk=factory.pk).updated_at, updated_at)
+        self.assertEqual(NetworkNode.objects.get(pk=other.pk).path, "")
+
+    def test_import_moves_subtree(self):
+        """ Тест пересчёта путей покупателей звена, перенесённого загрузкой."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        other = NetworkNode.objects.create(**{**self.factory_data, "title": "Other"})
+        shop = NetworkNode.objects.create(**self.reseller_data, supplier=factory)
+        kiosk = NetworkNode.objects.create(
+            **{**self.reseller_data, "title": "Kiosk"}, supplier=shop
+        )
+        nodes = StringIO(
+            "title,email,type,supplier,debt\n"
+            f"{shop.title},{shop.email},retail,Other,10\n"
+        )
+        import_network(nodes=nodes, log=lambda message: None)
+        kiosk.refresh_from_db()
+        self.assertEqual(kiosk.path, f"/{other.pk}/{shop.pk}/{kiosk.pk}/")
+        self.assertEqual(kiosk.level, 2)
+        self.assert_summary_consistent()
+
+        # Цикл, созданный загрузкой, откатывает её
+        nodes = StringIO(
+            "title,email,type,supplier\n"
+            f"Other,{other.email},retail,Kiosk\n"
+        )
+        with self.assertRaisesMessage(ValueError, "Other"):
+            import_network(nodes=nodes, log=lambda message: None)
+        other.refresh_from_db()
+        self.assertEqual(other.path, f"/{other.pk}/")
+
+    def assert_summary_consistent(self):
+        """ Сверяет сводную задолженность с агрегатами по звеньям."""
+
+        expected = {
+            group: (debt, nodes)
+            for group, (debt, nodes) in queryset_deltas(
+                NetworkNode.objects.all()
+            ).items()
+        }
+        actual = {
+            (row.dimension, row.key): (row.total_debt, row.nodes)
+            for row in DebtSummary.objects.filter(nodes__gt=0)
+        }
+        self.assertEqual(actual, expected)
+
+    def test_debt_stats(self):
+        """ Тест инкрементального обновления сводной задолженности."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        retail = NetworkNode.objects.create(
+            **{**self.reseller_data, "type": "retail"}, supplier=factory, debt=100
+        )
+        seller = NetworkNode.objects.create(
+            **{**self.reseller_data, "title": "Mini", "city": "Kazan"},
+            supplier=retail,
+            debt=40,
+        )
+        self.assert_summary_consistent()
+        response = self.client.get(
+            reverse("network:network_stats"), {"dimension": "city"}
+        )
+        self.assertEqual(
+            response.json(),
+            [
+                {"dimension": "city", "key": "Moscow", "total_debt": "100.00", "nodes": 2},
+                {"dimension": "city", "key": "Kazan", "total_debt": "40.00", "nodes": 1},
+            ],
+        )
+        # Изменение задолженности и переезд звена
+        seller.debt = 70
+        seller.city = "Moscow"
+        seller.save()
+        self.assert_summary_consistent()
+        # Массовое списание задолженности из админки
+        self.run_clear_debt(NetworkNode.objects.filter(pk=retail.pk))
+        self.assert_summary_consistent()
+        # Удаление поставщика переводит покупателей в группу без поставщика
+        retail.delete()
+        self.assert_summary_consistent()
+
+    def test_debt_stats_delete_supplier_with_buyers(self):
+        """ Тест сводной задолженности при удалении поставщика вместе с покупателем."""
+
+        retail = NetworkNode.objects.create(
+            **{**self.reseller_data, "type": "retail"}, debt=100
+        )
+        NetworkNode.objects.create(
+            **{**self.reseller_data, "title": "Mini"}, supplier=retail, debt=40
+        )
+        # Поставщик создан позже покупателя, поэтому его сигнал post_delete,
+        # отправляемый по убыванию первичного ключа, приходит первым и
+        # переносит группу поставщика до удаления покупателя
+        factory = NetworkNode.objects.create(**self.factory_data)
+        retail.supplier = factory
+        retail.save()
+        NetworkNode.objects.create(
+            **{**self.reseller_data, "title": "Kiosk"}, supplier=factory, debt=10
+        )
+        NetworkNode.objects.filter(pk__in=[factory.pk, retail.pk]).delete()
+        self.assert_summary_consistent()
+        self.assertFalse(DebtSummary.objects.filter(nodes__lt=0).exists())
+
+    def test_apply_deltas_in_key_order(self):
+        """ Тест обновления групп сводки в порядке ключей, общем для всех
+        транзакций."""
+
+        deltas = {
+            (DebtSummary.Dimension.TYPE, "retail"): [Decimal(1), 1],
+            (DebtSummary.Dimension.CITY, "Tula"): [Decimal(1), 1],
+            (DebtSummary.Dimension.COUNTRY, "Russia"): [Decimal(1), 1],
+        }
+        apply_deltas(deltas)
+        with CaptureQueriesContext(connection) as context:
+            apply_deltas(deltas)
+        keys = [
+            re.search(r"\"key\" = '([^']*)'", query["sql"]).group(1)
+            for query in context.captured_queries
+        ]
+        self.assertEqual(keys, ["Tula", "Russia", "retail"])
+
+    def run_clear_debt(self, queryset, path="/", data=None):
+        """Запускает действие админки и выполняет поставленную им задачу."""
+
+        request = RequestFactory().post(path, data or {})
+        request.user = User.objects.get(email=self.userdata["email"])
+        admin_site = NetworkNodeAdmin(NetworkNode, None)
+        admin_site.message_user = lambda *args, **kwargs: None
+        with self.captureOnCommitCallbacks(execute=True):
+            clear_debt(admin_site, request, queryset)
+        return DebtClearing.objects.latest("created_at")
+
+    def test_clear_debt_in_background(self):
+        """ Тест фонового списания задолженности порциями."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        sellers = [
+            NetworkNode.objects.create(
+                **{**self.reseller_data, "title": f"Shop {i}"}, supplier=factory, debt=10
+            )
+            for i in range(5)
+        ]
+        with self.settings(DEBT_UPDATE_CHUNK_SIZE=2):
+            clearing = self.run_clear_debt(
+                NetworkNode.objects.filter(pk__in=[s.pk for s in sellers[:4]])
+            )
+        self.assertEqual(clearing.status, DebtClearing.Status.DONE)
+        self.assertEqual((clearing.processed, clearing.total), (4, 4))
+        self.assertIsNotNone(clearing.finished_at)
+        self.assertEqual(
+            list(NetworkNode.objects.filter(debt__gt=0).values_list("pk", flat=True)),
+            [sellers[4].pk],
+        )
+        self.assert_summary_consistent()
+
+    def test_clear_debt_select_across(self):
+        """ Тест списания задолженности всех отфильтрованных в админке звеньев."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        shops = [
+            NetworkNode.objects.create(
+                **{**self.reseller_data, "title": title, "city": city},
+                supplier=factory,
+                debt=10,
+            )
+            for title, city in (("Shop 1", "Kazan"), ("Shop 2", "Tula"), ("Shop 3", "Kazan"))
+        ]
+        queryset = NetworkNode.objects.filter(city="Kazan", title__icontains="shop")
+        clearing = self.run_clear_debt(
+            queryset, "/?city=Kazan&q=shop", {"select_across": "1"}
+        )
+        self.assertEqual(clearing.status, DebtClearing.Status.DONE)
+        # Задаче передаются параметры фильтров и диапазон ключей, а не запрос
+        self.assertEqual(
+            list(NetworkNode.objects.filter(debt__gt=0).values_list("pk", flat=True)),
+            [shops[1].pk],
+        )
+
+    def test_clear_debt_enqueue_failure(self):
+        """ Тест отметки списания ошибкой, если задачу не удалось поставить."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        with mock.patch.object(
+            clear_debt_task, "delay", side_effect=OSError("broker is down")
+        ), self.assertLogs("network.admin", "ERROR"):
+            clearing = self.run_clear_debt(NetworkNode.objects.filter(pk=factory.pk))
+        self.assertEqual(clearing.status, DebtClearing.Status.FAILED)
+        self.assertIsNotNone(clearing.finished_at)
+
+    def test_debt_tasks(self):
+        """ Тест периодических задач начисления и погашения задолженности."""
+
+        factory = NetworkNode.objects.create(**self.factory_data)
+        sellers = NetworkNode.objects.bulk_create(
+            NetworkNode(**{**self.reseller_data, "title": f"Shop {i}"}, supplier=factory)
+            for i in range(5)
+        )
+        with self.settings(DEBT_UPDATE_CHUNK_SIZE=2):
+            self.assertEqual(accrue_debt.delay().get(), 5)
+        for seller in NetworkNode.objects.filter(pk__in=[s.pk for s in sellers]):
+            self.assertTrue(5 <= seller.debt <= 500)
+        factory.refresh_from_db()
+        self.assertEqual(factory.debt, 0)
+        # Погашение больше любой начисленной задолженности обнуляет её
+        with self.settings(DEBT_REPAYMENT_RANGE=(500, 500)):
+            self.assertEqual(repay_debt.delay().get(), 5)
+        self.assertFalse(NetworkNode.objects.filter(debt__gt=0).exists())
+
+
+class NetworkNodeQueryCountTestCase(AuthenticatedAPITestCase):
+    """ Тесты числа SQL-запросов эндпоинтов звеньев сети."""
+
+    def setUp(self):
+        """ Создаём пользователя и авторизуемся."""
+
+        super().setUp()
+        self.products = Product.objects.bulk_create(
+            Product(title=f"Product {i}") for i in range(3)
+        )
+        self.factory = NetworkNode.objects.create(
+            title="Factory", email="factory@factory.ru"
+        )
+        # Пользователь попадает в кеш аутентификации, и далее считаются
+        # только запросы самих эндпоинтов
+        self.client.get(reverse("network:network_stats"))
+
+    def create_nodes(self, count):
+        """ Массово создаёт звенья сети с поставщиком и продуктами."""
+
+        nodes = NetworkNode.objects.bulk_create(
+            NetworkNode(
+                title=f"Node {i:05d}",
+                email="node@node.ru",
+                type="retail",
+                supplier=self.factory,
+            )
+            for i in range(count)
+        )
+        links = NetworkNode.products.through
+        links.objects.bulk_create(
+            links(networknode_id=node.id, product_id=product.id)
+            for node in nodes
+            for product in self.products
+        )
+
+    def count_list_queries(self):
+        """ Возвращает число запросов при получении страницы списка."""
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse("network:network_list"), {"page_size": 500}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context)
+
+    def test_list_query_count_is_constant(self):
+        """ Тест неизменности числа запросов списка при росте числа звеньев."""
+
+        self.create_nodes(10)
+        small = self.count_list_queries()
+        NetworkNode.objects.exclude(pk=self.factory.pk).delete()
+        self.create_nodes(10_000)
+        large = self.count_list_queries()
+        # Звенья сети и продукты
+        self.assertEqual(small, 2)
+        self.assertEqual(small, large)
+
+    def test_retrieve_query_count(self):
+        """ Тест числа запросов при получении одного звена сети."""
+
+        self.create_nodes(1)
+        node = NetworkNode.objects.get(title="Node 00000")
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("network:network_retrieve", kwargs={"pk": node.pk})
+            )
+        self.assertEqual(len(response.json()["products"]), 3)
+
+    def test_list_sparse_fields_queries(self):
+        """ Тест запросов списка с выборочными полями и раскрытием связей."""
+
+        self.create_nodes(10)
+        url = reverse("network:network_list")
+        # Без продуктов их подгрузка не выполняется, лишние столбцы не читаются
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {"fields": "id,title"})
+        self.assertEqual(len(context), 1)
+        self.assertNotIn('"email"', context.captured_queries[-1]["sql"])
+        self.assertEqual(set(response.json()["results"][0]), {"id", "title"})
+        # Раскрытый поставщик присоединяется к запросу звеньев
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {"expand": "supplier,products"})
+        node = response.json()["results"][1]
+        self.assertEqual(node["supplier"]["title"], "Factory")
+        self.assertEqual(len(node["products"]), 3)
+
+    def count_changelist_queries(self, params=None):
+        """ Возвращает число запросов страницы списка звеньев в админке."""
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse("admin:network_networknode_changelist"), params or {}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context), response
+
+    def test_admin_changelist_query_count_is_constant(self):
+        """ Тест числа запросов и фильтров списка звеньев в админке."""
+
+        self.client.force_login(
+            User.objects.create(
+                email="admin@admin.ru", is_active=True, is_staff=True, is_superuser=True
+            )
+        )
+        self.create_nodes(5)
+        small, _ = self.count_changelist_queries()
+        NetworkNode.objects.exclude(pk=self.factory.pk).delete()
+        self.create_nodes(100)
+        large, response = self.count_changelist_queries()
+        self.assertEqual(small, large)
+        # Поставщики не выводятся вариантами фильтра
+        self.assertNotContains(response, "?supplier__id__exact=")
+        self.assertContains(response, 'name="supplier"')
+        _, response = self.count_changelist_queries({"supplier": "Factory"})
+        self.assertEqual(response.context["cl"].result_count, 100)
+        _, response = self.count_changelist_queries({"supplier": self.factory.pk})
+        self.assertEqual(response.context["cl"].result_count, 100)
+        _, response = self.count_changelist_queries({"city": "Nowhere"})
+        self.assertEqual(response.context["cl"].result_count, 0)
+
+
+@skipUnless(
+    connection.vendor == "postgresql", "Планы запросов проверяются на PostgreSQL"
+)
+class NetworkNodeFilterIndexTestCase(APITestCase):
+    """ Тесты использования индексов фильтрами списка звеньев на PostgreSQL."""
+
+    def setUp(self):
+        """ Создаём звенья сети и отключаем последовательное чтение таблиц."""
+
+        product = Product.objects.create(title="Phone")
+        factory = NetworkNode.objects.create(title="Factory", email="f@f.ru")
+        factory.products.add(product)
+        self.product = product
+        self.factory = factory
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assert_uses_index(self, params, index):
+        """ Проверяет, что план запроса списка с фильтрами использует индекс."""
+
+        filterset = NetworkNodeFilter(params, queryset=NetworkNode.objects.all())
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        self.assertIn(index, filterset.qs.explain())
+
+    def test_filters_use_indexes(self):
+        """ Тест использования индексов каждым фильтром."""
+
+        cases = [
+            ({"type": "retail"}, "network_node_type_place_idx"),
+            ({"country": "rus"}, "network_node_ucountry_trgm_idx"),
+            ({"city": "Moscow"}, "network_node_city_idx"),
+            ({"supplier": self.factory.pk}, "network_networknode_supplier_id"),
+            ({"debt_min": 100}, "network_node_debt_idx"),
+            ({"time_after": "2020-01-01T00:00:00Z"}, "network_node_time_idx"),
+            ({"product": self.product.pk}, "network_node_products_product_node_idx"),
+        ]
+        for params, index in cases:
+            with self.subTest(params=params):
+                self.assert_uses_index(params, index)
+
+
+class NetworkNodeHierarchyTestCase(AuthenticatedAPITestCase):
+    """ Тесты материализованной иерархии поставщиков."""
+
+    def setUp(self):
+        """ Создаём цепочку завод -> розничная сеть -> ИП и авторизуемся."""
+
+        super().setUp()
+        self.factory = NetworkNode.objects.create(title="Factory", email="f@f.ru")
+        self.retail = NetworkNode.objects.create(
+            title="Retail", email="r@r.ru", type="retail", supplier=self.factory
+        )
+        self.seller = NetworkNode.objects.create(
+            title="Seller", email="s@s.ru", type="seller", supplier=self.retail
+        )
+
+    def titles(self, name, node):
+        """ Возвращает названия звеньев из ответа эндпоинта иерархии."""
+
+        response = self.client.get(reverse(name, kwargs={"pk": node.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        if isinstance(data, dict):
+            data = data["results"]
+        return [item["title"] for item in data]
+
+    def test_paths_on_create(self):
+        """ Тест построения путей при создании звеньев."""
+
+        self.seller.refresh_from_db()
+        self.assertEqual(
+            self.seller.path, f"/{self.factory.pk}/{self.retail.pk}/{self.seller.pk}/"
+        )
+        self.assertEqual(self.seller.level, 2)
+
+    def test_upstream_and_downstream(self):
+        """ Тест эндпоинтов вышестоящих и нижестоящих звеньев."""
+
+        self.assertEqual(
+            self.titles("network:network_upstream", self.seller), ["Factory", "Retail"]
+        )
+        self.assertEqual(
+            self.titles("network:network_downstream", self.factory),
+            ["Retail", "Seller"],
+        )
+        self.assertEqual(self.titles("network:network_upstream", self.factory), [])
+
+    def test_upstream_and_downstream_sparse_fields(self):
+        """ Тест выборочных полей и раскрытия связей эндпоинтов иерархии."""
+
+        for name, node in (
+            ("network:network_upstream", self.seller),
+            ("network:network_downstream", self.factory),
+        ):
+            for params in (
+                {"fields": "id,title"},
+                {"fields": "title,supplier", "expand": "supplier"},
+            ):
+                with self.subTest(name=name, **params):
+                    with CaptureQueriesContext(connection) as context:
+                        response = self.client.get(
+                            reverse(name, kwargs={"pk": node.pk}), params
+                        )
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    queries = [query["sql"] for query in context.captured_queries]
+                    # Продукты не подгружаются, лишние столбцы звеньев не читаются
+                    self.assertFalse(any("products" in sql for sql in queries))
+                    self.assertNotIn('"network_networknode"."email"', queries[-1])
+                    # Поставщик присоединяется, только если он раскрыт
+                    self.assertEqual("JOIN" in queries[-1], "expand" in params)
+
+    def test_reparent_and_delete(self):
+        """ Тест перестройки поддерева при смене поставщика и удалении звена."""
+
+        other = NetworkNode.objects.create(title="Other", email="o@o.ru")
+        self.retail.supplier = other
+        self.retail.save()
+        self.assertEqual(
+            self.titles("network:network_upstream", self.seller), ["Other", "Retail"]
+        )
+        self.assertEqual(self.titles("network:network_downstream", self.factory), [])
+        self.retail.delete()
+        self.seller.refresh_from_db()
+        self.assertEqual(self.seller.path, f"/{self.seller.pk}/")
+        self.assertEqual(self.seller.level, 0)
+
+    def test_rebuild_paths(self):
+        """ Тест полного пересчёта иерархии после массовых изменений."""
 
-class ProductTestCase(APITestCase):
+        NetworkNode.objects.update(path="", level=0)
+        self.assertEqual(rebuild_paths(), 3)
+        self.seller.refresh_from_db()
+        self.assertEqual(
+            self.seller.get_ancestor_ids(), [self.factory.pk, self.retail.pk]
+        )
+
+    def test_supply_chain(self):
+        """ Тест получения цепочки поставщиков с глубиной."""
+
+        self.assertEqual(
+            get_supply_chain(self.seller.pk),
+            [(self.seller.pk, 0), (self.retail.pk, 1), (self.factory.pk, 2)],
+        )
+
+    def test_cycle_rejected_on_update(self):
+        """ Тест запрета замыкания цепочки поставок в цикл."""
+
+        response = self.client.patch(
+            reverse("network:network_update", kwargs={"pk": self.retail.pk}),
+            {"supplier": self.seller.pk},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            {
+                "non_field_errors": [
+                    "Поставщик не может находиться ниже звена в цепочке поставок."
+                ]
+            },
+            response.json(),
+        )
+        response = self.client.patch(
+            reverse("network:network_update", kwargs={"pk": self.retail.pk}),
+            {"supplier": self.retail.pk},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductTestCase(AuthenticatedAPITestCase):
     """ Тесты модели Product."""
 
     def setUp(self):
         """ Заполняем БД перед началом тестов."""
 
-        self.userdata = {
-            "email": "test@test.ru",
-            "password": "12345",
-        }
-        # создаём пользователя
-        user = User.objects.create(email=self.userdata.get("email"), is_active=True)
-        user.set_password(self.userdata.get("password"))
-        user.save()
-        # получаем токен
-        response = self.client.post(reverse("users:login"), self.userdata)
-        # добавляем токен к авторизации
-        self.client.credentials(
-            HTTP_AUTHORIZATION="Bearer " + response.json().get("access")
-        )
+        super().setUp()
         self.product = Product.objects.create(
             title="New product", model="New model of product"
         )
@@ -201,6 +1187,20 @@ class ProductTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # Проверяем, что общее количество продуктов в базе данных равно 1.
         self.assertEqual(Product.objects.all().count(), 1)
+        # Проверяем, что список отдаётся курсорными страницами.
+        self.assertEqual(len(response.json()["results"]), 1)
+        # Проверяем, что повторный запрос с ETag не передаёт данные заново.
+        response = self.client.get("/product/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_search_product(self):
+        """ Тест поиска продуктов по названию и модели."""
+
+        Product.objects.create(title="Phone", model="X100")
+        response = self.client.get("/product/", {"search": "x100"})
+        self.assertEqual(
+            [product["title"] for product in response.json()["results"]], ["Phone"]
+        )
 
     def retrieve_product(self):
         """ Тест на получение определенного продукта."""
@@ -247,3 +1247,672 @@ class ProductTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         # Проверяем, что общее количество продуктов в базе данных равно 0.
         self.assertEqual(Product.objects.all().count(), 0)
+
+
+class WireFormatTestCase(APITestCase):
+    """ Тесты форматов ответа и сжатия."""
+
+    def setUp(self):
+        """ Создаём продукты и авторизуемся."""
+
+        cache.clear()
+
+        user = User.objects.create(email="test@test.ru", is_active=True)
+        self.client.force_authenticate(user)
+        Product.objects.bulk_create(
+            Product(title=f"Product {i:03d}", model="Model", release_date="2024-01-01")
+            for i in range(100)
+        )
+
+    def test_orjson_renderer_matches_json_renderer(self):
+        """ Тест совпадения вывода orjson со стандартным JSON-рендерером."""
+
+        data = {
+            "debt": Decimal("1234.50"),
+            "time": datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=ZoneInfo("Europe/Moscow")),
+            "date": date(2024, 1, 2),
+            "message": gettext_lazy("Обязательное поле."),
+            "text": "строка с разделителем",
+            "items": [1, 2.5, None, True],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_msgpack(self):
+        """ Тест запросов и ответов в формате MessagePack."""
+
+        response = self.client.post(
+            "/product/",
+            {"title": "Packed", "model": "M"},
+            format="msgpack",
+            HTTP_ACCEPT="application/msgpack",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(data["title"], "Packed")
+        response = self.client.get("/product/", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(
+            msgpack.unpackb(response.content)["results"][1]["release_date"],
+            "2024-01-01",
+        )
+
+    def test_compression(self):
+        """ Тест сжатия больших ответов brotli и gzip."""
+
+        response = self.client.get("/product/", {"page_size": 100})
+        self.assertFalse(response.has_header("Content-Encoding"))
+        plain = response.content
+        response = self.client.get(
+            "/product/", {"page_size": 100}, HTTP_ACCEPT_ENCODING="gzip, br"
+        )
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), plain)
+        self.assertTrue(response["ETag"].startswith("W/"))
+        response = self.client.get(
+            "/product/", {"page_size": 100}, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain)
+        # Небольшие ответы не сжимаются
+        response = self.client.get(
+            "/product/", {"page_size": 1}, HTTP_ACCEPT_ENCODING="br"
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_streaming_compression(self):
+        """ Тест сжатия потоковой выгрузки."""
+
+        NetworkNode.objects.bulk_create(
+            NetworkNode(title=f"Node {i:04d}", email="node@node.ru") for i in range(500)
+        )
+        url = reverse("network:network_export")
+        plain = b"".join(self.client.get(url).streaming_content)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        content = b"".join(response.streaming_content)
+        self.assertEqual(brotli.decompress(content), plain)
+        self.assertLess(len(content), len(plain) // 5)
+
+
+@override_settings(
+    REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"network_read": "2/m"},
+    }
+)
+class ThrottlingTestCase(APITestCase):
+    """ Тесты ограничения частоты и числа одновременных запросов."""
+
+    def setUp(self):
+        """ Сбрасываем счётчики и авторизуемся."""
+
+        cache.clear()
+        local_limits.clear()
+
+        self.user = User.objects.create(email="test@test.ru", is_active=True)
+        self.other = User.objects.create(email="other@test.ru", is_active=True)
+        self.client.force_authenticate(self.user)
+        NetworkNode.objects.create(title="Node", email="node@node.ru")
+
+    def assert_throttled(self, response, status_code, retry_after):
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response["Retry-After"], retry_after)
+
+    def test_token_bucket(self):
+        """ Тест ограничения частоты запросов пользователя к эндпоинту."""
+
+        for _ in range(2):
+            self.assertEqual(self.client.get("/product/").status_code, status.HTTP_200_OK)
+        self.assert_throttled(
+            self.client.get("/product/"), status.HTTP_429_TOO_MANY_REQUESTS, "30"
+        )
+        # Запись, другие эндпоинты и другие пользователи ограничиваются отдельно
+        response = self.client.post("/product/", {"title": "New"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(reverse("network:network_list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get("/product/").status_code, status.HTTP_200_OK)
+
+    @override_settings(THROTTLE_REDIS_URL="redis://127.0.0.1:1/0")
+    def test_redis_unavailable(self):
+        """ Тест ограничения в памяти процесса при недоступном Redis."""
+
+        with self.assertLogs("network.throttling", "WARNING"):
+            for _ in range(2):
+                response = self.client.get("/product/")
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assert_throttled(
+                self.client.get("/product/"), status.HTTP_429_TOO_MANY_REQUESTS, "30"
+            )
+        # Места, занятые в памяти процесса, там же и освобождаются
+        self.assertEqual(local_limits.slots, {})
+
+    def test_local_limits_eviction(self):
+        """ Тест удаления наполнившихся корзин и освобождённых мест из памяти."""
+
+        limits = LocalLimits()
+        limits.prune_interval = 0
+        self.assertEqual(limits.take_token("idle", 1, 1000), (True, 0.0))
+        self.assertEqual(limits.acquire_slot(["global", "user"], [2, 1], "a"), SLOT_ACQUIRED)
+        self.assertEqual(limits.acquire_slot(["global", "other"], [2, 1], "b"), SLOT_ACQUIRED)
+        limits.release_slot(["global", "user"], "a")
+        self.assertEqual(set(limits.slots), {"global", "other"})
+        time.sleep(0.01)
+        # Корзина наполнилась за время простоя и удаляется
+        limits.take_token("active", 1, 1)
+        self.assertEqual(set(limits.buckets), {"active"})
+        # Брошенные места удаляются по тайм-ауту
+        with self.settings(CONCURRENCY_SLOT_TIMEOUT=0):
+            limits.take_token("active", 1, 1)
+        self.assertEqual(limits.slots, {})
+
+    @override_settings(
+        REST_FRAMEWORK=settings.REST_FRAMEWORK,
+        MAX_CONCURRENT_REQUESTS=2,
+        MAX_CONCURRENT_REQUESTS_PER_USER=1,
+    )
+    def test_concurrency_limits(self):
+        """ Тест ограничения числа одновременных запросов."""
+
+        url = reverse("network:network_stats")
+        # Завершённые запросы освобождают место
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        # Потоковая выгрузка занимает место, пока не будет отправлена
+        export = self.client.get(reverse("network:network_export"))
+        self.assert_throttled(
+            self.client.get(url), status.HTTP_429_TOO_MANY_REQUESTS, "1"
+        )
+        self.client.force_authenticate(self.other)
+        other_export = self.client.get(reverse("network:network_export"))
+        self.assert_throttled(
+            self.client.get(url), status.HTTP_503_SERVICE_UNAVAILABLE, "1"
+        )
+        b"".join(other_export.streaming_content)
+        b"".join(export.streaming_content)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+
+class AsyncViewsTestCase(AuthenticatedAPITestCase):
+    """ Тесты асинхронных контроллеров чтения."""
+
+    def setUp(self):
+        """ Создаём звенья сети, продукты и получаем токен."""
+
+        super().setUp()
+        self.headers = {"Authorization": self.token}
+
+        products = Product.objects.bulk_create(
+            Product(title=f"Product {i}", model="Model", release_date="2024-01-01")
+            for i in range(3)
+        )
+        factory = NetworkNode.objects.create(title="Factory", email="f@f.ru")
+        factory.products.set(products[:2])
+        for i in range(3):
+            node = NetworkNode.objects.create(
+                title=f"Node {i}", email="n@n.ru", supplier=factory, type="retail"
+            )
+            node.products.set(products[i:])
+        self.node = node
+        self.product = products[0]
+
+    def aget(self, url, data=None, headers=None):
+        async def request():
+            return await self.async_client.get(
+                url, data, headers={**self.headers, **(headers or {})}
+            )
+
+        return async_to_sync(request)()
+
+    def assert_same(self, sync_url, async_url, data=None):
+        expected = self.client.get(sync_url, data)
+        response = self.aget(async_url, data)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_views_are_async(self):
+        """ Тест регистрации контроллеров как асинхронных."""
+
+        for url in (
+            reverse("network:async_network_list"),
+            reverse("network:async_network_retrieve", args=[self.node.pk]),
+            reverse("network:async_product_list"),
+            reverse("network:async_product_detail", args=[self.product.pk]),
+        ):
+            self.assertTrue(iscoroutinefunction(resolve(url).func))
+
+    def test_node_list(self):
+        """ Тест совпадения асинхронного списка звеньев с синхронным."""
+
+        sync_url = reverse("network:network_list")
+        async_url = reverse("network:async_network_list")
+        for data in (
+            {"page_size": 2},
+            {"type": "retail", "fields": "id,title,products"},
+            {"expand": "supplier,products"},
+            {"search": "Node"},
+        ):
+            cache.clear()
+            expected = self.client.get(sync_url, data).json()
+            response = self.aget(async_url, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()["results"], expected["results"])
+        # Страница и продукты читаются асинхронным ORM, а не синхронной
+        # пагинацией DRF и предзагрузкой в потоке
+        cache.clear()
+        with mock.patch.object(
+            NetworkNodeCursorPagination, "paginate_queryset", side_effect=AssertionError
+        ), mock.patch(
+            "network.paginators.prefetch_related_objects", side_effect=AssertionError
+        ):
+            response = self.aget(async_url, {"expand": "supplier,products"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"][1]["products"][0]["title"], "Product 0")
+        # Переход по курсору асинхронного ответа
+        response = self.aget(async_url, {"page_size": 2})
+        next_page = self.aget(response.json()["next"])
+        self.assertEqual(
+            [node["title"] for node in next_page.json()["results"]],
+            ["Node 1", "Node 2"],
+        )
+
+    def test_node_retrieve(self):
+        """ Тест асинхронного просмотра звена сети."""
+
+        self.assert_same(
+            reverse("network:network_retrieve", args=[self.node.pk]),
+            reverse("network:async_network_retrieve", args=[self.node.pk]),
+            {"expand": "supplier,products"},
+        )
+        response = self.aget(reverse("network:async_network_retrieve", args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_products(self):
+        """ Тест асинхронных списка и карточки продуктов."""
+
+        response = self.assert_same("/product/", reverse("network:async_product_list"))
+        self.assertEqual(len(response.json()["results"]), 3)
+        url = reverse("network:async_product_detail", args=[self.product.pk])
+        response = self.assert_same(f"/product/{self.product.pk}/", url)
+        response = self.aget(url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_authentication(self):
+        """ Тест аутентификации и прав доступа асинхронных контроллеров."""
+
+        url = reverse("network:async_product_list")
+        token = self.headers.pop("Authorization")
+        self.assertEqual(self.aget(url).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.aget(url, headers={"Authorization": "Bearer invalid"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(
+            self.aget(url, headers={"Authorization": token}).status_code,
+            status.HTTP_200_OK,
+        )
+        User.objects.filter(email=self.userdata["email"]).update(is_active=False)
+        cache.clear()
+        response = self.aget(url, headers={"Authorization": token})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class SeedingTestCase(APITestCase):
+    """ Тесты генератора синтетической сети и набора замеров API."""
+
+    def test_seed_network(self):
+        """ Тест генерации сети заданного размера и её удаления."""
+
+        output = StringIO()
+        arguments = ("--factories=2", "--depth=3", "--nodes=60", "--products=5")
+        call_command("seed_network", *arguments, stdout=output)
+        nodes = NetworkNode.objects.filter(title__startswith="Seed ")
+        self.assertEqual(nodes.count(), 60)
+        self.assertEqual(
+            sorted(set(nodes.values_list("level", flat=True))), [0, 1, 2, 3]
+        )
+        self.assertFalse(nodes.filter(level=0).exclude(type="factory").exists())
+        self.assertFalse(nodes.filter(level=0, debt__gt=0).exists())
+        self.assertEqual(
+            nodes.filter(products__isnull=True).count(), 0, "Звенья без продуктов"
+        )
+        # Одинаковые параметры дают одинаковую сеть
+        first = [file.read() for file in generate(SeedOptions(nodes=60, seed=1))]
+        second = [file.read() for file in generate(SeedOptions(nodes=60, seed=1))]
+        self.assertEqual(first, second)
+
+        # Повторная генерация с --clear заменяет прежнюю сеть
+        call_command("seed_network", *arguments, "--clear", stdout=output)
+        self.assertEqual(nodes.count(), 60)
+        self.assertEqual(clear_seeded("Seed"), 60)
+        self.assertFalse(nodes.exists())
+        self.assertFalse(Product.objects.filter(title__startswith="Seed ").exists())
+
+    def test_benchmark_api(self):
+        """ Тест замера всех эндпоинтов на маленькой сети."""
+
+        self.assertEqual(uncovered_url_names(), [])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "benchmark.json")
+            call_command(
+                "benchmark_api",
+                "--sizes=30",
+                "--requests=1",
+                "--warmup=0",
+                f"--output={path}",
+                stdout=StringIO(),
+            )
+            with open(path, encoding="utf-8") as file:
+                report = json.load(file)
+        scenarios = report["results"]["30"]["scenarios"]
+        self.assertIn("GET network:network_list", scenarios)
+        self.assertIn("DELETE users:user-detail", scenarios)
+        for name, result in scenarios.items():
+            self.assertLess(result["status"], 400, name)
+            self.assertIn("p95", result["latency_ms"])
+        self.assertFalse(NetworkNode.objects.filter(title__startswith="Benchmark ").exists())
+
+
+class ServerTimingTestCase(AuthenticatedAPITestCase):
+    """ Тесты замера времени этапов обработки запроса."""
+
+    def setUp(self):
+        """ Создаём звенья сети и получаем токен."""
+
+        super().setUp()
+        factory = NetworkNode.objects.create(title="Factory", email="f@f.ru")
+        factory.products.add(Product.objects.create(title="Phone"))
+        NetworkNode.objects.create(title="Shop", email="s@s.ru", supplier=factory)
+
+    @staticmethod
+    def parse(header):
+        metrics = {}
+        for metric in header.split(", "):
+            name, *params = metric.split(";")
+            metrics[name] = dict(param.split("=", 1) for param in params)
+        return metrics
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_server_timing(self):
+        """ Тест заголовка Server-Timing и строки журнала."""
+
+        url = reverse("network:network_list")
+        with self.assertLogs("config.timing", "INFO") as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {"expand": "products"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        metrics = self.parse(response["Server-Timing"])
+        self.assertEqual(
+            list(metrics), ["db", "auth", "serialize", "render", "total"]
+        )
+        self.assertEqual(metrics["db"]["desc"], f'"{len(queries)} queries"')
+        self.assertGreater(float(metrics["serialize"]["dur"]), 0)
+        self.assertGreater(float(metrics["render"]["dur"]), 0)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "network:network_list")
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["queries"], len(queries))
+        self.assertGreaterEqual(record["total_ms"], record["db_ms"])
+
+        # Быстрый путь списка и асинхронный контроллер тоже замеряются
+        async def request():
+            return await self.async_client.get(
+                reverse("network:async_network_list"),
+                headers={"Authorization": self.token},
+            )
+
+        cache.clear()
+        with self.assertLogs("config.timing", "INFO"):
+            response = self.client.get(url)
+            metrics = self.parse(response["Server-Timing"])
+            self.assertGreater(float(metrics["serialize"]["dur"]), 0)
+            response = async_to_sync(request)()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        metrics = self.parse(response["Server-Timing"])
+        self.assertNotEqual(metrics["db"]["desc"], '"0 queries"')
+        self.assertGreater(float(metrics["auth"]["dur"]), 0)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        """ Тест запроса вне выборки."""
+
+        response = self.client.get(reverse("network:network_list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header("Server-Timing"))
+
+
+class MetricsTestCase(AuthenticatedAPITestCase):
+    """ Тесты метрик Prometheus."""
+
+    def setUp(self):
+        """ Создаём пользователя и получаем токен."""
+
+        super().setUp()
+        NetworkNode.objects.create(title="Factory", email="f@f.ru")
+
+    @staticmethod
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_metrics(self):
+        """ Тест метрик запросов, кеша и отказов в аутентификации."""
+
+        view = "network:network_list"
+        before = {
+            "count": self.sample(
+                "http_request_duration_seconds_count", view=view, method="GET"
+            ),
+            "queries": self.sample("http_request_db_queries_sum", view=view),
+            "sampled": self.sample("http_request_db_queries_count", view=view),
+            "hit": self.sample("cache_requests_total", cache="response", result="hit"),
+            "auth": self.sample("auth_failures_total", view=view),
+        }
+        url = reverse("network:network_list")
+        with override_settings(SERVER_TIMING_SAMPLE_RATE=1):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+        self.client.get(url)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer invalid")
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        self.assertEqual(
+            self.sample("http_request_duration_seconds_count", view=view, method="GET")
+            - before["count"],
+            3,
+        )
+        self.assertGreaterEqual(
+            self.sample("http_request_db_queries_sum", view=view) - before["queries"],
+            len(queries),
+        )
+        # SQL-запросы учитываются только у запроса из выборки
+        self.assertEqual(
+            self.sample("http_request_db_queries_count", view=view) - before["sampled"],
+            1,
+        )
+        self.assertEqual(
+            self.sample("cache_requests_total", cache="response", result="hit")
+            - before["hit"],
+            1,
+        )
+        self.assertEqual(self.sample("auth_failures_total", view=view) - before["auth"], 1)
+
+        with override_settings(METRICS_TOKEN=""):
+            response = self.client.get(reverse("metrics"))
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get(reverse("metrics"))
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            self.client.credentials(HTTP_AUTHORIZATION="Bearer secret")
+            response = self.client.get(reverse("metrics"))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{le="0.005",method="GET",view="{view}"}}',
+            response.content.decode(),
+        )
+
+    def test_process_directories(self):
+        """ Тест суммирования метрик процессов из каталогов разных контейнеров."""
+
+        key = mmap_key("jobs", "jobs_total", ["queue"], ["default"], "Задачи.")
+        with tempfile.TemporaryDirectory() as app, tempfile.TemporaryDirectory() as worker:
+            # Номера процессов в разных контейнерах совпадают
+            for path, value in ((app, 2), (worker, 3)):
+                values = MmapedDict(os.path.join(path, "counter_7.db"))
+                values.write_value(key, value, 0)
+                values.close()
+            with mock.patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": app}):
+                with override_settings(METRICS_PROCESS_DIRS=[worker]):
+                    registry = get_registry()
+            self.assertEqual(
+                registry.get_sample_value("jobs_total", {"queue": "default"}), 5
+            )
+
+    def test_celery_metrics(self):
+        """ Тест времени выполнения и ожидания в очереди задач Celery."""
+
+        task = "network.tasks.accrue_debt"
+        count = self.sample(
+            "celery_task_duration_seconds_count", task=task, state="SUCCESS"
+        )
+        lag = self.sample("celery_task_queue_lag_seconds_sum", task=task)
+        accrue_debt.apply(headers={"published_at": time.time() - 5})
+        self.assertEqual(
+            self.sample("celery_task_duration_seconds_count", task=task, state="SUCCESS")
+            - count,
+            1,
+        )
+        self.assertGreaterEqual(
+            self.sample("celery_task_queue_lag_seconds_sum", task=task) - lag, 5
+        )
+
+
+class SlowQueryTestCase(AuthenticatedAPITestCase):
+    """ Тесты регистратора медленных запросов."""
+
+    def setUp(self):
+        """ Создаём звенья сети и получаем токен."""
+
+        super().setUp()
+        factory = NetworkNode.objects.create(
+            title="Factory", email="f@f.ru", country="Russia"
+        )
+        factory.products.add(Product.objects.create(title="Phone"))
+
+    def test_fingerprint(self):
+        """ Тест объединения запросов, отличающихся только значениями."""
+
+        self.assertEqual(
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s) LIMIT 21'),
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s) LIMIT 1'),
+        )
+        self.assertEqual(
+            normalize('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO "t" ("a", "b") VALUES (?)',
+        )
+        self.assertNotEqual(
+            fingerprint('SELECT "a" FROM "t"'), fingerprint('SELECT "b" FROM "t"')
+        )
+
+    def test_record_slow_queries(self):
+        """ Тест записи медленных запросов с источником и планом."""
+
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=1e-6, SLOW_QUERY_EXPLAIN_RATE=1):
+            response = self.client.get(
+                reverse("network:network_list"),
+                {"country": "russ", "expand": "products"},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        recorded = SlowQuery.objects.filter(source="view network:network_list")
+        self.assertTrue(recorded.exists())
+        self.assertFalse(recorded.filter(plan="").filter(sql__startswith="SELECT").exists())
+        # Запросы самого регистратора не записываются
+        self.assertFalse(SlowQuery.objects.filter(sql__contains="network_slowquery").exists())
+
+        output = StringIO()
+        call_command("slow_queries", "--plans", stdout=output)
+        self.assertIn("view network:network_list", output.getvalue())
+        self.assertIn('"network_networknode"."title"', output.getvalue())
+        call_command("slow_queries", "--source=nowhere", stdout=output)
+        self.assertIn("Медленных запросов нет.", output.getvalue())
+        call_command("slow_queries", "--prune=0", stdout=output)
+        self.assertFalse(SlowQuery.objects.exists())
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1, SLOW_QUERY_THRESHOLD_MS=1e-6)
+    def test_export_request_context(self):
+        """ Тест замера и записи запросов, выполняемых при чтении потоковой
+        выгрузки после выхода из middleware."""
+
+        with self.assertLogs("config.timing", "INFO") as logs:
+            response = self.client.get(reverse("network:network_export"))
+            self.assertFalse(response.has_header("Server-Timing"))
+            self.assertEqual(logs.records, [])
+            with CaptureQueriesContext(connection) as queries:
+                content = b"".join(response.streaming_content)
+        self.assertIn(b"Factory", content)
+        export_queries = [
+            query for query in queries if '"network_networknode"' in query["sql"]
+        ]
+        self.assertTrue(export_queries)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreaterEqual(record["queries"], len(export_queries))
+        self.assertTrue(
+            SlowQuery.objects.filter(
+                source="view network:network_export",
+                sql__contains='FROM "network_networknode"',
+            ).exists()
+        )
+
+    def test_plan_selection(self):
+        """ Тест отбора запросов для плана: чтения без блокировок, включая CTE."""
+
+        with override_settings(SLOW_QUERY_EXPLAIN_RATE=1):
+            self.assertTrue(needs_plan(SUPPLY_CHAIN_SQL, many=False))
+            self.assertTrue(needs_plan('SELECT "id" FROM "t"', many=False))
+            self.assertFalse(
+                needs_plan('SELECT "id" FROM "t" LIMIT 10 FOR UPDATE SKIP LOCKED', many=False)
+            )
+            self.assertFalse(needs_plan('SELECT "id" FROM "t" FOR NO KEY UPDATE', many=False))
+            self.assertFalse(needs_plan('SELECT "id" FROM "t" FOR SHARE', many=False))
+            self.assertFalse(needs_plan('UPDATE "t" SET "a" = %s', many=False))
+            self.assertFalse(
+                needs_plan(
+                    'WITH "d" AS (DELETE FROM "t" RETURNING "id") SELECT * FROM "d"',
+                    many=False,
+                )
+            )
+            self.assertFalse(needs_plan('SELECT "id" FROM "t"', many=True))
+
+    def test_plans_after_response(self):
+        """ Тест построения плана и записи после отправки ответа без учёта
+        в замере запроса."""
+
+        sql = (
+            "WITH RECURSIVE n (i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < %s) "
+            "SELECT i FROM n"
+        )
+
+        def view(request):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [3])
+            return HttpResponse()
+
+        middleware = SlowQueryMiddleware(view)
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=1e-6, SLOW_QUERY_EXPLAIN_RATE=1):
+            with request_timing() as timing:
+                with CaptureQueriesContext(connection) as queries:
+                    response = middleware(RequestFactory().get("/"))
+                # До закрытия ответа план не строится и ничего не записывается
+                self.assertEqual(len(queries), 1)
+                # Ответ закрывается после отправки клиенту, как это делает
+                # сервер; тестовая транзакция при этом не закрывается
+                request_finished.disconnect(close_old_connections)
+                try:
+                    response.close()
+                finally:
+                    request_finished.connect(close_old_connections)
+            self.assertEqual(timing.queries, 1)
+        plan = SlowQuery.objects.get(sql=sql).plan
+        self.assertTrue(plan)
+        self.assertNotIn("EXPLAIN failed", plan)
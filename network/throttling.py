@@ -0,0 +1,342 @@
+import logging
+import threading
+import time
+import uuid
+from functools import lru_cache, partial
+
+import redis
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework import status  # type: ignore
+from rest_framework.exceptions import APIException  # type: ignore
+from rest_framework.settings import api_settings  # type: ignore
+from rest_framework.throttling import SimpleRateThrottle  # type: ignore
+
+from config.middleware import StreamingContent
+
+logger = logging.getLogger(__name__)
+
+# Корзина токенов: пополняется со скоростью ARGV[2] токенов в секунду
+# до ARGV[1]; возвращает признак разрешения и время ожидания токена.
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(wait)}
+"""
+
+# Занимает место выполняемого запроса в общем (KEYS[1]) и пользовательском
+# (KEYS[2]) наборах; места старше ARGV[4] секунд считаются брошенными.
+ACQUIRE_SLOT_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local timeout = tonumber(ARGV[4])
+for i = 1, 2 do
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now - timeout)
+end
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 2
+end
+if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[2]) then
+    return 1
+end
+for i = 1, 2 do
+    redis.call('ZADD', KEYS[i], now, ARGV[3])
+    redis.call('EXPIRE', KEYS[i], timeout)
+end
+return 0
+"""
+
+SLOT_ACQUIRED, USER_LIMIT, GLOBAL_LIMIT = 0, 1, 2
+
+
+class LocalLimits:
+    """Корзины токенов и места запросов в памяти процесса.
+
+    Используются, когда Redis не настроен или недоступен: ограничения
+    продолжают действовать, но в пределах одного процесса. Как и ключи
+    в Redis, корзины удаляются после простоя, за который они наполняются
+    заново, а места — после ``CONCURRENCY_SLOT_TIMEOUT``.
+    """
+
+    # Как часто, в секундах, удаляются наполненные корзины и брошенные места
+    prune_interval = 60
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.slots = {}
+        self.pruned_at = time.monotonic()
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+            self.slots.clear()
+
+    def prune(self, now):
+        if now - self.pruned_at < self.prune_interval:
+            return
+        self.pruned_at = now
+        self.buckets = {
+            key: bucket for key, bucket in self.buckets.items() if bucket[2] > now
+        }
+        self.drop_stale_slots(list(self.slots), now)
+
+    def drop_stale_slots(self, keys, now):
+        """Удаляет места старше тайм-аута: они считаются брошенными, как в Redis."""
+
+        stale = now - settings.CONCURRENCY_SLOT_TIMEOUT
+        for key in keys:
+            members = self.slots.get(key)
+            if members is None:
+                continue
+            for member, acquired in list(members.items()):
+                if acquired < stale:
+                    del members[member]
+            if not members:
+                del self.slots[key]
+
+    def take_token(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            self.prune(now)
+            tokens, ts, _ = self.buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # Корзина без запросов наполнится к этому времени
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return (True, 0.0) if allowed else (False, (1 - tokens) / rate)
+
+    def acquire_slot(self, keys, limits, member):
+        now = time.monotonic()
+        with self.lock:
+            self.prune(now)
+            self.drop_stale_slots(keys, now)
+            for key, limit, result in zip(keys, limits, (GLOBAL_LIMIT, USER_LIMIT)):
+                if len(self.slots.get(key, ())) >= limit:
+                    return result
+            for key in keys:
+                self.slots.setdefault(key, {})[member] = now
+            return SLOT_ACQUIRED
+
+    def release_slot(self, keys, member):
+        with self.lock:
+            for key in keys:
+                members = self.slots.get(key)
+                if members is None:
+                    continue
+                members.pop(member, None)
+                if not members:
+                    del self.slots[key]
+
+
+local_limits = LocalLimits()
+
+
+@lru_cache(maxsize=None)
+def get_redis(url):
+    client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+    return (
+        client,
+        client.register_script(TOKEN_BUCKET_SCRIPT),
+        client.register_script(ACQUIRE_SLOT_SCRIPT),
+    )
+
+
+def with_fallback(remote, local):
+    """Выполняет ``remote`` в Redis, а при его отсутствии или ошибке —
+    ``local`` в памяти процесса."""
+
+    url = settings.THROTTLE_REDIS_URL
+    if url:
+        try:
+            return remote(*get_redis(url))
+        except redis.RedisError as error:
+            logger.warning("Redis для ограничения запросов недоступен: %s", error)
+    return local()
+
+
+def take_token(key, capacity, rate):
+    """Берёт токен из корзины ``key``; возвращает (разрешено, ожидание, с)."""
+
+    def remote(client, bucket, acquire):
+        allowed, wait = bucket(keys=[key], args=[capacity, rate])
+        return bool(allowed), float(wait)
+
+    return with_fallback(remote, lambda: local_limits.take_token(key, capacity, rate))
+
+
+def acquire_slot(keys, limits, member):
+    """Занимает место запроса; возвращает результат и признак того, что
+    место занято в памяти процесса, а не в Redis."""
+
+    def remote(client, bucket, acquire):
+        args = [*limits, member, settings.CONCURRENCY_SLOT_TIMEOUT]
+        return int(acquire(keys=keys, args=args)), False
+
+    return with_fallback(
+        remote, lambda: (local_limits.acquire_slot(keys, limits, member), True)
+    )
+
+
+def release_slot(keys, member, local):
+    """Освобождает место там, где оно было занято. Место в Redis, которое
+    не удалось освободить, удаляется через ``CONCURRENCY_SLOT_TIMEOUT``."""
+
+    if local:
+        local_limits.release_slot(keys, member)
+        return
+
+    def remote(client, bucket, acquire):
+        with client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.zrem(key, member)
+            pipe.execute()
+
+    with_fallback(remote, lambda: None)
+
+
+def get_ident(throttle, request):
+    if request.user and request.user.is_authenticated:
+        return request.user.pk
+    return throttle.get_ident(request)
+
+
+class ServiceOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Сервис перегружен, повторите запрос позже."
+    default_code = "service_overloaded"
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Ограничение частоты запросов корзиной токенов для каждого
+    пользователя и эндпоинта.
+
+    Скорость берётся из ``DEFAULT_THROTTLE_RATES`` по ``throttle_scope``
+    представления в формате DRF (``"20/s"``): ёмкость корзины равна числу
+    запросов, пополнение — числу запросов за период. Представления без
+    области или без скорости не ограничиваются.
+    """
+
+    cache_format = "throttle:%(scope)s:%(view)s:%(ident)s"
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, "throttle_scope", None)
+        self.rate = self.get_rate() if self.scope else None
+        if self.rate is None:
+            return True
+        capacity, duration = self.parse_rate(self.rate)
+        key = self.cache_format % {
+            "scope": self.scope,
+            "view": type(view).__name__,
+            "ident": get_ident(self, request),
+        }
+        allowed, self.wait_seconds = take_token(key, capacity, capacity / duration)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class ConcurrencyThrottle(SimpleRateThrottle):
+    """Ограничение числа одновременно выполняемых запросов.
+
+    Общий предел ``MAX_CONCURRENT_REQUESTS`` соответствует числу соединений
+    с БД, которые готовы обслуживать процессы приложения: при его достижении
+    запрос отклоняется с ``503``. Предел ``MAX_CONCURRENT_REQUESTS_PER_USER``
+    не даёт одному клиенту занять все соединения и возвращает ``429``.
+    Место освобождается :class:`ConcurrencySlotMiddleware` после отправки
+    ответа, в том числе потокового. Действует для представлений
+    с ``throttle_scope``.
+    """
+
+    global_key = "concurrency:global"
+    cache_format = "concurrency:user:%(ident)s"
+
+    def __init__(self):
+        pass
+
+    def allow_request(self, request, view):
+        if getattr(view, "throttle_scope", None) is None:
+            return True
+        keys = [
+            self.global_key,
+            self.cache_format % {"ident": get_ident(self, request)},
+        ]
+        limits = [
+            settings.MAX_CONCURRENT_REQUESTS,
+            settings.MAX_CONCURRENT_REQUESTS_PER_USER,
+        ]
+        member = uuid.uuid4().hex
+        result, local = acquire_slot(keys, limits, member)
+        if result == GLOBAL_LIMIT:
+            raise ServiceOverloaded(wait=settings.CONCURRENCY_RETRY_AFTER)
+        if result == USER_LIMIT:
+            return False
+        request._request.concurrency_slot = (keys, member, local)
+        return True
+
+    def wait(self):
+        return settings.CONCURRENCY_RETRY_AFTER
+
+
+class ConcurrencySlotMiddleware:
+    """Освобождает место запроса, занятое :class:`ConcurrencyThrottle`,
+    когда ответ отправлен клиенту. Работает и в синхронном,
+    и в асинхронном стеке обработки запроса."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.release(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.release(request, await self.get_response(request))
+
+    @staticmethod
+    def release(request, response):
+        slot = getattr(request, "concurrency_slot", None)
+        if slot is None:
+            return response
+        if response.streaming and not response.is_async:
+            response.streaming_content = StreamingContent(
+                response.streaming_content, on_close=partial(release_slot, *slot)
+            )
+        else:
+            release_slot(*slot)
+        return response
@@ -2,9 +2,16 @@ from django.urls import path
 from rest_framework.routers import DefaultRouter   # type: ignore
 
 from network.apps import NetworkConfig
-from network.views import (NetworkNodeCreateAPIView, NetworkNodeDestroyView,
-                           NetworkNodeListAPIView, NetworkNodeRetrieveView,
-                           NetworkNodeUpdateView, ProductViewSet)
+from network.async_views import (AsyncNetworkNodeListView,
+                                 AsyncNetworkNodeRetrieveView,
+                                 AsyncProductListView,
+                                 AsyncProductRetrieveView)
+from network.views import (NetworkNodeBulkView, NetworkNodeCreateAPIView,
+                           NetworkNodeDestroyView, NetworkNodeDownstreamView,
+                           NetworkNodeExportView, NetworkNodeListAPIView,
+                           NetworkNodeRetrieveView, NetworkNodeStatsView,
+                           NetworkNodeUpdateView, NetworkNodeUpstreamView,
+                           ProductViewSet)
 
 app_name = NetworkConfig.name
 
@@ -14,6 +21,9 @@ router.register(r"product", ProductViewSet, basename="product")
 urlpatterns = [
     path("network/list/", NetworkNodeListAPIView.as_view(), name="network_list"),
     path("network/create/", NetworkNodeCreateAPIView.as_view(), name="network_create"),
+    path("network/bulk/", NetworkNodeBulkView.as_view(), name="network_bulk"),
+    path("network/export/", NetworkNodeExportView.as_view(), name="network_export"),
+    path("network/stats/", NetworkNodeStatsView.as_view(), name="network_stats"),
     path(
         "network/retrieve/<int:pk>",
         NetworkNodeRetrieveView.as_view(),
@@ -29,4 +39,30 @@ urlpatterns = [
         NetworkNodeDestroyView.as_view(),
         name="network_delete",
     ),
+    path(
+        "network/<int:pk>/upstream/",
+        NetworkNodeUpstreamView.as_view(),
+        name="network_upstream",
+    ),
+    path(
+        "network/<int:pk>/downstream/",
+        NetworkNodeDownstreamView.as_view(),
+        name="network_downstream",
+    ),
+    path(
+        "async/network/list/",
+        AsyncNetworkNodeListView.as_view(),
+        name="async_network_list",
+    ),
+    path(
+        "async/network/retrieve/<int:pk>",
+        AsyncNetworkNodeRetrieveView.as_view(),
+        name="async_network_retrieve",
+    ),
+    path("async/product/", AsyncProductListView.as_view(), name="async_product_list"),
+    path(
+        "async/product/<int:pk>/",
+        AsyncProductRetrieveView.as_view(),
+        name="async_product_detail",
+    ),
 ] + router.urls
@@ -1,5 +1,7 @@
 from rest_framework.serializers import ValidationError
 
+from network.services import creates_supply_cycle
+
 
 class NetworkNodeValidator:
     """
@@ -20,3 +22,22 @@ class NetworkNodeValidator:
                 raise ValidationError(
                     "Задолженность перед поставщиком не может быть изменена через API."
                 )
+
+
+class SupplyChainCycleValidator:
+    """
+    Валидирует, что новый поставщик не находится ниже звена в цепочке
+    поставок, т.е. что цепочка не замыкается в цикл.
+    """
+
+    requires_context = True
+
+    def __call__(self, seller, serializer):
+        instance = serializer.instance
+        supplier = seller.get("supplier", None)
+        if instance is None or supplier is None:
+            return
+        if creates_supply_cycle(instance.pk, supplier.pk):
+            raise ValidationError(
+                "Поставщик не может находиться ниже звена в цепочке поставок."
+            )
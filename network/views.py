@@ -1,57 +1,236 @@
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend    # type: ignore
-from rest_framework import generics, viewsets
-
-from network.filter import NetworkNodeFilter
-from network.models import NetworkNode, Product
-from network.serializers import NetworkNodeSerializer, ProductSerializer
+from rest_framework import generics, status, viewsets
+from rest_framework.exceptions import ValidationError   # type: ignore
+from rest_framework.permissions import SAFE_METHODS   # type: ignore
+from rest_framework.response import Response   # type: ignore
+
+from config.timing import SerializationTimingMixin
+from network.cache import (NETWORK, PRODUCT, CachedResponseMixin,
+                           ConditionalResponseMixin)
+from network.export import EXPORT_CONTENT_TYPES, EXPORT_FORMATS, iter_export
+from network.fastpath import FastListMixin
+from network.fieldsets import NetworkNodeFieldsetMixin
+from network.filter import NetworkNodeFilter, RankedSearchFilter
+from network.models import (NODE_SEARCH_FIELDS, PRODUCT_SEARCH_FIELDS,
+                            DebtSummary, NetworkNode, Product)
+from network.paginators import (NetworkNodeCursorPagination,
+                                ProductCursorPagination)
+from network.serializers import (DebtSummarySerializer,
+                                 NetworkNodeBulkSerializer,
+                                 NetworkNodeSerializer, ProductSerializer)
 from users.permissions import IsActiveUser   # type: ignore
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(
+    ConditionalResponseMixin,
+    CachedResponseMixin,
+    FastListMixin,
+    SerializationTimingMixin,
+    viewsets.ModelViewSet,
+):
     """Контроллер для создания, редактирования и удаления продукта, а также
     просмотра всего списка продуктов и просмотра отдельного продукта."""
 
     serializer_class = ProductSerializer
     queryset = Product.objects.all()
     permission_classes = [IsActiveUser]
+    filter_backends = [RankedSearchFilter]
+    search_fields = PRODUCT_SEARCH_FIELDS
+    pagination_class = ProductCursorPagination
+    cache_scope = PRODUCT
+
+    @property
+    def throttle_scope(self):
+        if self.request.method in SAFE_METHODS:
+            return "network_read"
+        return "network_write"
 
 
 class NetworkNodeCreateAPIView(generics.CreateAPIView):
     """Контроллер создания цепочки сети."""
 
     serializer_class = NetworkNodeSerializer
+    queryset = NetworkNode.objects.with_relations()
     permission_classes = [IsActiveUser]
+    throttle_scope = "network_write"
+
+
+class NetworkNodeBulkView(generics.GenericAPIView):
+    """Контроллер пакетного создания (POST) и обновления (PATCH) звеньев сети.
 
+    Принимает список звеньев и записывает его одной транзакцией, ошибки
+    возвращаются списком по индексам элементов.
+    """
 
-class NetworkNodeListAPIView(generics.ListAPIView):
+    serializer_class = NetworkNodeBulkSerializer
+    permission_classes = [IsActiveUser]
+    throttle_scope = "network_write"
+    max_batch_size = 5000
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(
+            *args, many=True, max_length=self.max_batch_size, **kwargs
+        )
+
+    def get_response(self, nodes, status_code):
+        queryset = NetworkNode.objects.with_relations().filter(
+            pk__in=[node.pk for node in nodes]
+        )
+        return Response(
+            NetworkNodeSerializer(queryset, many=True).data, status=status_code
+        )
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.get_response(serializer.save(), status.HTTP_201_CREATED)
+
+    def patch(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        return self.get_response(serializer.save(), status.HTTP_200_OK)
+
+
+class NetworkNodeListAPIView(
+    NetworkNodeFieldsetMixin,
+    ConditionalResponseMixin,
+    CachedResponseMixin,
+    FastListMixin,
+    SerializationTimingMixin,
+    generics.ListAPIView,
+):
     """Контроллер просмотра списка всех цепочек сети."""
 
     serializer_class = NetworkNodeSerializer
-    queryset = NetworkNode.objects.all()
+    queryset = NetworkNode.objects.with_relations()
     permission_classes = [IsActiveUser]
-    filter_backends = [DjangoFilterBackend]
+    throttle_scope = "network_read"
+    filter_backends = [DjangoFilterBackend, RankedSearchFilter]
     filterset_class = NetworkNodeFilter
-
-
-class NetworkNodeRetrieveView(generics.RetrieveAPIView):
+    search_fields = NODE_SEARCH_FIELDS
+    pagination_class = NetworkNodeCursorPagination
+    cache_scope = NETWORK
+
+
+class NetworkNodeRetrieveView(
+    NetworkNodeFieldsetMixin,
+    ConditionalResponseMixin,
+    CachedResponseMixin,
+    SerializationTimingMixin,
+    generics.RetrieveAPIView,
+):
     """Контроллер просмотра одной отдельной цепочки сети."""
 
     serializer_class = NetworkNodeSerializer
-    queryset = NetworkNode.objects.all()
+    queryset = NetworkNode.objects.with_relations()
     permission_classes = [IsActiveUser]
+    throttle_scope = "network_read"
+    cache_scope = NETWORK
 
 
 class NetworkNodeUpdateView(generics.UpdateAPIView):
     """Контроллер редактирования цепочки сети."""
 
     serializer_class = NetworkNodeSerializer
-    queryset = NetworkNode.objects.all()
+    queryset = NetworkNode.objects.with_relations()
     permission_classes = [IsActiveUser]
+    throttle_scope = "network_write"
 
 
 class NetworkNodeDestroyView(generics.DestroyAPIView):
     """Контроллер удаления цепочки сети."""
 
     serializer_class = NetworkNodeSerializer
+    queryset = NetworkNode.objects.with_relations()
+    permission_classes = [IsActiveUser]
+    throttle_scope = "network_write"
+
+
+class NetworkNodeUpstreamView(
+    NetworkNodeFieldsetMixin,
+    FastListMixin,
+    SerializationTimingMixin,
+    generics.ListAPIView,
+):
+    """Контроллер просмотра всех вышестоящих поставщиков звена сети."""
+
+    serializer_class = NetworkNodeSerializer
+    permission_classes = [IsActiveUser]
+    throttle_scope = "network_read"
+    pagination_class = None
+
+    def get_queryset(self):
+        node = get_object_or_404(NetworkNode, pk=self.kwargs["pk"])
+        queryset = NetworkNode.objects.with_relations().ancestors_of(node)
+        return self.trim_queryset(queryset)
+
+
+class NetworkNodeDownstreamView(
+    NetworkNodeFieldsetMixin,
+    FastListMixin,
+    SerializationTimingMixin,
+    generics.ListAPIView,
+):
+    """Контроллер просмотра всех нижестоящих звеньев сети."""
+
+    serializer_class = NetworkNodeSerializer
+    permission_classes = [IsActiveUser]
+    throttle_scope = "network_read"
+    pagination_class = NetworkNodeCursorPagination
+
+    def get_queryset(self):
+        node = get_object_or_404(NetworkNode, pk=self.kwargs["pk"])
+        queryset = NetworkNode.objects.with_relations().descendants_of(node)
+        return self.trim_queryset(queryset)
+
+
+class NetworkNodeExportView(generics.GenericAPIView):
+    """Контроллер потоковой выгрузки сети в CSV или NDJSON.
+
+    Формат задаётся параметром ``export_format``, фильтры совпадают
+    с фильтрами списка звеньев сети. Звенья читаются уже после выхода
+    из middleware, поэтому место запроса, замер и запись медленных
+    запросов продолжаются до закрытия ответа.
+    """
+
     queryset = NetworkNode.objects.all()
     permission_classes = [IsActiveUser]
+    throttle_scope = "network_export"
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = NetworkNodeFilter
+    pagination_class = None
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get("export_format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError(
+                {"export_format": f"Допустимые форматы: {', '.join(EXPORT_FORMATS)}."}
+            )
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            iter_export(queryset, export_format),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="network.{export_format}"'
+        )
+        return response
+
+
+class NetworkNodeStatsView(SerializationTimingMixin, generics.ListAPIView):
+    """Контроллер сводной задолженности по странам, городам, типам звеньев
+    и прямым поставщикам.
+
+    Читает поддерживаемую инкрементально сводную таблицу, поэтому стоимость
+    запроса зависит от числа групп, а не от числа звеньев сети.
+    """
+
+    serializer_class = DebtSummarySerializer
+    queryset = DebtSummary.objects.filter(nodes__gt=0)
+    permission_classes = [IsActiveUser]
+    throttle_scope = "network_read"
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ("dimension",)
+    pagination_class = None
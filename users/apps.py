@@ -4,3 +4,6 @@ from django.apps import AppConfig    # type: ignore
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
+
+    def ready(self):
+        import users.signals  # noqa: F401
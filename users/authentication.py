@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (AuthenticationFailed,
+                                                 InvalidToken)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from config.cache import (CACHE_ERRORS, acache_get, acache_set, cache_get,
+                          cache_set, log_cache_error)
+from config.metrics import record_cache
+from config.timing import measure
+
+
+# Поля пользователя, которые аутентификация хранит в кеше
+AUTH_USER_FIELDS = ("id", "email", "is_active", "is_staff", "is_superuser")
+
+
+def user_cache_key(user_id) -> str:
+    """Ключ кеша полей пользователя, найденного по токену."""
+
+    return f"auth_user_fields:{user_id}"
+
+
+def invalidate_users(*user_ids) -> None:
+    """Удаляет пользователей из кеша аутентификации.
+
+    Вызывается при сохранении и удалении пользователя; после массового
+    ``update()`` в обход сигналов изменения вступают в силу не позже чем
+    через ``AUTH_USER_CACHE_TTL`` секунд.
+    """
+
+    try:
+        cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+    except CACHE_ERRORS as error:
+        log_cache_error(error)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT-аутентификация с кешированием пользователя на
+    ``AUTH_USER_CACHE_TTL`` секунд.
+
+    В кеш попадают только поля ``AUTH_USER_FIELDS`` и, если включена
+    проверка отзыва токена, md5-отпечаток хеша пароля, который и так
+    содержится в токене; сам хеш пароля в Redis не хранится. Из кеша
+    восстанавливается пользователь с отложенными остальными полями, они
+    читаются из БД при первом обращении. Проверки активности пользователя
+    и отзыва токена выполняются при каждом запросе так же, как в
+    ``JWTAuthentication``. Если кеш недоступен, пользователь читается из БД.
+    """
+
+    def authenticate(self, request):
+        with measure("auth"):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        key = user_cache_key(user_id)
+        entry = cache_get(key)
+        record_cache("auth_user", entry is not None)
+        if entry is None:
+            try:
+                user = self.user_model.objects.get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            entry = self.dump_user(user)
+            cache_set(key, entry, settings.AUTH_USER_CACHE_TTL)
+        return self.check_user(entry, validated_token)
+
+    async def aauthenticate(self, request):
+        """Асинхронный вариант ``authenticate`` для асинхронных представлений:
+        заголовок и токен проверяются без обращения к БД, пользователь
+        читается из кеша или асинхронным ORM."""
+
+        with measure("auth"):
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        key = user_cache_key(user_id)
+        entry = await acache_get(key)
+        record_cache("auth_user", entry is not None)
+        if entry is None:
+            try:
+                user = await self.user_model.objects.aget(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            entry = self.dump_user(user)
+            await acache_set(key, entry, settings.AUTH_USER_CACHE_TTL)
+        return self.check_user(entry, validated_token)
+
+    @staticmethod
+    def get_user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    @staticmethod
+    def dump_user(user) -> dict:
+        """Поля пользователя для кеша аутентификации."""
+
+        entry = {field: getattr(user, field) for field in AUTH_USER_FIELDS}
+        if api_settings.CHECK_REVOKE_TOKEN:
+            entry["revoke"] = get_md5_hash_password(user.password)
+        return entry
+
+    def load_user(self, entry):
+        """Пользователь из полей кеша; остальные поля отложены, поэтому
+        сохранение такого объекта не затирает пароль и профиль."""
+
+        names = [
+            field.attname
+            for field in self.user_model._meta.concrete_fields
+            if field.attname in entry
+        ]
+        return self.user_model.from_db(None, names, [entry[name] for name in names])
+
+    def check_user(self, entry, validated_token):
+        if not entry["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != entry["revoke"]:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return self.load_user(entry)
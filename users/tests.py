@@ -1,7 +1,12 @@
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.test import APIClient, APIRequestFactory
 
+from users.authentication import CachedJWTAuthentication, user_cache_key
 from users.models import User
 
 
@@ -76,3 +81,128 @@ class UserViewSetTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         # Проверка, что пользователь был успешно удален из базы данных.
         self.assertFalse(User.objects.filter(id=self.user.id).exists())
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        """Создание активного пользователя и получение токена."""
+
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(email="cached@example.com", is_active=True)
+        self.user.set_password("testpassword123")
+        self.user.save()
+        response = self.client.post(
+            "/users/login/",
+            {"email": "cached@example.com", "password": "testpassword123"},
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + response.json().get("access")
+        )
+        self.url = "/product/"
+
+    def test_user_cached(self):
+        """Тестирование кеширования пользователя между запросами."""
+
+        self.client.get(self.url)
+        # Повторный запрос не загружает пользователя из БД.
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any('"users_user"' in query["sql"] for query in context.captured_queries)
+        )
+
+    def test_async_user_cached(self):
+        """Тестирование общего кеша пользователя в асинхронных контроллерах."""
+
+        self.client.get(self.url)
+
+        async def request():
+            return await self.async_client.get(
+                "/async/product/",
+                headers={"Authorization": self.client._credentials["HTTP_AUTHORIZATION"]},
+            )
+
+        with CaptureQueriesContext(connection) as context:
+            response = async_to_sync(request)()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any('"users_user"' in query["sql"] for query in context.captured_queries)
+        )
+
+    def test_deactivation_invalidates_cache(self):
+        """Тестирование немедленной потери доступа после деактивации."""
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_delete_invalidates_cache(self):
+        """Тестирование потери доступа после удаления пользователя."""
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.user.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_update_bounded_by_ttl(self):
+        """Тестирование учёта изменений в обход сигналов после истечения TTL."""
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        # До истечения TTL используется пользователь из кеша.
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        # Истечение TTL имитируется удалением ключа.
+        cache.delete(user_cache_key(self.user.pk))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_unavailable(self):
+        """Тестирование работы API при недоступном Redis."""
+
+        unavailable = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": "redis://127.0.0.1:1/0",
+            }
+        }
+
+        async def request():
+            return await self.async_client.get(
+                "/async/product/",
+                headers={"Authorization": self.client._credentials["HTTP_AUTHORIZATION"]},
+            )
+
+        # Пользователь и ответ читаются из БД, ошибки кеша записываются в журнал.
+        with self.settings(CACHES=unavailable), self.assertLogs("config.cache", "WARNING"):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+            self.assertEqual(async_to_sync(request)().status_code, status.HTTP_200_OK)
+            # Сброс кеша из сигналов не мешает изменить пользователя
+            self.user.city = "Kazan"
+            self.user.save()
+
+    def test_cached_fields(self):
+        """Тестирование хранения в кеше только полей для аутентификации."""
+
+        self.client.get(self.url)
+        entry = cache.get(user_cache_key(self.user.pk))
+        self.assertEqual(
+            set(entry), {"id", "email", "is_active", "is_staff", "is_superuser"}
+        )
+        # Пользователь из кеша читает остальные поля из БД и при сохранении
+        # не затирает пароль
+        request = APIRequestFactory().get(
+            self.url, HTTP_AUTHORIZATION=self.client._credentials["HTTP_AUTHORIZATION"]
+        )
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        self.assertEqual(user.pk, self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password("testpassword123"))
+        user.city = "Kazan"
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.city, "Kazan")
+        self.assertTrue(self.user.check_password("testpassword123"))
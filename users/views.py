@@ -2,11 +2,12 @@ from rest_framework import status, viewsets  # type: ignore
 from rest_framework.permissions import AllowAny  # type: ignore
 from rest_framework.response import Response   # type: ignore
 
+from config.timing import SerializationTimingMixin
 from users.models import User
 from users.serializers import UserSerializer
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SerializationTimingMixin, viewsets.ModelViewSet):
     """Контроллер для работы с моделью User."""
 
     serializer_class = UserSerializer